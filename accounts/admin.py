@@ -1,12 +1,35 @@
-from django.contrib import admin
-from .models import Customer, UserProfile, ShopAssistant
+from django.contrib import admin, messages
+from .merging import choose_survivor, merge_customers
+from .models import Customer, CustomerRFM, SalesTarget, UserProfile, ShopAssistant
 
 @admin.register(Customer)
 class CustomerAdmin(admin.ModelAdmin):
     list_display = ('name', 'email', 'phone_number', 'total_purchase_value', 'created_at')
     list_filter = ('created_at', 'updated_at')
     search_fields = ('name', 'email', 'phone_number')
-    readonly_fields = ('total_purchase_value', 'created_at', 'updated_at')
+    readonly_fields = ('total_purchase_value', 'order_count', 'first_order_at', 'last_order_at', 'created_at', 'updated_at')
+    actions = ['merge_selected']
+
+    @admin.action(description='Merge selected customers into the one with the most orders')
+    def merge_selected(self, request, queryset):
+        customers = list(queryset)
+        if len(customers) < 2:
+            self.message_user(request, 'Select at least two customers to merge.', messages.WARNING)
+            return
+        survivor = choose_survivor(customers)
+        merged = merge_customers(survivor, customers)
+        self.message_user(request, f'Merged {merged} customers into {survivor.name} (#{survivor.pk}).')
+
+@admin.register(CustomerRFM)
+class CustomerRFMAdmin(admin.ModelAdmin):
+    list_display = ('customer', 'segment', 'rfm_score', 'frequency', 'monetary', 'last_order_at', 'computed_at')
+    list_filter = ('segment',)
+    search_fields = ('customer__name', 'customer__phone_number')
+    list_select_related = ('customer',)
+    readonly_fields = (
+        'customer', 'last_order_at', 'frequency', 'monetary', 'recency_score',
+        'frequency_score', 'monetary_score', 'segment', 'computed_at'
+    )
 
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
@@ -40,10 +63,34 @@ class ShopAssistantAdmin(admin.ModelAdmin):
         }),
     )
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_performance()
+    
     def total_orders_display(self, obj):
-        return obj.total_orders
+        return obj.period_orders
     total_orders_display.short_description = 'Total Orders'
+    total_orders_display.admin_order_field = 'period_orders'
     
     def total_sales_display(self, obj):
-        return f"৳{obj.total_sales:,.2f}"
+        return f"৳{obj.period_sales:,.2f}"
     total_sales_display.short_description = 'Total Sales'
+    total_sales_display.admin_order_field = 'period_sales'
+
+@admin.register(SalesTarget)
+class SalesTargetAdmin(admin.ModelAdmin):
+    list_display = ('owner', 'period', 'start_date', 'end_date', 'target_amount', 'achieved_sales', 'achieved_orders', 'progress_display')
+    list_filter = ('period', 'start_date')
+    search_fields = ('shop_assistant__name', 'salesperson__username')
+    list_select_related = ('shop_assistant', 'salesperson')
+    readonly_fields = ('end_date', 'achieved_sales', 'achieved_orders', 'updated_at')
+    actions = ['recalculate_progress']
+
+    def progress_display(self, obj):
+        return f"{obj.progress_percentage:.0f}%"
+    progress_display.short_description = 'Progress'
+
+    @admin.action(description='Recalculate progress from orders')
+    def recalculate_progress(self, request, queryset):
+        for target in queryset:
+            target.recalculate()
+        self.message_user(request, f'Recalculated {queryset.count()} targets.')
@@ -1,16 +1,18 @@
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic import TemplateView
 from django.db.models import Sum, Count, Q
+from django.db.models.functions import Trunc
 from django.utils import timezone
-from datetime import datetime, timedelta
-from decimal import Decimal
-from .models import ShopAssistant
+from datetime import timedelta
+from .models import SalesTarget, ShopAssistant, get_performance_percentage
 from sales.models import Order
 import json
 
 
 class ShopAssistantAnalyticsView(LoginRequiredMixin, TemplateView):
     template_name = 'accounts/shop_assistant_analytics.html'
+    chart_periods = 10
+    chart_assistants = 6
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -29,31 +31,48 @@ class ShopAssistantAnalyticsView(LoginRequiredMixin, TemplateView):
             start_date = end_date - timedelta(days=365)
             date_format = '%Y-%m'
         
-        # Shop assistant performance data
-        assistants_performance = []
-        for assistant in ShopAssistant.objects.filter(is_active=True):
-            performance_data = assistant.get_performance_data(start_date, end_date)
-            assistants_performance.append({
+        # Shop assistant performance data, aggregated for every assistant in one query
+        kind = {'daily': 'day', 'weekly': 'week'}.get(period, 'month')
+        assistants = list(
+            ShopAssistant.objects.filter(is_active=True).with_performance(start_date, end_date)
+            .with_current_sales(get_bucket_start(end_date, kind))
+        )
+        # Performance is progress through the current day, week or month:
+        # against the assistant's target of that period, or the default amount
+        targets = SalesTarget.current(period, shop_assistant__in=assistants)
+        assistants_performance = [
+            {
                 'assistant': assistant,
-                'data': performance_data
-            })
+                'data': {
+                    'total_sales': assistant.period_sales,
+                    'total_orders': assistant.period_orders,
+                    'avg_order_value': assistant.period_avg_order_value,
+                    'current_sales': assistant.current_sales,
+                    'target': targets.get(assistant.pk),
+                    'performance_percentage': get_performance_percentage(
+                        assistant.current_sales, targets.get(assistant.pk)
+                    ),
+                }
+            }
+            for assistant in assistants
+        ]
         
         # Top performers
-        top_performers = ShopAssistant.objects.filter(
-            is_active=True,
-            order__order_date__gte=start_date
-        ).annotate(
-            period_sales=Sum('order__total'),
-            period_orders=Count('order')
-        ).order_by('-period_sales')[:5]
+        top_performers = sorted(
+            (assistant for assistant in assistants if assistant.period_orders),
+            key=lambda assistant: assistant.period_sales, reverse=True
+        )[:5]
         
         # Sales comparison data for charts
-        chart_data = self.get_chart_data(start_date, end_date, date_format)
+        chart_data = self.get_chart_data(
+            assistants[:self.chart_assistants], start_date, end_date, period, date_format
+        )
         
         context.update({
             'assistants_performance': assistants_performance,
             'top_performers': top_performers,
             'period': period,
+            'current_period': kind,
             'start_date': start_date,
             'end_date': end_date,
             'chart_data': json.dumps(chart_data),
@@ -61,64 +80,49 @@ class ShopAssistantAnalyticsView(LoginRequiredMixin, TemplateView):
         
         return context
     
-    def get_chart_data(self, start_date, end_date, date_format):
-        """Generate chart data for assistant performance comparison"""
-        assistants = ShopAssistant.objects.filter(is_active=True)
+    def get_chart_data(self, assistants, start_date, end_date, period, date_format):
+        """
+        Generate chart data for assistant performance comparison.
+
+        Sales are summed per (assistant, period) in a single grouped query and
+        pivoted into one dataset per assistant.
+        """
         chart_data = {
             'labels': [],
             'datasets': []
         }
         
-        # Generate time periods
-        current_date = start_date
+        # Bucket starts from start_date to end_date, of which the last 10 are shown
+        kind = {'daily': 'day', 'weekly': 'week'}.get(period, 'month')
+        step = {'day': timedelta(days=1), 'week': timedelta(weeks=1), 'month': timedelta(days=32)}[kind]
+        current_date = get_bucket_start(start_date, kind)
         periods = []
         while current_date <= end_date:
-            periods.append(current_date.strftime(date_format))
-            if 'W' in date_format:  # Weekly
-                current_date += timedelta(weeks=1)
-            elif len(date_format) <= 7:  # Monthly
-                if current_date.month == 12:
-                    current_date = current_date.replace(year=current_date.year + 1, month=1)
-                else:
-                    current_date = current_date.replace(month=current_date.month + 1)
-            else:  # Daily
-                current_date += timedelta(days=1)
-        
-        chart_data['labels'] = periods[-10:]  # Last 10 periods
-        
-        # Generate dataset for each assistant
+            periods.append(current_date)
+            # A month step overshoots into the next month, whose first day get_bucket_start returns
+            current_date = get_bucket_start(current_date + step, kind)
+        periods = periods[-self.chart_periods:]
+        chart_data['labels'] = [date.strftime(date_format) for date in periods]
+        
+        sales = {
+            (row['shop_assistant'], row['bucket'].strftime(date_format)): row['total']
+            for row in Order.objects.filter(
+                status='completed',
+                shop_assistant__in=assistants,
+                order_date__gte=periods[0],
+                order_date__lte=end_date
+            ).annotate(
+                bucket=Trunc('order_date', kind)
+            ).values('shop_assistant', 'bucket').annotate(total=Sum('total')).order_by()
+        }
+        
         colors = [
             'rgb(255, 99, 132)', 'rgb(54, 162, 235)', 'rgb(255, 205, 86)',
             'rgb(75, 192, 192)', 'rgb(153, 102, 255)', 'rgb(255, 159, 64)'
         ]
         
-        for i, assistant in enumerate(assistants[:6]):  # Top 6 assistants
-            data = []
-            for period in chart_data['labels']:
-                # Calculate sales for this period
-                if 'W' in date_format:
-                    year, week = period.split('-W')
-                    period_start = datetime.strptime(f'{year}-W{week}-1', '%Y-W%U-%w')
-                    period_end = period_start + timedelta(weeks=1)
-                elif len(date_format) <= 7:
-                    year, month = period.split('-')
-                    period_start = datetime(int(year), int(month), 1)
-                    if int(month) == 12:
-                        period_end = datetime(int(year) + 1, 1, 1)
-                    else:
-                        period_end = datetime(int(year), int(month) + 1, 1)
-                else:
-                    period_start = datetime.strptime(period, date_format)
-                    period_end = period_start + timedelta(days=1)
-                
-                sales = Order.objects.filter(
-                    shop_assistant=assistant,
-                    order_date__gte=period_start,
-                    order_date__lt=period_end
-                ).aggregate(total=Sum('total'))['total'] or 0
-                
-                data.append(float(sales))
-            
+        for i, assistant in enumerate(assistants):
+            data = [float(sales.get((assistant.pk, label)) or 0) for label in chart_data['labels']]
             chart_data['datasets'].append({
                 'label': assistant.name,
                 'data': data,
@@ -130,6 +134,16 @@ class ShopAssistantAnalyticsView(LoginRequiredMixin, TemplateView):
         return chart_data
 
 
+def get_bucket_start(moment, kind):
+    """Start of the day, week (Monday) or month containing ``moment``, in the current time zone"""
+    start = timezone.localtime(moment).replace(hour=0, minute=0, second=0, microsecond=0)
+    if kind == 'week':
+        return start - timedelta(days=start.weekday())
+    if kind == 'month':
+        return start.replace(day=1)
+    return start
+
+
 class ShopAssistantReportsView(LoginRequiredMixin, TemplateView):
     template_name = 'accounts/shop_assistant_reports.html'
     
@@ -137,39 +151,33 @@ class ShopAssistantReportsView(LoginRequiredMixin, TemplateView):
         context = super().get_context_data(**kwargs)
         
         # Summary statistics
-        total_assistants = ShopAssistant.objects.count()
-        active_assistants = ShopAssistant.objects.filter(is_active=True).count()
+        counts = ShopAssistant.objects.aggregate(
+            total=Count('id'),
+            active=Count('id', filter=Q(is_active=True))
+        )
         
-        # Performance metrics for last 30 days
+        # Leaderboard of active assistants for the last 30 days
         last_30_days = timezone.now() - timedelta(days=30)
-        
-        # Assistant performance for last 30 days
-        assistant_stats = []
-        for assistant in ShopAssistant.objects.filter(is_active=True):
-            orders = Order.objects.filter(
-                shop_assistant=assistant,
-                order_date__gte=last_30_days
-            )
-            
-            total_sales = orders.aggregate(total_sum=Sum('total'))['total_sum'] or Decimal('0.00')
-            total_orders = orders.count()
-            avg_order_value = total_sales / total_orders if total_orders > 0 else Decimal('0.00')
-            
-            assistant_stats.append({
+        leaderboard = list(ShopAssistant.objects.filter(is_active=True).with_performance(
+            last_30_days
+        ).order_by('-performance_score', 'name')[:10])
+        targets = SalesTarget.current('monthly', shop_assistant__in=leaderboard)
+        assistant_stats = [
+            {
                 'assistant': assistant,
-                'total_sales': total_sales,
-                'total_orders': total_orders,
-                'avg_order_value': avg_order_value,
-                'performance_score': (total_sales * Decimal('0.7')) + (total_orders * Decimal('0.3'))
-            })
-        
-        # Sort by performance score
-        assistant_stats.sort(key=lambda x: x['performance_score'], reverse=True)
+                'total_sales': assistant.period_sales,
+                'total_orders': assistant.period_orders,
+                'avg_order_value': assistant.period_avg_order_value,
+                'performance_score': assistant.performance_score,
+                'target': targets.get(assistant.pk),
+            }
+            for assistant in leaderboard
+        ]
         
         context.update({
-            'total_assistants': total_assistants,
-            'active_assistants': active_assistants,
-            'assistant_stats': assistant_stats[:10],  # Top 10
+            'total_assistants': counts['total'],
+            'active_assistants': counts['active'],
+            'assistant_stats': assistant_stats,
             'report_date': timezone.now(),
         })
         
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounts'
+
+    def ready(self):
+        from django.core.signals import request_started
+
+        from . import autocomplete  # connects the customer index signals
+
+        request_started.connect(autocomplete.warm_customer_index)
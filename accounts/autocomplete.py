@@ -0,0 +1,287 @@
+"""
+In-memory customer autocomplete for the POS.
+
+Each process keeps a sorted list of search keys: the words of every
+customer name, and the phone digits both forwards and reversed (see
+accounts.phone). A prefix lookup is a bisect into that list, so a lookup
+needs no query.
+
+With CUSTOMER_INDEX_BACKGROUND set, each worker process builds its index in
+a background thread when it serves its first request, and later rebuilds
+also run in the background while lookups keep using the previous index.
+Only one build runs at a time. Otherwise the index is built by the first
+lookup that needs it.
+
+The index is updated from post_save and post_delete once the transaction
+commits. Writes that add or delete a customer or change an indexed field
+(name, phone number) also replace the file named by
+CUSTOMER_INDEX_VERSION_FILE. Other processes see that file change and
+rebuild their index. A process that finds the file already changed by
+someone else when it writes marks its own index stale instead of claiming
+the new version. As a safety net, every index is rebuilt after
+REBUILD_INTERVAL seconds. Rows written with bulk_create send no signals, so
+bulk imports call ``customer_index.invalidate()``.
+
+Matches are ranked by purchase value, then by the customer's latest order.
+Rank-only changes, such as the purchase totals that every checkout saves,
+are applied to the local index without touching the version file: other
+processes may rank with stale totals until their next rebuild, which
+changes the order of the matches but never which customers match.
+"""
+import heapq
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import namedtuple
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import connection, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .phone import get_local_digits, get_search_digits
+
+try:
+    import fcntl
+except ImportError:  # Windows: version file writes are only serialised within a process
+    fcntl = None
+
+REBUILD_INTERVAL = 300
+
+NAME, PHONE, PHONE_REVERSED = 'n', 'p', 'r'
+
+# Customer fields the search keys are made from
+INDEXED_FIELDS = frozenset({'name', 'phone_number'})
+
+
+class CustomerEntry(namedtuple('CustomerEntry', 'id name phone_number words rank')):
+    __slots__ = ()
+
+    def get_formatted_phone(self):
+        return self.phone_number or 'Not provided'
+
+
+def get_entry(customer):
+    digits = get_local_digits(customer['phone_number'])
+    words = tuple(sorted(set(customer['name'].lower().split())))
+    last_order_at = customer['last_order_at']
+    rank = (-customer['total_purchase_value'], -last_order_at.timestamp() if last_order_at else 0)
+    keys = [(NAME, word, customer['id']) for word in words]
+    if digits:
+        keys += [(PHONE, digits, customer['id']), (PHONE_REVERSED, digits[::-1], customer['id'])]
+    return CustomerEntry(customer['id'], customer['name'], customer['phone_number'], words, rank), keys
+
+
+def customer_values(queryset):
+    return queryset.values('id', 'name', 'phone_number', 'total_purchase_value', 'last_order_at')
+
+
+class CustomerIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Held for a whole build, so only one runs at a time
+        self._build_lock = threading.Lock()
+        self._entries = {}
+        self._keys = []
+        self._built_at = None
+        self._version = None
+        # Set when another process changed customers this index has not seen
+        self._stale = False
+
+    @property
+    def version_file(self):
+        path = getattr(settings, 'CUSTOMER_INDEX_VERSION_FILE', None)
+        return Path(path) if path else None
+
+    def read_version(self):
+        path = self.version_file
+        if path is None:
+            return None
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    @contextmanager
+    def version_lock(self):
+        """Serialise version file writes across processes"""
+        path = self.version_file
+        if path is None or fcntl is None:
+            yield
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path.with_name(f'{path.name}.lock'), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def write_version(self):
+        """Tell other processes that customers changed; returns the new version"""
+        path = self.version_file
+        if path is None:
+            return None
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+        tmp.write_text(f'{time.time_ns()} {os.getpid()}\n')
+        # A new file gets a new inode, so the change is seen even within one mtime tick
+        os.replace(tmp, path)
+        return self.read_version()
+
+    def is_current(self):
+        return (
+            self._built_at is not None
+            and not self._stale
+            and time.monotonic() - self._built_at < REBUILD_INTERVAL
+            and self._version == self.read_version()
+        )
+
+    def build(self):
+        from .models import Customer
+
+        with self._build_lock:
+            if self.is_current():
+                # Built by another thread while this one waited
+                return
+            version = self.read_version()
+            entries, keys = {}, []
+            for customer in customer_values(Customer.objects.order_by()).iterator(chunk_size=5000):
+                entry, entry_keys = get_entry(customer)
+                entries[entry.id] = entry
+                keys.extend(entry_keys)
+            keys.sort()
+            with self._lock:
+                self._entries, self._keys = entries, keys
+                self._built_at, self._version, self._stale = time.monotonic(), version, False
+
+    def _build_in_background(self):
+        try:
+            self.build()
+        finally:
+            connection.close()
+
+    def refresh(self):
+        """Rebuild in a background thread unless a build is already running"""
+        if self._build_lock.locked():
+            return
+        threading.Thread(target=self._build_in_background, name='customer-index-build', daemon=True).start()
+
+    def clear(self):
+        with self._lock:
+            self._entries, self._keys = {}, []
+            self._built_at = self._version = None
+            self._stale = False
+
+    def invalidate(self):
+        """Make this and every other process rebuild its index"""
+        with self._lock:
+            self._stale = True
+        self.write_version()
+
+    def _remove(self, customer_id):
+        entry = self._entries.pop(customer_id, None)
+        if entry is None:
+            return
+        keys = [(NAME, word, customer_id) for word in entry.words]
+        digits = get_local_digits(entry.phone_number)
+        if digits:
+            keys += [(PHONE, digits, customer_id), (PHONE_REVERSED, digits[::-1], customer_id)]
+        for key in keys:
+            position = bisect_left(self._keys, key)
+            if position < len(self._keys) and self._keys[position] == key:
+                del self._keys[position]
+
+    def apply(self, customer_id, values=None, indexed=True):
+        """
+        Update one customer from a committed write; ``values`` is None when it
+        was deleted. ``indexed`` is False when the write cannot have changed
+        the name or phone number.
+        """
+        with self._lock:
+            entry = self._entries.get(customer_id) if values is not None else None
+            if entry is not None and (entry.name, entry.phone_number) == (values['name'], values['phone_number']):
+                indexed = False
+            if not indexed:
+                # Only the rank changed: keep the keys and leave other processes' indexes alone
+                if entry is not None:
+                    self._entries[customer_id] = entry._replace(rank=get_entry(values)[0].rank)
+                return
+            if self._built_at is not None:
+                self._remove(customer_id)
+                if values is not None:
+                    entry, keys = get_entry(values)
+                    self._entries[customer_id] = entry
+                    for key in keys:
+                        insort(self._keys, key)
+            with self.version_lock():
+                # Another process's change this index has not seen yet must not be marked as seen
+                seen = self._version == self.read_version()
+                version = self.write_version()
+            if seen:
+                self._version = version
+            else:
+                self._stale = True
+
+    def _lookup(self, kind, prefix):
+        position = bisect_left(self._keys, (kind, prefix))
+        while position < len(self._keys):
+            key_kind, term, customer_id = self._keys[position]
+            if key_kind != kind or not term.startswith(prefix):
+                break
+            yield customer_id
+            position += 1
+
+    def search(self, query, limit=10):
+        """Best ranked customers matching ``query``, by name word prefixes or the start or end of the phone number"""
+        if self._built_at is None:
+            self.build()
+        elif not self.is_current():
+            if settings.CUSTOMER_INDEX_BACKGROUND:
+                # Keep answering from the current index while it is rebuilt
+                self.refresh()
+            else:
+                self.build()
+        with self._lock:
+            digits = get_search_digits(query)
+            if digits:
+                ids = set(self._lookup(PHONE, digits)) | set(self._lookup(PHONE_REVERSED, digits[::-1]))
+                matches = [self._entries[customer_id] for customer_id in ids]
+            else:
+                first, *others = query.lower().split() or ['']
+                matches = [
+                    entry for entry in map(self._entries.get, set(self._lookup(NAME, first)))
+                    if all(any(word.startswith(other) for word in entry.words) for other in others)
+                ]
+            return heapq.nsmallest(limit, matches, key=lambda entry: entry.rank)
+
+
+customer_index = CustomerIndex()
+
+
+def warm_customer_index(sender, **kwargs):
+    """Build the index of a worker process in the background when it serves its first request"""
+    request_started.disconnect(warm_customer_index)
+    if settings.CUSTOMER_INDEX_BACKGROUND:
+        customer_index.refresh()
+
+
+@receiver(post_save, sender='accounts.Customer', dispatch_uid='accounts.customer_index_save')
+def update_customer_index(sender, instance, created, update_fields=None, **kwargs):
+    values = {
+        'id': instance.pk, 'name': instance.name, 'phone_number': instance.phone_number,
+        'total_purchase_value': instance.total_purchase_value, 'last_order_at': instance.last_order_at,
+    }
+    indexed = created or update_fields is None or not INDEXED_FIELDS.isdisjoint(update_fields)
+    transaction.on_commit(lambda: customer_index.apply(values['id'], values, indexed))
+
+
+@receiver(post_delete, sender='accounts.Customer', dispatch_uid='accounts.customer_index_delete')
+def remove_from_customer_index(sender, instance, **kwargs):
+    customer_id = instance.pk
+    transaction.on_commit(lambda: customer_index.apply(customer_id))
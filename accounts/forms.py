@@ -1,6 +1,7 @@
 from django import forms
 from django.core.validators import RegexValidator
 from .models import Customer, UserProfile
+from .phone import is_valid_phone, normalize_phone
 
 class CustomerForm(forms.ModelForm):
     class Meta:
@@ -23,24 +24,17 @@ class CustomerForm(forms.ModelForm):
         phone = self.cleaned_data.get('phone_number')
         if not phone:
             return None
-            
-        # Remove spaces and dashes
-        phone = phone.strip().replace(' ', '').replace('-', '')
-        
-        # If already properly formatted with country code
-        if phone.startswith('+88') and len(phone) == 14:
-            return phone
-            
-        # If 11 digits starting with 0
-        if len(phone) == 11 and phone.startswith('0'):
-            return f'+88{phone}'
-            
-        if phone:  # If there's any other format, raise error
+        if not is_valid_phone(phone):
             raise forms.ValidationError(
                 "Phone number must be 11 digits starting with '0' (e.g., 01717508447) or include the country code (e.g., +8801717508447)"
             )
-            
-        return phone
+        return normalize_phone(phone)
+
+class CustomerImportForm(forms.Form):
+    file = forms.FileField(
+        label='Customer file',
+        help_text='CSV, JSON or JSON Lines with name, phone_number and email columns'
+    )
 
 class UserProfileForm(forms.ModelForm):
     first_name = forms.CharField(max_length=30, required=False)
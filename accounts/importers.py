@@ -0,0 +1,82 @@
+"""
+Bulk customer import.
+
+Phone numbers are normalized as in the customer form. A row is a duplicate
+when its local phone digits were already seen earlier in the file (an
+in-memory map) or belong to an existing customer (one indexed
+phone_digits__in lookup per chunk). Duplicates and invalid rows are
+reported and skipped; everything else is inserted with bulk_create.
+"""
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+
+from core.importing import BATCH_SIZE, ImportReport, chunked, get_text
+
+from .autocomplete import customer_index
+from .models import Customer
+from .phone import get_search_fields, is_valid_phone, normalize_phone
+
+NAME_MAX_LENGTH = Customer._meta.get_field('name').max_length
+
+
+def build_customer(row):
+    """Unsaved Customer for a row, or raise ValidationError"""
+    if not isinstance(row, dict):
+        raise ValidationError('not a record')
+    name = get_text(row, 'name', 'customer_name')
+    if not name:
+        raise ValidationError('name is missing')
+    if len(name) > NAME_MAX_LENGTH:
+        raise ValidationError(f'name is longer than {NAME_MAX_LENGTH} characters')
+    phone = get_text(row, 'phone_number', 'phone', 'mobile')
+    if phone:
+        if not is_valid_phone(phone):
+            raise ValidationError(f'invalid phone number "{phone}"')
+        phone = normalize_phone(phone)
+    email = get_text(row, 'email')
+    if email:
+        validate_email(email)
+    return Customer(name=name, phone_number=phone or None, email=email or None, **get_search_fields(phone))
+
+
+def import_customers(rows, batch_size=BATCH_SIZE):
+    report = ImportReport()
+    # local phone digits -> row number, for duplicates within the file
+    seen = {}
+    for chunk in chunked(enumerate(rows, start=1), batch_size):
+        candidates = []
+        for number, row in chunk:
+            report.rows += 1
+            try:
+                customer = build_customer(row)
+            except ValidationError as e:
+                report.add_problem(number, '; '.join(e.messages))
+                continue
+            digits = customer.phone_digits
+            if digits:
+                if digits in seen:
+                    report.add_problem(number, f'duplicate of row {seen[digits]} ({customer.phone_number})')
+                    continue
+                seen[digits] = number
+            candidates.append((number, customer))
+
+        existing = dict(Customer.objects.filter(
+            phone_digits__in=[customer.phone_digits for _, customer in candidates if customer.phone_digits]
+        ).values_list('phone_digits', 'id'))
+        new_customers = []
+        for number, customer in candidates:
+            if customer.phone_digits in existing:
+                report.add_problem(
+                    number, f'{customer.phone_number} already belongs to customer #{existing[customer.phone_digits]}'
+                )
+            else:
+                new_customers.append(customer)
+        with transaction.atomic():
+            Customer.objects.bulk_create(new_customers)
+        report.created += len(new_customers)
+
+    if report.created:
+        # bulk_create sends no signals
+        customer_index.invalidate()
+    return report
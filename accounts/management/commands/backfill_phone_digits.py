@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from accounts.models import Customer
+from accounts.phone import get_search_fields
+
+
+class Command(BaseCommand):
+    help = 'Fill the indexed phone search columns of customers from their phone numbers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        fields = ['phone_digits', 'phone_digits_reversed']
+        updated = 0
+        last_pk = 0
+        # Walk the table by primary key so each batch is one indexed range read
+        while True:
+            batch = list(
+                Customer.objects.filter(pk__gt=last_pk).order_by('pk').only('pk', 'phone_number', *fields)[:batch_size]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            changed = []
+            for customer in batch:
+                values = get_search_fields(customer.phone_number)
+                if any(getattr(customer, field) != value for field, value in values.items()):
+                    for field, value in values.items():
+                        setattr(customer, field, value)
+                    changed.append(customer)
+            Customer.objects.bulk_update(changed, fields)
+            updated += len(changed)
+        self.stdout.write(self.style.SUCCESS(f'Updated phone search columns of {updated} customers'))
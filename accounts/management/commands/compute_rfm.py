@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from accounts.models import CustomerRFM
+from accounts.rfm import refresh_rfm, get_segment_counts
+
+class Command(BaseCommand):
+    help = 'Compute RFM (recency, frequency, monetary) scores and segments for customers'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Recompute the order totals of every customer instead of only those whose orders changed',
+        )
+
+    def handle(self, *args, **options):
+        result = refresh_rfm(full=options['full'])
+
+        mode = 'Full' if result['full'] else 'Incremental'
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{mode} RFM refresh recomputed {result['customers']} customers, "
+                f"changed {result['rescored']} scores (removed {result['removed']} stale scores)"
+            )
+        )
+
+        labels = dict(CustomerRFM.SEGMENT_CHOICES)
+        for segment, count in get_segment_counts().items():
+            self.stdout.write(f"{labels[segment]:<22} {count}")
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.importers import import_customers
+from core.importing import BATCH_SIZE, FORMATS, ImportFileError, get_format, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Import customers from a CSV, JSON or JSON Lines file, skipping duplicate phone numbers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File with name, phone_number and email columns')
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            fmt = get_format(options['path'], options['format'])
+            with open(options['path'], 'rb') as stream:
+                report = import_customers(read_rows(stream, fmt), batch_size=options['batch_size'])
+        except (OSError, ImportFileError) as e:
+            raise CommandError(str(e))
+
+        for row, message in report.problems:
+            self.stdout.write(self.style.WARNING(f'Row {row}: {message}'))
+        if report.problem_count > len(report.problems):
+            self.stdout.write(self.style.WARNING(f'... and {report.problem_count - len(report.problems)} more'))
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Imported customers in {elapsed:.1f}s: {report}'))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.merging import choose_survivor, find_duplicates, merge_customers, merge_duplicates
+from accounts.models import Customer
+
+
+class Command(BaseCommand):
+    help = (
+        'Merge duplicate customers into a survivor: give the survivor and duplicate ids, '
+        'or --by-phone to merge every group of customers sharing a phone number'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('ids', nargs='*', type=int, help='Survivor id followed by the duplicate ids')
+        parser.add_argument('--by-phone', action='store_true', help='Merge all customers with the same phone number')
+        parser.add_argument('--dry-run', action='store_true', help='With --by-phone, only list the groups')
+
+    def handle(self, *args, **options):
+        if options['by_phone']:
+            if options['dry_run']:
+                for group in find_duplicates():
+                    survivor = choose_survivor(group)
+                    others = ', '.join(f'#{customer.pk}' for customer in group if customer is not survivor)
+                    self.stdout.write(f'{survivor.phone_number}: keep #{survivor.pk} {survivor.name}, merge {others}')
+                return
+            groups, merged = merge_duplicates()
+            self.stdout.write(self.style.SUCCESS(f'Merged {merged} duplicates in {groups} phone number groups'))
+            return
+
+        if len(options['ids']) < 2:
+            raise CommandError('Give a survivor id and at least one duplicate id, or use --by-phone')
+        survivor_id, *duplicate_ids = options['ids']
+        customers = Customer.objects.in_bulk(options['ids'])
+        missing = [str(pk) for pk in options['ids'] if pk not in customers]
+        if missing:
+            raise CommandError(f'Unknown customer ids: {", ".join(missing)}')
+        merged = merge_customers(customers[survivor_id], [customers[pk] for pk in duplicate_ids])
+        self.stdout.write(self.style.SUCCESS(f'Merged {merged} customers into #{survivor_id}'))
@@ -0,0 +1,88 @@
+"""
+Merging duplicate customers.
+
+A merge moves every order of the duplicates to a survivor. The orders are
+moved with one UPDATE per MERGE_BATCH_SIZE duplicates, whatever the number
+of orders. Missing contact details are copied from the duplicates. The
+survivors' purchase value and order activity are recomputed in a single
+UPDATE, and then the duplicates are deleted. Batch mode groups customers by
+their normalized phone digits and merges every group in the same way.
+
+RFM scores of survivors are brought up to date by the next full RFM refresh.
+"""
+from itertools import groupby
+
+from django.db import transaction
+from django.db.models import Case, Count, Value, When
+
+from sales.models import Order
+
+from .autocomplete import customer_index
+from .models import Customer
+
+MERGE_BATCH_SIZE = 500
+CONTACT_FIELDS = ('email', 'phone_number')
+
+
+def choose_survivor(customers):
+    """The customer with the most completed orders, the oldest one on a tie"""
+    return min(customers, key=lambda customer: (-customer.order_count, customer.pk))
+
+
+def merge_into(merges):
+    """
+    Merge customers given as (survivor, duplicates) pairs.
+
+    Returns the number of deleted duplicates.
+    """
+    mapping = {
+        duplicate.pk: survivor.pk
+        for survivor, duplicates in merges
+        for duplicate in duplicates
+        if duplicate.pk != survivor.pk
+    }
+    if not mapping:
+        return 0
+    with transaction.atomic():
+        items = list(mapping.items())
+        for start in range(0, len(items), MERGE_BATCH_SIZE):
+            batch = items[start:start + MERGE_BATCH_SIZE]
+            Order.objects.filter(customer_id__in=[duplicate_id for duplicate_id, _ in batch]).update(
+                customer_id=Case(*[When(customer_id=duplicate_id, then=Value(survivor_id)) for duplicate_id, survivor_id in batch])
+            )
+
+        for survivor, duplicates in merges:
+            missing = [field for field in CONTACT_FIELDS if not getattr(survivor, field)]
+            for field in missing:
+                value = next((getattr(duplicate, field) for duplicate in duplicates if getattr(duplicate, field)), None)
+                setattr(survivor, field, value)
+            if any(getattr(survivor, field) for field in missing):
+                survivor.save(update_fields=missing)
+
+        Customer.objects.filter(pk__in=set(mapping.values())).refresh_order_stats()
+        Customer.objects.filter(pk__in=list(mapping)).delete()
+        # refresh_order_stats() is an UPDATE and sends no signals
+        transaction.on_commit(customer_index.invalidate)
+    return len(mapping)
+
+
+def merge_customers(survivor, duplicates):
+    return merge_into([(survivor, list(duplicates))])
+
+
+def find_duplicates():
+    """Groups of two or more customers sharing the same phone digits, read in one query"""
+    shared = Customer.objects.exclude(phone_digits='').values('phone_digits').annotate(
+        customers=Count('id')
+    ).filter(customers__gt=1).values('phone_digits')
+    customers = Customer.objects.filter(phone_digits__in=shared).order_by('phone_digits', 'pk')
+    return [list(group) for _, group in groupby(customers, key=lambda customer: customer.phone_digits)]
+
+
+def merge_duplicates():
+    """Merge every group of customers sharing a phone number; returns (groups, deleted duplicates)"""
+    merges = []
+    for group in find_duplicates():
+        survivor = choose_survivor(group)
+        merges.append((survivor, [customer for customer in group if customer.pk != survivor.pk]))
+    return len(merges), merge_into(merges)
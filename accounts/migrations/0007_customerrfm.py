@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_remove_shop_assignment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerRFM',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_order_at', models.DateTimeField(help_text="Date of the customer's latest completed order")),
+                ('frequency', models.PositiveIntegerField(default=0, help_text='Number of completed orders')),
+                ('monetary', models.DecimalField(decimal_places=2, default=0, help_text='Total spent on completed orders', max_digits=12)),
+                ('recency_score', models.PositiveSmallIntegerField(default=1)),
+                ('frequency_score', models.PositiveSmallIntegerField(default=1)),
+                ('monetary_score', models.PositiveSmallIntegerField(default=1)),
+                ('segment', models.CharField(choices=[('champions', 'Champions'), ('loyal', 'Loyal Customers'), ('potential', 'Potential Loyalists'), ('new', 'New Customers'), ('at_risk', 'At Risk'), ('hibernating', 'Hibernating'), ('lost', 'Lost')], max_length=20)),
+                ('computed_at', models.DateTimeField()),
+                ('customer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='rfm', to='accounts.customer')),
+            ],
+            options={
+                'verbose_name': 'Customer RFM Score',
+                'verbose_name_plural': 'Customer RFM Scores',
+                'indexes': [models.Index(fields=['segment', '-monetary'], name='rfm_segment_monetary_idx'), models.Index(fields=['-last_order_at'], name='rfm_last_order_idx'), models.Index(fields=['frequency'], name='rfm_frequency_idx'), models.Index(fields=['-monetary'], name='rfm_monetary_idx'), models.Index(fields=['computed_at'], name='rfm_computed_at_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:52
+
+import django.core.validators
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_customerrfm'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesTarget',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('daily', 'Daily'), ('weekly', 'Weekly'), ('monthly', 'Monthly')], default='monthly', max_length=10)),
+                ('start_date', models.DateField(help_text='First day of the period; weekly targets run for 7 days, monthly targets to the end of the month')),
+                ('end_date', models.DateField(editable=False)),
+                ('target_amount', models.DecimalField(decimal_places=2, max_digits=12, validators=[django.core.validators.MinValueValidator(Decimal('0.01'))])),
+                ('achieved_sales', models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12)),
+                ('achieved_orders', models.PositiveIntegerField(default=0, editable=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('salesperson', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='sales_targets', to=settings.AUTH_USER_MODEL)),
+                ('shop_assistant', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='sales_targets', to='accounts.shopassistant')),
+            ],
+            options={
+                'ordering': ['-start_date'],
+                'indexes': [models.Index(fields=['start_date', 'end_date'], name='sales_target_dates_idx')],
+                'constraints': [models.CheckConstraint(condition=models.Q(models.Q(('salesperson__isnull', False), ('shop_assistant__isnull', True)), models.Q(('salesperson__isnull', True), ('shop_assistant__isnull', False)), _connector='OR'), name='sales_target_single_owner'), models.UniqueConstraint(fields=('shop_assistant', 'period', 'start_date'), name='sales_target_assistant_period_unique'), models.UniqueConstraint(fields=('salesperson', 'period', 'start_date'), name='sales_target_salesperson_period_unique')],
+            },
+        ),
+    ]
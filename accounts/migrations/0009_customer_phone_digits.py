@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:59
+
+from django.db import migrations, models
+
+from accounts.phone import get_search_fields
+
+
+def backfill_phone_digits(apps, schema_editor):
+    # Rows written later with bulk_create can be filled with the backfill_phone_digits command
+    Customer = apps.get_model('accounts', 'Customer')
+    customers = list(Customer.objects.exclude(phone_number=None).exclude(phone_number='').only('pk', 'phone_number'))
+    for customer in customers:
+        for field, value in get_search_fields(customer.phone_number).items():
+            setattr(customer, field, value)
+    Customer.objects.bulk_update(customers, ['phone_digits', 'phone_digits_reversed'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_salestarget'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='phone_digits',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=14),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='phone_digits_reversed',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=14),
+        ),
+        migrations.RunPython(backfill_phone_digits, migrations.RunPython.noop),
+    ]
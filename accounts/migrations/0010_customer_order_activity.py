@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:05
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_order_activity(apps, schema_editor):
+    Customer = apps.get_model('accounts', 'Customer')
+    Order = apps.get_model('sales', 'Order')
+    orders = Order.objects.filter(customer=OuterRef('pk'), status='completed').order_by().values('customer')
+    Customer.objects.update(
+        total_purchase_value=Coalesce(Subquery(orders.annotate(value=Sum('total')).values('value')), Decimal('0.00')),
+        order_count=Coalesce(Subquery(orders.annotate(count=Count('id')).values('count')), 0),
+        first_order_at=Subquery(orders.annotate(first=Min('order_date')).values('first')),
+        last_order_at=Subquery(orders.annotate(last=Max('order_date')).values('last')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0009_customer_phone_digits'),
+        ('sales', '0005_salespersondailysales'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='first_order_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='last_order_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='order_count',
+            field=models.PositiveIntegerField(db_index=True, default=0),
+        ),
+        migrations.RunPython(backfill_order_activity, migrations.RunPython.noop),
+    ]
@@ -1,24 +1,77 @@
+from django.conf import settings
 from django.db import models
 from django.contrib.auth.models import User
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.core.validators import MinValueValidator
-from django.db.models import Sum, F, Q, Avg
+from django.utils import timezone
+from django.db.models import Sum, F, Q, Avg, Count, Max, Min, DecimalField, ExpressionWrapper, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from datetime import timedelta
 from decimal import Decimal
 
+from .phone import get_search_fields, get_search_digits, normalize_phone, starts_with
+
+class CustomerQuerySet(models.QuerySet):
+    def search_phone(self, digits):
+        """
+        Customers whose phone number starts or ends with ``digits``.
+
+        Both branches are range scans on an indexed column, so a till lookup
+        by the last digits of a number does not scan the customer table.
+        """
+        return self.filter(
+            Q(**starts_with('phone_digits', digits)) |
+            Q(**starts_with('phone_digits_reversed', digits[::-1]))
+        )
+
+    def search(self, query, *fields):
+        """Phone lookup when the query is a phone number fragment, else icontains on ``fields``"""
+        digits = get_search_digits(query)
+        if digits:
+            return self.search_phone(digits)
+        condition = Q()
+        for field in fields or ('name',):
+            condition |= Q(**{f'{field}__icontains': query})
+        return self.filter(condition)
+
+    def refresh_order_stats(self):
+        """Recompute purchase value and order activity of these customers in one UPDATE"""
+        from sales.models import Order
+
+        orders = Order.objects.filter(customer=OuterRef('pk'), status='completed').order_by().values('customer')
+        return self.update(
+            total_purchase_value=Coalesce(Subquery(orders.annotate(value=Sum('total')).values('value')), Decimal('0.00')),
+            order_count=Coalesce(Subquery(orders.annotate(count=Count('id')).values('count')), 0),
+            first_order_at=Subquery(orders.annotate(first=Min('order_date')).values('first')),
+            last_order_at=Subquery(orders.annotate(last=Max('order_date')).values('last')),
+        )
+
+
 class Customer(models.Model):
     name = models.CharField(max_length=100)
     email = models.EmailField(blank=True, null=True)
     phone_number = models.CharField(max_length=14, blank=True, null=True, 
                                   help_text="")
+    # Digits of the local number and the same digits reversed, kept in sync
+    # with phone_number by save(); indexed for prefix and suffix search
+    phone_digits = models.CharField(max_length=14, blank=True, default='', db_index=True, editable=False)
+    phone_digits_reversed = models.CharField(max_length=14, blank=True, default='', db_index=True, editable=False)
     total_purchase_value = models.DecimalField(
         max_digits=12, 
         decimal_places=2, 
         default=0,
         validators=[MinValueValidator(0)]
     )
+    # Completed order activity, kept in sync by the sale and refund paths so
+    # customer lists can filter and sort on indexed columns
+    order_count = models.PositiveIntegerField(default=0, db_index=True)
+    first_order_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    last_order_at = models.DateTimeField(null=True, blank=True, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    objects = CustomerQuerySet.as_manager()
     
     @property
     def calculate_total_purchase_value(self):
@@ -34,28 +87,30 @@ class Customer(models.Model):
         self.total_purchase_value = self.calculate_total_purchase_value
         self.save(update_fields=['total_purchase_value'])
 
+    def update_order_stats(self):
+        """Update total_purchase_value and the order activity columns from the completed orders"""
+        stats = self.order_set.filter(status='completed').aggregate(
+            value=Sum('total'), count=Count('id'), first=Min('order_date'), last=Max('order_date')
+        )
+        self.total_purchase_value = stats['value'] or Decimal('0.00')
+        self.order_count = stats['count']
+        self.first_order_at = stats['first']
+        self.last_order_at = stats['last']
+        self.save(update_fields=['total_purchase_value', 'order_count', 'first_order_at', 'last_order_at'])
+
     def clean_phone_number(self):
         """Clean and format the phone number"""
-        if not self.phone_number:
-            return None
-
-        # Remove any spaces and dashes
-        phone = self.phone_number.strip().replace(' ', '').replace('-', '')
-        
-        # If already has +88 prefix, return as is
-        if phone.startswith('+88') and len(phone) == 14:
-            return phone
-            
-        # If it's an 11-digit number starting with 0
-        if len(phone) == 11 and phone.startswith('0'):
-            return f'+88{phone}'
-            
-        return phone
+        return normalize_phone(self.phone_number)
 
     def save(self, *args, **kwargs):
         """Override save to ensure phone number is properly formatted"""
         if self.phone_number:
             self.phone_number = self.clean_phone_number()
+        for field, value in get_search_fields(self.phone_number).items():
+            setattr(self, field, value)
+        update_fields = kwargs.get('update_fields')
+        if update_fields and 'phone_number' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'phone_digits', 'phone_digits_reversed'}
         
         # If this is a new customer, set initial total_purchase_value to 0
         if not self.id:
@@ -77,6 +132,26 @@ class Customer(models.Model):
     def __str__(self):
         return self.name
 
+class UserProfileQuerySet(models.QuerySet):
+    def with_sales(self, start_date=None, end_date=None):
+        """
+        Annotate ``period_sales`` and ``period_orders`` of each user from the
+        salesperson daily sales rollup, for an optional range of dates.
+        """
+        window = Q()
+        if start_date:
+            window &= Q(user__daily_sales__date__gte=start_date)
+        if end_date:
+            window &= Q(user__daily_sales__date__lte=end_date)
+        return self.annotate(
+            period_sales=Coalesce(
+                Sum('user__daily_sales__total_sales', filter=window or None), Value(Decimal('0.00')),
+                output_field=DecimalField(max_digits=12, decimal_places=2)
+            ),
+            period_orders=Coalesce(Sum('user__daily_sales__order_count', filter=window or None), Value(0)),
+        )
+
+
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     phone_number = models.CharField(max_length=14, blank=True, null=True)
@@ -84,26 +159,14 @@ class UserProfile(models.Model):
     profile_picture = models.ImageField(upload_to='profile_pics/', blank=True, null=True)
     is_salesperson = models.BooleanField(default=False)
 
+    objects = UserProfileQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.user.username} Profile"
 
     def clean_phone_number(self):
         """Clean and format the phone number"""
-        if not self.phone_number:
-            return None
-
-        # Remove any spaces and dashes
-        phone = self.phone_number.strip().replace(' ', '').replace('-', '')
-        
-        # If already has +88 prefix, return as is
-        if phone.startswith('+88') and len(phone) == 14:
-            return phone
-            
-        # If it's an 11-digit number starting with 0
-        if len(phone) == 11 and phone.startswith('0'):
-            return f'+88{phone}'
-            
-        return phone
+        return normalize_phone(self.phone_number)
 
     def save(self, *args, **kwargs):
         """Override save to ensure phone number is properly formatted"""
@@ -120,6 +183,56 @@ def create_user_profile(sender, instance, created, **kwargs):
 def save_user_profile(sender, instance, **kwargs):
     instance.userprofile.save()
 
+
+def get_performance_percentage(total_sales, target=None):
+    """
+    Sales as a percentage of a SalesTarget, capped at 100. Without a target
+    the SALES_TARGET_DEFAULT amount is used, so ``total_sales`` must cover
+    the current day, week or month like a target would.
+    """
+    if target is not None:
+        return target.progress_percentage
+    default = Decimal(str(getattr(settings, 'SALES_TARGET_DEFAULT', 10000)))
+    return min(Decimal('100'), total_sales / default * Decimal('100'))
+
+
+class ShopAssistantQuerySet(models.QuerySet):
+    def with_performance(self, start_date=None, end_date=None):
+        """
+        Annotate performance over completed orders in an optional date window.
+
+        Adds ``period_sales``, ``period_orders``, ``period_avg_order_value`` and
+        ``performance_score`` (70% of sales plus 30% of the order count), all
+        computed in SQL so a leaderboard of any size is a single query.
+        """
+        completed = Q(order__status='completed')
+        if start_date:
+            completed &= Q(order__order_date__gte=start_date)
+        if end_date:
+            completed &= Q(order__order_date__lte=end_date)
+        money = DecimalField(max_digits=12, decimal_places=2)
+        return self.annotate(
+            period_sales=Coalesce(Sum('order__total', filter=completed), Value(Decimal('0.00')), output_field=money),
+            period_orders=Count('order', filter=completed),
+            period_avg_order_value=Coalesce(
+                Avg('order__total', filter=completed), Value(Decimal('0.00')), output_field=money
+            ),
+        ).annotate(
+            performance_score=ExpressionWrapper(
+                F('period_sales') * Value(Decimal('0.7')) + F('period_orders') * Value(Decimal('0.3')),
+                output_field=DecimalField(max_digits=14, decimal_places=2)
+            )
+        )
+
+    def with_current_sales(self, period_start):
+        """Annotate ``current_sales`` of completed orders since ``period_start``, the start of the current period"""
+        current = Q(order__status='completed', order__order_date__gte=period_start)
+        return self.annotate(current_sales=Coalesce(
+            Sum('order__total', filter=current), Value(Decimal('0.00')),
+            output_field=DecimalField(max_digits=12, decimal_places=2)
+        ))
+
+
 class ShopAssistant(models.Model):
     """Model for shop assistants (non-system users who assist in sales)"""
     name = models.CharField(max_length=100, help_text="Full name of the shop assistant")
@@ -136,6 +249,8 @@ class ShopAssistant(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ShopAssistantQuerySet.as_manager()
+
     class Meta:
         ordering = ['name']
         verbose_name = 'Shop Assistant'
@@ -146,21 +261,7 @@ class ShopAssistant(models.Model):
 
     def clean_phone_number(self):
         """Clean and format the phone number"""
-        if not self.contact_number:
-            return None
-
-        # Remove any spaces and dashes
-        phone = self.contact_number.strip().replace(' ', '').replace('-', '')
-        
-        # If already has +88 prefix, return as is
-        if phone.startswith('+88') and len(phone) == 14:
-            return phone
-            
-        # If it's an 11-digit number starting with 0
-        if len(phone) == 11 and phone.startswith('0'):
-            return f'+88{phone}'
-            
-        return phone
+        return normalize_phone(self.contact_number)
 
     def save(self, *args, **kwargs):
         """Override save to ensure phone number is properly formatted"""
@@ -194,33 +295,211 @@ class ShopAssistant(models.Model):
             status='completed'
         ).count()
 
-    def get_performance_data(self, start_date=None, end_date=None):
-        """Get performance data for a specific date range"""
+    def get_performance_summary(self, today=None):
+        """
+        Sales, order count and average order value of completed orders for
+        today, this week (from Monday), this month and all time, in one
+        aggregate query. The windows match the daily, weekly and monthly
+        SalesTarget periods.
+        """
         from sales.models import Order
-        from django.db.models import Sum, Avg
-        from django.utils import timezone
-        
-        queryset = Order.objects.filter(
-            shop_assistant=self,
-            status='completed'
-        )
-        
-        if start_date:
-            queryset = queryset.filter(order_date__gte=start_date)
-        if end_date:
-            queryset = queryset.filter(order_date__lte=end_date)
-            
-        total_sales = queryset.aggregate(total=Sum('total'))['total'] or Decimal('0.00')
-        total_orders = queryset.count()
-        avg_order_value = queryset.aggregate(avg=Avg('total'))['avg'] or Decimal('0.00')
-        
-        # Calculate performance percentage (relative to best performer)
-        max_sales = Decimal('10000')  # Assuming max target of 10,000 per period
-        performance_percentage = min(Decimal('100'), (total_sales / max_sales * Decimal('100')) if max_sales > 0 else Decimal('0'))
-            
+
+        today = today or timezone.localdate()
+        windows = {
+            'today': Q(order_date__date=today),
+            'week': Q(order_date__date__gte=today - timedelta(days=today.weekday()), order_date__date__lte=today),
+            'month': Q(order_date__date__gte=today.replace(day=1), order_date__date__lte=today),
+            'overall': Q(),
+        }
+        aggregates = {}
+        for name, window in windows.items():
+            aggregates[f'{name}_sales'] = Sum('total', filter=window or None, default=Decimal('0.00'))
+            aggregates[f'{name}_orders'] = Count('id', filter=window or None)
+            aggregates[f'{name}_average'] = Avg('total', filter=window or None, default=Decimal('0.00'))
+        totals = Order.objects.filter(shop_assistant=self, status='completed').aggregate(**aggregates)
         return {
-            'total_sales': total_sales,
-            'total_orders': total_orders,
-            'avg_order_value': avg_order_value,
-            'performance_percentage': performance_percentage,
+            name: {
+                'total_sales': totals[f'{name}_sales'],
+                'total_orders': totals[f'{name}_orders'],
+                'avg_order_value': totals[f'{name}_average'],
+            }
+            for name in windows
         }
+
+
+class SalesTarget(models.Model):
+    """
+    Sales target of a shop assistant or a salesperson for one day, week or month.
+
+    ``achieved_sales`` and ``achieved_orders`` are counters: complete_sale adds
+    every completed order and process_refund subtracts returned items, so
+    progress is read without touching the orders. ``recalculate`` rebuilds
+    them from the orders, which also happens when a target is created.
+    """
+    PERIOD_CHOICES = [
+        ('daily', 'Daily'),
+        ('weekly', 'Weekly'),
+        ('monthly', 'Monthly'),
+    ]
+
+    shop_assistant = models.ForeignKey(
+        ShopAssistant, null=True, blank=True, on_delete=models.CASCADE, related_name='sales_targets'
+    )
+    salesperson = models.ForeignKey(
+        User, null=True, blank=True, on_delete=models.CASCADE, related_name='sales_targets'
+    )
+    period = models.CharField(max_length=10, choices=PERIOD_CHOICES, default='monthly')
+    start_date = models.DateField(help_text="First day of the period; weekly targets run for 7 days, monthly targets to the end of the month")
+    end_date = models.DateField(editable=False)
+    target_amount = models.DecimalField(max_digits=12, decimal_places=2, validators=[MinValueValidator(Decimal('0.01'))])
+    achieved_sales = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
+    achieved_orders = models.PositiveIntegerField(default=0, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-start_date']
+        constraints = [
+            models.CheckConstraint(
+                condition=Q(shop_assistant__isnull=True, salesperson__isnull=False)
+                | Q(shop_assistant__isnull=False, salesperson__isnull=True),
+                name='sales_target_single_owner',
+            ),
+            models.UniqueConstraint(
+                fields=['shop_assistant', 'period', 'start_date'], name='sales_target_assistant_period_unique'
+            ),
+            models.UniqueConstraint(
+                fields=['salesperson', 'period', 'start_date'], name='sales_target_salesperson_period_unique'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['start_date', 'end_date'], name='sales_target_dates_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.owner} {self.get_period_display().lower()} target from {self.start_date}"
+
+    @property
+    def owner(self):
+        return self.shop_assistant or self.salesperson
+
+    @property
+    def progress_percentage(self):
+        """Achieved sales as a percentage of the target, capped at 100"""
+        return min(Decimal('100'), self.achieved_sales / self.target_amount * Decimal('100'))
+
+    @property
+    def avg_order_value(self):
+        if not self.achieved_orders:
+            return Decimal('0.00')
+        return self.achieved_sales / self.achieved_orders
+
+    def get_end_date(self):
+        if self.period == 'daily':
+            return self.start_date
+        if self.period == 'weekly':
+            return self.start_date + timedelta(days=6)
+        next_month = (self.start_date.replace(day=28) + timedelta(days=4)).replace(day=1)
+        return next_month - timedelta(days=1)
+
+    def save(self, *args, **kwargs):
+        self.end_date = self.get_end_date()
+        if self._state.adding:
+            self.achieved_sales, self.achieved_orders = self.get_achieved()
+        super().save(*args, **kwargs)
+
+    def get_achieved(self):
+        """Return (sales less returned items, order count) of the completed orders in the period"""
+        from sales.models import Order, OrderItem
+        orders = Order.objects.filter(
+            status='completed',
+            order_date__date__gte=self.start_date,
+            order_date__date__lte=self.end_date
+        )
+        if self.shop_assistant_id:
+            orders = orders.filter(shop_assistant_id=self.shop_assistant_id)
+        else:
+            orders = orders.filter(salesperson_id=self.salesperson_id)
+        totals = orders.aggregate(sales=Sum('total', default=Decimal('0.00')), count=Count('id'))
+        # Returned items are subtracted, as process_refund does through record_refund
+        returned = OrderItem.objects.filter(order__in=orders, status='returned').aggregate(
+            value=Sum(F('price') * F('quantity'), output_field=DecimalField(), default=Decimal('0.00'))
+        )['value']
+        return totals['sales'] - returned, totals['count']
+
+    def recalculate(self):
+        self.achieved_sales, self.achieved_orders = self.get_achieved()
+        self.save(update_fields=['achieved_sales', 'achieved_orders', 'updated_at'])
+
+    @classmethod
+    def for_order(cls, order, date=None):
+        """Targets whose owner and period cover the order"""
+        date = date or timezone.localdate(order.order_date)
+        owners = Q(salesperson_id=order.salesperson_id)
+        if order.shop_assistant_id:
+            owners |= Q(shop_assistant_id=order.shop_assistant_id)
+        return cls.objects.filter(owners, start_date__lte=date, end_date__gte=date)
+
+    @classmethod
+    def record_sale(cls, order):
+        """Add a completed order to the matching targets in one UPDATE"""
+        cls.for_order(order).update(
+            achieved_sales=F('achieved_sales') + order.total,
+            achieved_orders=F('achieved_orders') + 1
+        )
+
+    @classmethod
+    def record_refund(cls, order, amount):
+        """Subtract refunded items from the targets that counted the order"""
+        cls.for_order(order).update(achieved_sales=F('achieved_sales') - amount)
+
+    @classmethod
+    def current(cls, period, today=None, **owners):
+        """
+        Current targets of the given period keyed by owner id, for the owners
+        in ``shop_assistant__in`` or ``salesperson__in``.
+        """
+        today = today or timezone.localdate()
+        targets = cls.objects.filter(period=period, start_date__lte=today, end_date__gte=today, **owners)
+        return {target.shop_assistant_id or target.salesperson_id: target for target in targets}
+
+
+class CustomerRFM(models.Model):
+    """Recency/frequency/monetary scores for a customer, refreshed by the compute_rfm command"""
+    SEGMENT_CHOICES = [
+        ('champions', 'Champions'),
+        ('loyal', 'Loyal Customers'),
+        ('potential', 'Potential Loyalists'),
+        ('new', 'New Customers'),
+        ('at_risk', 'At Risk'),
+        ('hibernating', 'Hibernating'),
+        ('lost', 'Lost'),
+    ]
+
+    customer = models.OneToOneField(Customer, on_delete=models.CASCADE, related_name='rfm')
+    last_order_at = models.DateTimeField(help_text="Date of the customer's latest completed order")
+    frequency = models.PositiveIntegerField(default=0, help_text="Number of completed orders")
+    monetary = models.DecimalField(max_digits=12, decimal_places=2, default=0, help_text="Total spent on completed orders")
+    recency_score = models.PositiveSmallIntegerField(default=1)
+    frequency_score = models.PositiveSmallIntegerField(default=1)
+    monetary_score = models.PositiveSmallIntegerField(default=1)
+    segment = models.CharField(max_length=20, choices=SEGMENT_CHOICES)
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = 'Customer RFM Score'
+        verbose_name_plural = 'Customer RFM Scores'
+        indexes = [
+            models.Index(fields=['segment', '-monetary'], name='rfm_segment_monetary_idx'),
+            models.Index(fields=['-last_order_at'], name='rfm_last_order_idx'),
+            models.Index(fields=['frequency'], name='rfm_frequency_idx'),
+            models.Index(fields=['-monetary'], name='rfm_monetary_idx'),
+            models.Index(fields=['computed_at'], name='rfm_computed_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.customer.name} - {self.rfm_score} ({self.get_segment_display()})"
+
+    @property
+    def rfm_score(self):
+        """Combined score in the usual R-F-M digit notation, e.g. '545'"""
+        return f"{self.recency_score}{self.frequency_score}{self.monetary_score}"
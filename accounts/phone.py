@@ -0,0 +1,72 @@
+"""
+Phone number normalisation and indexed phone search.
+
+Numbers are stored in the +88 format: ``+88`` followed by the 11-digit local
+number starting with 0 (``+8801717508447``). For search, customers also
+store the local digits (``01717508447``) and the same digits reversed.
+Both columns are indexed. A number is found by its beginning with a range
+scan on the digits, and by its last digits with a range scan on the
+reversed digits. A LIKE '%...%' scan can use neither index.
+
+The country code is only taken off complete numbers and fragments typed
+with a leading ``+88``. Other fragments are searched as typed: ``88012``
+may be the end of a number, not ``012`` with a country code in front.
+"""
+import re
+
+COUNTRY_CODE = '88'
+# Digits of a local number: 0 followed by the 10-digit subscriber number
+LOCAL_LENGTH = 11
+PHONE_QUERY_RE = re.compile(r'^\+?[\d\s-]+$')
+
+
+def normalize_phone(value):
+    """Return the number in the +88 format, or the cleaned input when it has another format"""
+    if not value:
+        return None
+    phone = value.strip().replace(' ', '').replace('-', '')
+    if phone.startswith('+' + COUNTRY_CODE) and len(phone) == 14:
+        return phone
+    if len(phone) == LOCAL_LENGTH and phone.startswith('0'):
+        return f'+{COUNTRY_CODE}{phone}'
+    return phone
+
+
+def is_valid_phone(value):
+    phone = normalize_phone(value)
+    return bool(phone) and len(phone) == 14 and phone.startswith('+' + COUNTRY_CODE)
+
+
+def get_local_digits(value):
+    """Digits of the local number, without the country code: '+88 01717-508447' -> '01717508447'"""
+    digits = ''.join(filter(str.isdigit, value or ''))
+    if len(digits) == len(COUNTRY_CODE) + LOCAL_LENGTH and digits.startswith(COUNTRY_CODE + '0'):
+        digits = digits[len(COUNTRY_CODE):]
+    return digits
+
+
+def get_fragment_digits(value):
+    """Digits to search for a number fragment: '+880171' -> '0171', but '88012' stays '88012'"""
+    digits = get_local_digits(value)
+    if (value or '').strip().startswith('+' + COUNTRY_CODE) and digits.startswith(COUNTRY_CODE):
+        digits = digits[len(COUNTRY_CODE):]
+    return digits
+
+
+def get_search_fields(value):
+    """Values of the indexed search columns for a phone number"""
+    digits = get_local_digits(value)
+    return {'phone_digits': digits, 'phone_digits_reversed': digits[::-1]}
+
+
+def get_search_digits(query):
+    """Return the digits to search for when the query is a phone number fragment, else None"""
+    if not query or not PHONE_QUERY_RE.match(query.strip()):
+        return None
+    return get_fragment_digits(query) or None
+
+
+def starts_with(field, digits):
+    """Range lookup equivalent to ``field LIKE 'digits%'`` that can use an index on the field"""
+    # ':' is the character after '9', so the range holds every digit string with the prefix
+    return {f'{field}__gte': digits, f'{field}__lt': digits + ':'}
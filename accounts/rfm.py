@@ -0,0 +1,153 @@
+"""
+Recency/frequency/monetary (RFM) segmentation for customers.
+
+Scores are quintiles (1-5) over every customer with completed orders. A full
+refresh recomputes the order aggregates of every customer from one grouped
+query over Order. An incremental refresh only recomputes the aggregates of
+customers who ordered since the previous run, or whose stored frequency and
+monetary value no longer match the activity columns kept on Customer (orders
+cancelled since). Either way every stored row is then rescored against
+quintile boundaries computed afresh, so recency keeps decaying and the
+boundaries follow the whole customer base.
+"""
+from bisect import bisect_left
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Max, Q, Sum
+from django.utils import timezone
+
+from sales.models import Order
+from .models import CustomerRFM
+
+SCORE_LEVELS = 5
+BATCH_SIZE = 1000
+
+# Orders are stamped when created but only marked completed at the end of the
+# checkout transaction, so incremental runs look back a little further.
+INCREMENTAL_OVERLAP = timedelta(minutes=5)
+
+SCORED_FIELDS = ('last_order_at', 'frequency', 'monetary')
+RESULT_FIELDS = ('recency_score', 'frequency_score', 'monetary_score', 'segment')
+
+
+def get_segment(recency_score, frequency_score):
+    """Map recency and frequency scores onto a named segment"""
+    if recency_score >= 4 and frequency_score >= 4:
+        return 'champions'
+    if recency_score >= 3 and frequency_score >= 3:
+        return 'loyal'
+    if recency_score >= 4 and frequency_score <= 1:
+        return 'new'
+    if recency_score >= 3:
+        return 'potential'
+    if frequency_score >= 3:
+        return 'at_risk'
+    if recency_score == 2:
+        return 'hibernating'
+    return 'lost'
+
+
+def get_breakpoints(sorted_values):
+    """Return the quintile boundaries of an ascending list of values"""
+    count = len(sorted_values)
+    if not count:
+        return []
+    return [sorted_values[count * i // SCORE_LEVELS] for i in range(1, SCORE_LEVELS)]
+
+
+def score(value, breakpoints):
+    """Score a value from 1 to 5; ties fall into the lower bucket"""
+    return 1 + bisect_left(breakpoints, value)
+
+
+def apply_scores(rfm, breakpoints):
+    rfm.recency_score = score(rfm.last_order_at, breakpoints['last_order_at'])
+    rfm.frequency_score = score(rfm.frequency, breakpoints['frequency'])
+    rfm.monetary_score = score(rfm.monetary, breakpoints['monetary'])
+    rfm.segment = get_segment(rfm.recency_score, rfm.frequency_score)
+
+
+def rescore(now):
+    """Score every stored row against fresh quintile boundaries; returns the number of changed rows"""
+    rows = list(CustomerRFM.objects.only('id', *SCORED_FIELDS, *RESULT_FIELDS))
+    breakpoints = {
+        field: get_breakpoints(sorted(getattr(row, field) for row in rows))
+        for field in SCORED_FIELDS
+    }
+    changed = []
+    for row in rows:
+        before = [getattr(row, field) for field in RESULT_FIELDS]
+        apply_scores(row, breakpoints)
+        if [getattr(row, field) for field in RESULT_FIELDS] != before:
+            changed.append(row)
+    CustomerRFM.objects.bulk_update(changed, RESULT_FIELDS, batch_size=BATCH_SIZE)
+    CustomerRFM.objects.update(computed_at=now)
+    return len(changed)
+
+
+def refresh_rfm(full=False):
+    """
+    Recompute RFM aggregates, then scores and segments.
+
+    Returns a dict with the number of customers whose aggregates were
+    recomputed, the number of rows whose scores changed, the number of
+    stale rows removed and whether a full refresh was performed.
+    """
+    now = timezone.now()
+    orders = Order.objects.filter(status='completed', customer__isnull=False)
+
+    since = None
+    drifted = set()
+    if not full:
+        since = CustomerRFM.objects.aggregate(since=Max('computed_at'))['since']
+        full = since is None
+    if not full:
+        changed_customers = orders.filter(
+            order_date__gte=since - INCREMENTAL_OVERLAP
+        ).values('customer_id')
+        drifted = set(
+            CustomerRFM.objects.exclude(
+                frequency=F('customer__order_count'), monetary=F('customer__total_purchase_value')
+            ).values_list('customer_id', flat=True)
+        )
+        orders = orders.filter(Q(customer_id__in=changed_customers) | Q(customer_id__in=drifted))
+
+    stats = orders.values('customer_id').annotate(
+        last_order_at=Max('order_date'),
+        frequency=Count('id'),
+        monetary=Sum('total'),
+    ).order_by()
+
+    rows = [
+        CustomerRFM(computed_at=now, **row)
+        for row in stats.iterator(chunk_size=BATCH_SIZE)
+    ]
+
+    with transaction.atomic():
+        CustomerRFM.objects.bulk_create(
+            rows,
+            batch_size=BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['customer'],
+            update_fields=[*SCORED_FIELDS, 'computed_at'],
+        )
+        if full:
+            # Customers whose orders were all removed no longer have a score
+            removed, _ = CustomerRFM.objects.exclude(computed_at=now).delete()
+        else:
+            # Drifted customers without a completed order left
+            removed, _ = CustomerRFM.objects.filter(
+                customer_id__in=drifted - {row.customer_id for row in rows}
+            ).delete()
+        rescored = rescore(now)
+
+    return {'customers': len(rows), 'rescored': rescored, 'removed': removed, 'full': full}
+
+
+def get_segment_counts():
+    """Return {segment: count} for every segment, including empty ones"""
+    counts = dict(
+        CustomerRFM.objects.values_list('segment').annotate(count=Count('id')).order_by()
+    )
+    return {segment: counts.get(segment, 0) for segment, _ in CustomerRFM.SEGMENT_CHOICES}
@@ -1,3 +1,560 @@
-from django.test import TestCase
+import csv
+import json
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Avg, Count, Max, Sum
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from accounts.autocomplete import customer_index
+from accounts.merging import merge_customers, merge_duplicates
+from accounts.models import Customer, CustomerRFM, SalesTarget, get_performance_percentage
+from accounts.rfm import (
+    INCREMENTAL_OVERLAP, SCORED_FIELDS, get_breakpoints, get_segment, refresh_rfm, score
+)
+from core.testing import QueryBudgetMixin, seed_store
+from inventory.models import Inventory
+from sales.models import Order, SalespersonDailySales
+
+
+class AccountsQueryBudgetTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_store()
+        cls.customer = cls.data['customers'][0]
+        cls.assistant = cls.data['assistants'][0]
+
+    def setUp(self):
+        self.client.force_login(self.data['admin'])
+
+    def test_customer_list(self):
+        self.assertQueryBudget(5, '/accounts/customers/')
+        self.assertQueryBudget(5, '/accounts/customers/?search=Customer&page=2')
+        self.assertQueryBudget(3, '/accounts/customers/export/')
+
+    def test_customer_pages(self):
+        self.assertQueryBudget(2, '/accounts/customers/add/')
+        self.assertQueryBudget(8, f'/accounts/customers/{self.customer.pk}/')
+        self.assertQueryBudget(5, f'/accounts/customers/{self.customer.pk}/edit/')
+        self.assertQueryBudget(3, f'/accounts/customers/{self.customer.pk}/delete/')
+
+    def test_salesperson_list(self):
+        response = self.assertQueryBudget(4, '/accounts/salespersons/')
+        for profile in response.context['salespersons']:
+            orders = [order for order in self.data['orders'] if order.salesperson_id == profile.user_id]
+            self.assertEqual(profile.period_orders, len(orders))
+            self.assertEqual(profile.period_sales, sum((order.total for order in orders), Decimal('0.00')))
+
+    def test_salesperson_detail(self):
+        profile = self.data['salespersons'][0].userprofile
+        response = self.assertQueryBudget(7, f'/accounts/salespersons/{profile.pk}/')
+        orders = [order for order in self.data['orders'] if order.salesperson_id == profile.user_id]
+        self.assertEqual(response.context['performance']['overall']['total_orders'], len(orders))
+        # Same calendar week and month as the shop assistant pages and the targets
+        today = timezone.localdate()
+        for key, since in (('week', today - timedelta(days=today.weekday())), ('month', today.replace(day=1))):
+            window = [order for order in orders if since <= timezone.localdate(order.order_date) <= today]
+            self.assertEqual(response.context['performance'][key]['total_orders'], len(window), key)
+
+    def test_shop_assistant_list(self):
+        response = self.assertQueryBudget(5, '/accounts/shop-assistants/')
+        for assistant in response.context['shop_assistants']:
+            self.assertEqual(assistant.period_sales, assistant.total_sales)
+            self.assertEqual(assistant.period_orders, assistant.total_orders)
+
+    def test_shop_assistant_pages(self):
+        self.assertQueryBudget(2, '/accounts/shop-assistants/add/')
+        response = self.assertQueryBudget(6, f'/accounts/shop-assistants/{self.assistant.pk}/')
+        # The cards cover the periods of daily, weekly and monthly targets
+        today = timezone.localdate()
+        orders = Order.objects.filter(shop_assistant=self.assistant, status='completed')
+        for key, since in (
+            ('today_performance', today),
+            ('week_performance', today - timedelta(days=today.weekday())),
+            ('month_performance', today.replace(day=1)),
+        ):
+            window = orders.filter(order_date__date__gte=since, order_date__date__lte=today)
+            self.assertEqual(response.context[key]['total_orders'], window.count(), key)
+            self.assertEqual(
+                response.context[key]['total_sales'], window.aggregate(total=Sum('total', default=Decimal('0.00')))['total']
+            )
+        self.assertEqual(response.context['overall_performance']['total_sales'], self.assistant.total_sales)
+        self.assertQueryBudget(3, f'/accounts/shop-assistants/{self.assistant.pk}/edit/')
+        self.assertQueryBudget(6, f'/accounts/shop-assistants/{self.assistant.pk}/delete/')
+
+    def test_shop_assistant_analytics(self):
+        # Pending orders count nowhere
+        Order.objects.bulk_create([
+            Order(shop_assistant=assistant, salesperson=self.data['admin'], status='pending', total=Decimal('1000'))
+            for assistant in self.data['assistants']
+        ])
+        for period in ('daily', 'weekly', 'monthly'):
+            response = self.assertQueryBudget(5, f'/accounts/shop-assistants/analytics/?period={period}')
+
+        # Figures match the per-assistant calculation, and every order of the
+        # charted assistants falls into one of the monthly buckets
+        context = response.context
+        month_start = context['end_date'].astimezone().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        for item in context['assistants_performance']:
+            orders = Order.objects.filter(shop_assistant=item['assistant'], status='completed')
+            window = orders.filter(order_date__gte=context['start_date'], order_date__lte=context['end_date'])
+            expected = window.aggregate(
+                total_sales=Sum('total', default=Decimal('0.00')), total_orders=Count('id'),
+                avg_order_value=Avg('total', default=Decimal('0.00')),
+            )
+            current = orders.filter(order_date__gte=month_start).aggregate(total=Sum('total', default=Decimal('0.00')))
+            self.assertEqual(
+                {key: item['data'][key] for key in expected}, expected
+            )
+            # Without a target, performance is this month's sales against the default amount
+            self.assertEqual(item['data']['current_sales'], current['total'])
+            self.assertEqual(
+                item['data']['performance_percentage'], get_performance_percentage(current['total'])
+            )
+        chart = json.loads(context['chart_data'])
+        charted = {dataset['label'] for dataset in chart['datasets']}
+        self.assertAlmostEqual(
+            sum(sum(dataset['data']) for dataset in chart['datasets']),
+            float(sum(order.total for order in self.data['orders'] if order.shop_assistant and order.shop_assistant.name in charted))
+        )
+
+    def test_shop_assistant_analytics_chart_at_month_end(self):
+        # A year back from the 31st starts on a day February does not have
+        now = timezone.make_aware(datetime(2026, 1, 31, 12))
+        with mock.patch('django.utils.timezone.now', return_value=now):
+            response = self.client.get('/accounts/shop-assistants/analytics/?period=monthly')
+        chart = json.loads(response.context['chart_data'])
+        self.assertEqual(chart['labels'], [f'2025-{month:02d}' for month in range(4, 13)] + ['2026-01'])
+
+    def test_shop_assistant_reports(self):
+        response = self.assertQueryBudget(5, '/accounts/shop-assistants/reports/')
+        scores = [stat['performance_score'] for stat in response.context['assistant_stats']]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        top = response.context['assistant_stats'][0]
+        self.assertEqual(
+            top['performance_score'],
+            (top['total_sales'] * Decimal('0.7') + top['total_orders'] * Decimal('0.3')).quantize(Decimal('0.01'))
+        )
+
+    def test_shop_assistant_admin(self):
+        self.assertQueryBudget(7, '/admin/accounts/shopassistant/')
+        self.assertQueryBudget(7, '/admin/accounts/shopassistant/?o=6')
+
+    def test_api(self):
+        self.assertQueryBudget(3, '/accounts/profile/')
+        self.assertQueryBudget(3, '/accounts/api/customer-search/?q=Customer')
+        self.assertQueryBudget(3, '/accounts/api/shop-assistant-search/?q=Assistant')
+
+
+class SalesTargetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_store(customers=5, products=5, orders=20, assistants=2, salespersons=2, days=3)
+        cls.assistant = cls.data['assistants'][0]
+        cls.product = cls.data['products'][1]
+
+    def setUp(self):
+        self.client.force_login(self.data['admin'])
+        self.target = SalesTarget.objects.create(
+            shop_assistant=self.assistant, period='monthly',
+            start_date=timezone.localdate().replace(day=1), target_amount=Decimal('50000')
+        )
+
+    def sell(self, quantity=1):
+        payload = {
+            'shop_assistant': self.assistant.pk,
+            'items': [{'id': self.product.pk, 'quantity': quantity, 'price': str(self.product.price)}],
+            'payment_method': 'cash',
+            'amount_paid': str(self.product.price * quantity),
+        }
+        response = self.client.post('/sales/api/complete-sale/', data=json.dumps(payload), content_type='application/json')
+        return Order.objects.get(pk=response.json()['order_id'])
+
+    def assertCountersMatchOrders(self):
+        self.target.refresh_from_db()
+        self.assertEqual((self.target.achieved_sales, self.target.achieved_orders), self.target.get_achieved())
+
+    def test_progress_is_counted_on_creation(self):
+        self.assertGreater(self.target.achieved_orders, 0)
+        self.assertCountersMatchOrders()
+        self.assertEqual(self.target.end_date.month, self.target.start_date.month)
+
+    def test_sales_and_refunds_update_progress(self):
+        before = self.target.achieved_sales
+        order = self.sell(quantity=2)
+        self.assertCountersMatchOrders()
+        self.assertEqual(self.target.achieved_sales, before + order.total)
+
+        item = order.orderitem_set.get()
+        self.client.post(f'/sales/order/{order.pk}/refund/', {'items[]': [item.pk], 'reason': 'Wrong size'})
+        self.target.refresh_from_db()
+        self.assertEqual(self.target.achieved_sales, before)
+        self.assertCountersMatchOrders()
+
+        # The salesperson rollup subtracts the return as well, as a rebuild would
+        daily_sales = list(SalespersonDailySales.objects.values_list('salesperson', 'date', 'total_sales', 'order_count'))
+        SalespersonDailySales.rebuild()
+        self.assertCountEqual(
+            SalespersonDailySales.objects.values_list('salesperson', 'date', 'total_sales', 'order_count'), daily_sales
+        )
+
+        # Refunding the same item again changes neither the target nor the stock
+        stock = Inventory.objects.get(product=self.product).quantity
+        self.client.post(f'/sales/order/{order.pk}/refund/', {'items[]': [item.pk], 'reason': 'Again'})
+        self.assertCountersMatchOrders()
+        self.assertEqual(self.target.achieved_sales, before)
+        self.assertEqual(Inventory.objects.get(product=self.product).quantity, stock)
+
+    def test_analytics_shows_target_progress(self):
+        response = self.client.get('/accounts/shop-assistants/analytics/?period=monthly')
+        item = next(item for item in response.context['assistants_performance'] if item['assistant'] == self.assistant)
+        self.assertEqual(item['data']['target'], self.target)
+        self.assertEqual(item['data']['performance_percentage'], self.target.progress_percentage)
+
+
+class CustomerPhoneSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = Customer.objects.create(name='Rina', phone_number='01717-508 447')
+        Customer.objects.create(name='Karim', phone_number='+8801812345678')
+
+    def test_phone_is_normalized_and_indexed(self):
+        self.assertEqual(self.customer.phone_number, '+8801717508447')
+        self.assertEqual(self.customer.phone_digits, '01717508447')
+        self.assertEqual(self.customer.phone_digits_reversed, '74480571710')
+
+    def test_search_by_start_or_end_of_number(self):
+        for query in ('508447', '0171750', '+880171', '01717-508447'):
+            self.assertEqual(list(Customer.objects.search(query)), [self.customer], query)
+        self.assertEqual(list(Customer.objects.search('Karim')), list(Customer.objects.filter(name='Karim')))
+
+    def test_fragments_keep_a_leading_88(self):
+        ending = Customer.objects.create(name='Shila', phone_number='01700088012')
+        self.assertEqual(list(Customer.objects.search('88012')), [ending])
+        self.assertEqual(list(Customer.objects.search('8801')), [])
+        # A leading + marks the country code
+        self.assertEqual(list(Customer.objects.search('+88017000')), [ending])
+        self.assertEqual(list(Customer.objects.search('8801700088012')), [ending])
+
+    def test_phone_search_uses_indexes(self):
+        sql = str(Customer.objects.search('508447').query)
+        self.assertIn('phone_digits_reversed', sql)
+        self.assertNotIn('LIKE', sql)
+
+
+class CustomerAutocompleteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.regular = Customer.objects.create(name='Rina Akter', phone_number='01717508447')
+        cls.other = Customer.objects.create(name='Rina Begum', phone_number='01812508447')
+        Customer.objects.filter(pk=cls.regular.pk).update(total_purchase_value=Decimal('900'))
+
+    def setUp(self):
+        customer_index.clear()
+        self.client.force_login(User.objects.create_user('cashier', password='x'))
+
+    def search(self, query):
+        response = self.client.get('/sales/api/search-customers/', {'q': query})
+        return [customer['id'] for customer in response.json()['customers']]
+
+    @contextmanager
+    def assertNoCustomerQueries(self):
+        with CaptureQueriesContext(connection) as queries:
+            yield
+        self.assertFalse([query['sql'] for query in queries if 'accounts_customer' in query['sql']])
+
+    def test_served_from_memory_and_ranked_by_purchase_value(self):
+        self.search('ri')
+        with self.assertNoCustomerQueries():
+            self.assertEqual(self.search('rina'), [self.regular.pk, self.other.pk])
+            self.assertEqual(self.search('rin beg'), [self.other.pk])
+            self.assertEqual(self.search('08447'), [self.regular.pk, self.other.pk])
+            self.assertEqual(self.search('01812'), [self.other.pk])
+
+    def test_committed_changes_update_the_index(self):
+        self.search('ri')
+        with self.captureOnCommitCallbacks(execute=True):
+            added = Customer.objects.create(name='Nadia Rahman', phone_number='01911000111')
+            self.other.delete()
+        with self.assertNoCustomerQueries():
+            self.assertEqual(self.search('nad'), [added.pk])
+            self.assertEqual(self.search('rina'), [self.regular.pk])
+
+    def test_rank_changes_do_not_invalidate_other_indexes(self):
+        self.search('ri')
+        version = customer_index.read_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.other.total_purchase_value = Decimal('5000')
+            self.other.save(update_fields=['total_purchase_value'])
+            Customer.objects.get(pk=self.regular.pk).save()
+        self.assertEqual(customer_index.read_version(), version)
+        with self.assertNoCustomerQueries():
+            self.assertEqual(self.search('rina'), [self.other.pk, self.regular.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.other.name = 'Nadia Begum'
+            self.other.save(update_fields=['name'])
+        self.assertNotEqual(customer_index.read_version(), version)
+        self.assertEqual(self.search('rina'), [self.regular.pk])
+
+    def test_ties_ranked_by_latest_order_not_profile_edits(self):
+        Customer.objects.filter(pk=self.other.pk).update(
+            total_purchase_value=Decimal('900'), last_order_at=timezone.now(),
+        )
+        Customer.objects.filter(pk=self.regular.pk).update(last_order_at=timezone.now() - timedelta(days=30))
+        with self.captureOnCommitCallbacks(execute=True):
+            Customer.objects.get(pk=self.regular.pk).save()
+        self.assertEqual(self.search('rina'), [self.other.pk, self.regular.pk])
+
+    def test_change_by_another_process_is_not_marked_seen(self):
+        self.search('ri')
+        # Another till adds a customer and replaces the version file first
+        added = Customer.objects.create(name='Rina Khatun')
+        customer_index.write_version()
+        customer_index.apply(self.other.pk, {
+            'id': self.other.pk, 'name': 'Nadia Begum', 'phone_number': self.other.phone_number,
+            'total_purchase_value': Decimal('0'), 'last_order_at': None,
+        })
+        self.assertFalse(customer_index.is_current())
+        self.assertIn(added.pk, self.search('rina'))
+
+    @override_settings(CUSTOMER_INDEX_BACKGROUND=True)
+    def test_stale_index_answers_while_rebuilt(self):
+        self.search('ri')
+        customer_index.invalidate()
+        with customer_index._build_lock, self.assertNoCustomerQueries():
+            # A rebuild is already running: no second one starts and the old index answers
+            self.assertEqual(self.search('rina'), [self.regular.pk, self.other.pk])
+
+    def test_database_is_searched_on_a_miss(self):
+        self.assertEqual(self.search('akter'), [self.regular.pk])
+        self.assertEqual(self.search('kter'), [self.regular.pk])
+
+
+class CustomerActivityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_store(customers=3, products=5, orders=12, assistants=1, salespersons=1, days=5)
+        cls.customer = Customer.objects.create(name='New Customer')
+        cls.product = cls.data['products'][1]
+
+    def setUp(self):
+        self.client.force_login(self.data['admin'])
+
+    def sell(self):
+        payload = {
+            'customer': self.customer.pk,
+            'items': [{'id': self.product.pk, 'quantity': 1, 'price': str(self.product.price)}],
+            'payment_method': 'cash',
+            'amount_paid': str(self.product.price),
+        }
+        response = self.client.post('/sales/api/complete-sale/', data=json.dumps(payload), content_type='application/json')
+        return Order.objects.get(pk=response.json()['order_id'])
+
+    def test_seeded_stats_match_orders(self):
+        for customer in Customer.objects.exclude(pk=self.customer.pk):
+            orders = Order.objects.filter(customer=customer, status='completed').order_by('order_date')
+            self.assertEqual(customer.order_count, orders.count())
+            if orders:
+                self.assertEqual((customer.first_order_at, customer.last_order_at), (orders.first().order_date, orders.last().order_date))
+
+    def test_sale_and_refund_update_activity(self):
+        first = self.sell()
+        second = self.sell()
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.order_count, 2)
+        self.assertEqual((self.customer.first_order_at, self.customer.last_order_at), (first.order_date, second.order_date))
+        self.assertEqual(self.customer.total_purchase_value, first.total + second.total)
+
+        item = second.orderitem_set.get()
+        self.client.post(f'/sales/order/{second.pk}/refund/', {'items[]': [item.pk], 'reason': 'Wrong size'})
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.order_count, 2)
+
+    def test_list_filters_on_last_order(self):
+        order = self.sell()
+        day = timezone.localdate(order.order_date).isoformat()
+        response = self.client.get('/accounts/customers/', {'date_from': day, 'date_to': day})
+        self.assertIn(self.customer, response.context['customers'])
+        response = self.client.get('/accounts/customers/', {'date_to': '2000-01-01'})
+        self.assertNotIn(self.customer, response.context['customers'])
+
+
+class CustomerRFMTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_store(customers=25, products=5, orders=80, assistants=1, salespersons=2, days=60)
+
+    def setUp(self):
+        self.client.force_login(self.data['admin'])
+
+    def expected_stats(self):
+        return {
+            row['customer_id']: (row['last'], row['count'], row['total'])
+            for row in Order.objects.filter(status='completed', customer__isnull=False)
+            .values('customer_id').annotate(last=Max('order_date'), count=Count('id'), total=Sum('total')).order_by()
+        }
+
+    def stored_stats(self):
+        return {
+            rfm.customer_id: (rfm.last_order_at, rfm.frequency, rfm.monetary) for rfm in CustomerRFM.objects.all()
+        }
+
+    def assertScoredAgainstAllRows(self):
+        breakpoints = {
+            field: get_breakpoints(sorted(CustomerRFM.objects.values_list(field, flat=True)))
+            for field in SCORED_FIELDS
+        }
+        for rfm in CustomerRFM.objects.all():
+            self.assertEqual(rfm.recency_score, score(rfm.last_order_at, breakpoints['last_order_at']))
+            self.assertEqual(rfm.frequency_score, score(rfm.frequency, breakpoints['frequency']))
+            self.assertEqual(rfm.monetary_score, score(rfm.monetary, breakpoints['monetary']))
+            self.assertEqual(rfm.segment, get_segment(rfm.recency_score, rfm.frequency_score))
+
+    def test_full_run_scores_every_customer_with_orders(self):
+        out = StringIO()
+        call_command('compute_rfm', '--full', stdout=out)
+        self.assertIn(f'Full RFM refresh recomputed {len(self.expected_stats())} customers', out.getvalue())
+        self.assertEqual(self.stored_stats(), self.expected_stats())
+        self.assertScoredAgainstAllRows()
+        self.assertEqual(len({rfm.monetary_score for rfm in CustomerRFM.objects.all()}), 5)
+
+    def test_incremental_run_rescores_every_customer(self):
+        refresh_rfm(full=True)
+        customer = CustomerRFM.objects.order_by('frequency', 'pk').first().customer
+        Order.objects.create(customer=customer, salesperson=self.data['admin'], status='completed', total=Decimal('99999'))
+        customer.update_order_stats()
+
+        since = CustomerRFM.objects.aggregate(since=Max('computed_at'))['since'] - INCREMENTAL_OVERLAP
+        changed = set(Order.objects.filter(status='completed', order_date__gte=since).values_list('customer_id', flat=True))
+        result = refresh_rfm()
+        self.assertEqual((result['customers'], result['removed'], result['full']), (len(changed - {None}), 0, False))
+        self.assertEqual(self.stored_stats(), self.expected_stats())
+        # The new order moves the boundaries, so the other customers are rescored too
+        self.assertScoredAgainstAllRows()
+
+        rfm = CustomerRFM.objects.get(customer=customer)
+        self.assertEqual((rfm.recency_score, rfm.monetary_score), (5, 5))
+
+    def test_incremental_run_picks_up_cancelled_orders(self):
+        refresh_rfm(full=True)
+        customer_id, (_, frequency, _) = next(
+            (customer_id, stats) for customer_id, stats in self.expected_stats().items() if stats[1] > 1
+        )
+        gone = next(iter(set(self.expected_stats()) - {customer_id}))
+        order = Order.objects.filter(customer_id=customer_id, status='completed').earliest('order_date')
+        for cancelled in (order, *Order.objects.filter(customer_id=gone)):
+            cancelled.status = 'cancelled'
+            cancelled.save()
+            cancelled.customer.update_order_stats()
+
+        result = refresh_rfm()
+        self.assertEqual(result['removed'], 1)
+        self.assertEqual(self.stored_stats(), self.expected_stats())
+        self.assertEqual(CustomerRFM.objects.get(customer_id=customer_id).frequency, frequency - 1)
+        self.assertScoredAgainstAllRows()
+
+    def test_full_run_removes_customers_without_orders(self):
+        refresh_rfm(full=True)
+        customer_id = next(iter(self.expected_stats()))
+        Order.objects.filter(customer_id=customer_id).update(status='cancelled')
+        self.assertEqual(refresh_rfm(full=True)['removed'], 1)
+        self.assertFalse(CustomerRFM.objects.filter(customer_id=customer_id).exists())
+
+    def test_segment_filter_and_export(self):
+        refresh_rfm(full=True)
+        segment = CustomerRFM.objects.values_list('segment', flat=True).order_by('segment').first()
+        members = set(CustomerRFM.objects.filter(segment=segment).values_list('customer_id', flat=True))
+
+        response = self.client.get('/accounts/customers/', {'segment': segment})
+        self.assertEqual({customer.pk for customer in response.context['paginator'].object_list}, members)
+
+        response = self.client.get('/accounts/customers/export/')
+        rows = list(csv.reader(response.content.decode().splitlines()))
+        self.assertEqual(rows[0][:5], ['Customer ID', 'Name', 'Phone Number', 'Email', 'Segment'])
+        self.assertEqual(len(rows) - 1, CustomerRFM.objects.count())
+        # Biggest spenders first
+        self.assertEqual([Decimal(row[-1]) for row in rows[1:]], sorted((Decimal(row[-1]) for row in rows[1:]), reverse=True))
+
+        response = self.client.get('/accounts/customers/export/', {'segment': segment})
+        self.assertEqual(response['Content-Disposition'], f'attachment; filename="customers_{segment}.csv"')
+        rows = list(csv.reader(response.content.decode().splitlines()))[1:]
+        self.assertEqual({int(row[0]) for row in rows}, members)
+
+
+class CustomerImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('manager', password='x')
+        cls.existing = Customer.objects.create(name='Existing', phone_number='01711000001')
+
+    def test_upload_skips_duplicates_and_invalid_rows(self):
+        self.client.force_login(self.user)
+        upload = SimpleUploadedFile('customers.csv', (
+            'Name,Phone,Email\n'
+            'Rina,01711 000002,rina@example.com\n'
+            'Existing again,+8801711000001,\n'
+            'Rina twin,017-1100-0002,\n'
+            ',01711000003,\n'
+            'Bad phone,12345,\n'
+            'No phone,,\n'
+        ).encode())
+        response = self.client.post('/accounts/customers/import/', {'file': upload})
+        report = response.context['report']
+        self.assertEqual((report.rows, report.created, report.skipped), (6, 2, 4))
+        problems = dict(report.problems)
+        self.assertEqual(sorted(problems), [2, 3, 4, 5])
+        self.assertIn(f'customer #{self.existing.pk}', problems[2])
+        self.assertIn('duplicate of row 1', problems[3])
+        rina = Customer.objects.get(name='Rina')
+        self.assertEqual((rina.phone_number, rina.phone_digits), ('+8801711000002', '01711000002'))
+
+    def test_command_reads_json_lines(self):
+        path = Path(self.enterContext(TemporaryDirectory())) / 'customers.jsonl'
+        path.write_text('{"name": "Nadia", "phone_number": 1911000111}\n{"name": "Nadia", "phone": "01911000111"}\n')
+        out = StringIO()
+        call_command('import_customers', str(path), stdout=out)
+        self.assertIn('2 rows: 1 created, 1 skipped', out.getvalue())
+        self.assertTrue(Customer.objects.search('000111').filter(name='Nadia').exists())
+
+
+class CustomerMergeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('cashier', password='x')
+        cls.first = Customer.objects.create(name='Rina', phone_number='01711000001')
+        cls.second = Customer.objects.create(name='Rina A.', phone_number='+8801711000001', email='rina@example.com')
+        cls.third = Customer.objects.create(name='Rina Akter', phone_number='01711 000 001')
+        cls.other = Customer.objects.create(name='Karim', phone_number='01811000002')
+        for customer, totals in ((cls.first, [100]), (cls.second, [200, 300]), (cls.third, []), (cls.other, [50])):
+            for total in totals:
+                Order.objects.create(customer=customer, salesperson=cls.user, status='completed', total=Decimal(total))
+        Customer.objects.refresh_order_stats()
+
+    def test_merge_moves_orders_and_recomputes_survivor(self):
+        with self.assertNumQueries(8):
+            merged = merge_customers(self.first, [self.third])
+        self.assertEqual(merged, 1)
+        self.assertFalse(Customer.objects.filter(pk=self.third.pk).exists())
+        self.first.refresh_from_db()
+        self.assertEqual((self.first.order_count, self.first.total_purchase_value), (1, Decimal('100')))
+
+    def test_merge_by_phone(self):
+        self.assertEqual(merge_duplicates(), (1, 2))
+        survivor = Customer.objects.get(phone_digits='01711000001')
+        self.assertEqual(survivor.pk, self.second.pk)
+        self.assertEqual((survivor.order_count, survivor.total_purchase_value), (3, Decimal('600')))
+        self.assertEqual(Order.objects.filter(customer=survivor).count(), 3)
+        self.assertEqual(Customer.objects.count(), 2)
+        self.assertEqual(merge_duplicates(), (0, 0))
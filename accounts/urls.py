@@ -8,11 +8,14 @@ app_name = 'accounts'
 urlpatterns = [
     path('login/', auth_views.LoginView.as_view(template_name='accounts/login.html'), name='login'),
     path('customers/', views.CustomerListView.as_view(), name='customer-list'),
+    path('customers/export/', views.export_customer_segment, name='customer-export'),
     path('customers/add/', views.CustomerCreateView.as_view(), name='customer-add'),
+    path('customers/import/', views.customer_import, name='customer-import'),
     path('customers/<int:pk>/', views.CustomerDetailView.as_view(), name='customer-detail'),
     path('customers/<int:pk>/edit/', views.CustomerUpdateView.as_view(), name='customer-edit'),
     path('customers/<int:pk>/delete/', views.CustomerDeleteView.as_view(), name='customer-delete'),
     path('salespersons/', views.SalespersonListView.as_view(), name='salesperson-list'),
+    path('salespersons/<int:pk>/', views.SalespersonDetailView.as_view(), name='salesperson-detail'),
     
     # Shop Assistant URLs
     path('shop-assistants/', views.ShopAssistantListView.as_view(), name='shop-assistant-list'),
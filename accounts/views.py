@@ -1,21 +1,27 @@
-from datetime import datetime
+from datetime import datetime, timedelta
+import csv
 import json
 
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib import messages
 from django.db.models import Q, ProtectedError
-from django.http import JsonResponse
-from django.shortcuts import redirect
+from django.http import JsonResponse, HttpResponse
+from django.shortcuts import redirect, render
 from django.urls import reverse_lazy, reverse
+from django.utils import timezone
 from django.views.decorators.http import require_http_methods
 from django.views.generic import (
     ListView, DetailView, CreateView, 
     UpdateView, DeleteView, TemplateView
 )
 
-from .models import Customer, UserProfile, ShopAssistant
-from .forms import CustomerForm, UserProfileForm
+from .models import Customer, CustomerRFM, UserProfile, ShopAssistant
+from .forms import CustomerForm, CustomerImportForm, UserProfileForm
+from .importers import import_customers
+from .phone import get_fragment_digits
+from .rfm import get_segment_counts
+from core.importing import ImportFileError, get_format, read_rows
 
 class CustomerListView(LoginRequiredMixin, ListView):
     model = Customer
@@ -31,6 +37,11 @@ class CustomerListView(LoginRequiredMixin, ListView):
         phone_query = self.request.GET.get('phone', '').strip()
         date_from = self.request.GET.get('date_from', '').strip()
         date_to = self.request.GET.get('date_to', '').strip()
+        segment = self.request.GET.get('segment', '').strip()
+
+        # Filter by RFM segment
+        if segment:
+            queryset = queryset.filter(rfm__segment=segment)
 
         # Search by name or email
         if search_query:
@@ -41,31 +52,77 @@ class CustomerListView(LoginRequiredMixin, ListView):
         
         # Search by phone number
         if phone_query:
-            # Remove any formatting from the search query
-            phone_cleaned = ''.join(filter(str.isdigit, phone_query))
-            queryset = queryset.filter(phone_number__icontains=phone_cleaned)
+            # Indexed lookup on the start or the end of the number
+            phone_digits = get_fragment_digits(phone_query)
+            if phone_digits:
+                queryset = queryset.search_phone(phone_digits)
         
-        # Search by last purchase date range
+        # Search by last purchase date range, an indexed range on last_order_at
         try:
-            # Get all customers with orders in the date range
-            orders_query = Q()
             if date_from:
                 date_from = datetime.strptime(date_from, '%Y-%m-%d')
-                orders_query &= Q(order__order_date__gte=date_from)
+                queryset = queryset.filter(last_order_at__gte=timezone.make_aware(date_from))
             
             if date_to:
-                date_to = datetime.strptime(date_to + ' 23:59:59', '%Y-%m-%d %H:%M:%S')
-                orders_query &= Q(order__order_date__lte=date_to)
-            
-            if date_from or date_to:
-                # Filter customers who have orders in the specified date range
-                queryset = queryset.filter(orders_query).distinct()
+                date_to = datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1)
+                queryset = queryset.filter(last_order_at__lt=timezone.make_aware(date_to))
         except ValueError:
             # If date parsing fails, ignore the date filter
             pass
 
         return queryset.order_by('-updated_at')
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        labels = dict(CustomerRFM.SEGMENT_CHOICES)
+        context['segments'] = [
+            {'value': segment, 'label': labels[segment], 'count': count}
+            for segment, count in get_segment_counts().items()
+        ]
+        return context
+
+@login_required
+def export_customer_segment(request):
+    """Export customers with their RFM scores as CSV, optionally limited to one segment"""
+    segment = request.GET.get('segment', '').strip()
+
+    scores = CustomerRFM.objects.order_by('-monetary')
+    if segment:
+        scores = scores.filter(segment=segment)
+
+    response = HttpResponse(
+        content_type='text/csv',
+        headers={'Content-Disposition': f'attachment; filename="customers_{segment or "all"}.csv"'},
+    )
+
+    writer = csv.writer(response)
+    writer.writerow([
+        'Customer ID', 'Name', 'Phone Number', 'Email', 'Segment', 'RFM Score',
+        'Last Order', 'Orders', 'Total Spent'
+    ])
+
+    rows = scores.values_list(
+        'customer_id', 'customer__name', 'customer__phone_number', 'customer__email',
+        'segment', 'recency_score', 'frequency_score', 'monetary_score',
+        'last_order_at', 'frequency', 'monetary'
+    )
+    labels = dict(CustomerRFM.SEGMENT_CHOICES)
+    for (customer_id, name, phone, email, segment_value, r_score, f_score, m_score,
+         last_order_at, frequency, monetary) in rows.iterator():
+        writer.writerow([
+            customer_id,
+            name,
+            phone or '',
+            email or '',
+            labels.get(segment_value, segment_value),
+            f'{r_score}{f_score}{m_score}',
+            last_order_at.strftime('%Y-%m-%d %H:%M'),
+            frequency,
+            monetary,
+        ])
+
+    return response
+
 @login_required
 def customer_search(request):
     query = request.GET.get('q', '').strip()
@@ -77,12 +134,8 @@ def customer_search(request):
     customers = Customer.objects.all()
     
     if query:
-        # Search in name, email, and phone number
-        customers = customers.filter(
-            Q(name__icontains=query) |
-            Q(email__icontains=query) |
-            Q(phone_number__icontains=query)
-        )
+        # Search by phone number, or in name and email
+        customers = customers.search(query, 'name', 'email')
     
     if date_query:
         try:
@@ -161,6 +214,22 @@ class CustomerDetailView(LoginRequiredMixin, DetailView):
         context['last_order_date'] = orders.order_by('-order_date').values_list('order_date', flat=True).first()
         return context
 
+@login_required
+def customer_import(request):
+    """Upload a customer file; duplicate and invalid rows are listed, not fatal"""
+    report = None
+    form = CustomerImportForm(request.POST or None, request.FILES or None)
+    if request.method == 'POST' and form.is_valid():
+        upload = form.cleaned_data['file']
+        try:
+            fmt = get_format(upload.name)
+            report = import_customers(read_rows(upload.file, fmt))
+        except ImportFileError as e:
+            form.add_error('file', str(e))
+        else:
+            messages.success(request, f'Customer import finished: {report}')
+    return render(request, 'accounts/customer_import.html', {'form': form, 'report': report})
+
 @login_required
 @require_http_methods(["POST"])
 def customer_create(request):
@@ -168,7 +237,7 @@ def customer_create(request):
         data = json.loads(request.body)
         customer = Customer.objects.create(
             name=data['name'],
-            phone=data['phone'],
+            phone_number=data['phone'],
             email=data.get('email', '')
         )
         return JsonResponse({
@@ -176,7 +245,7 @@ def customer_create(request):
             'customer': {
                 'id': customer.id,
                 'name': customer.name,
-                'phone': customer.phone,
+                'phone': customer.phone_number,
                 'email': customer.email
             }
         })
@@ -219,26 +288,29 @@ class SalespersonListView(LoginRequiredMixin, ListView):
     def get_queryset(self):
         return UserProfile.objects.filter(
             is_salesperson=True
-        ).select_related('user').order_by('user__first_name', 'user__username')
+        ).select_related('user').with_sales().order_by('user__first_name', 'user__username')
+
+class SalespersonDetailView(LoginRequiredMixin, DetailView):
+    model = UserProfile
+    template_name = 'accounts/salesperson_detail.html'
+    context_object_name = 'profile'
+
+    def get_queryset(self):
+        return UserProfile.objects.filter(is_salesperson=True).select_related('user')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        # Add sales statistics for each salesperson
-        from sales.models import Order
-        from django.db.models import Sum, Count
-        from decimal import Decimal
-        
-        for profile in context['salespersons']:
-            stats = Order.objects.filter(
-                salesperson=profile.user,
-                status='completed'
-            ).aggregate(
-                total_sales=Sum('total'),
-                total_orders=Count('id')
-            )
-            profile.total_sales = stats['total_sales'] or Decimal('0.00')
-            profile.total_orders = stats['total_orders'] or 0
+        from sales.models import Order, SalespersonDailySales
+        user = self.object.user
         
+        # Today, week, month and all-time figures from the daily rollup
+        context['performance'] = SalespersonDailySales.summary(user)
+        context['daily_sales'] = SalespersonDailySales.objects.filter(salesperson=user)[:30]
+        context['targets'] = user.sales_targets.filter(end_date__gte=timezone.localdate()).order_by('start_date', 'period')
+        context['recent_orders'] = Order.objects.filter(
+            salesperson=user,
+            status='completed'
+        ).select_related('customer').order_by('-order_date')[:10]
         return context
 
 # Shop Assistant Views
@@ -249,7 +321,7 @@ class ShopAssistantListView(LoginRequiredMixin, ListView):
     paginate_by = 10
 
     def get_queryset(self):
-        queryset = ShopAssistant.objects.all().order_by('-created_at')
+        queryset = ShopAssistant.objects.with_performance().order_by('-created_at')
         
         # Search functionality
         search_query = self.request.GET.get('search', '').strip()
@@ -272,12 +344,6 @@ class ShopAssistantListView(LoginRequiredMixin, ListView):
         context = super().get_context_data(**kwargs)
         context['search_query'] = self.request.GET.get('search', '')
         context['status_filter'] = self.request.GET.get('status', '')
-        
-        # Add performance statistics for each assistant
-        for assistant in context['shop_assistants']:
-            assistant.cached_total_sales = assistant.total_sales
-            assistant.cached_total_orders = assistant.total_orders
-        
         return context
 
 class ShopAssistantDetailView(LoginRequiredMixin, DetailView):
@@ -296,18 +362,16 @@ class ShopAssistantDetailView(LoginRequiredMixin, DetailView):
             status='completed'
         ).select_related('customer').order_by('-order_date')[:10]
         
-        # Get performance statistics for different periods
-        from datetime import datetime, timedelta
+        # Today, this week, this month and all time in one aggregate query
         from django.utils import timezone
         
-        today = timezone.now().date()
-        week_ago = today - timedelta(days=7)
-        month_ago = today - timedelta(days=30)
-        
-        context['today_performance'] = assistant.get_performance_data(today, today)
-        context['week_performance'] = assistant.get_performance_data(week_ago, today)
-        context['month_performance'] = assistant.get_performance_data(month_ago, today)
-        context['overall_performance'] = assistant.get_performance_data()
+        today = timezone.localdate()
+        performance = assistant.get_performance_summary(today)
+        context['today_performance'] = performance['today']
+        context['week_performance'] = performance['week']
+        context['month_performance'] = performance['month']
+        context['overall_performance'] = performance['overall']
+        context['targets'] = assistant.sales_targets.filter(end_date__gte=today).order_by('start_date', 'period')
         
         return context
 
@@ -352,7 +416,7 @@ def shop_assistant_search(request):
     if query:
         assistants = assistants.filter(
             Q(name__icontains=query) |
-            Q(assigned_shop__icontains=query)
+            Q(contact_number__icontains=query)
         )
     
     assistants = assistants.order_by('name')[(page - 1) * per_page:page * per_page]
@@ -360,8 +424,8 @@ def shop_assistant_search(request):
     items = [{
         'id': assistant.id,
         'name': assistant.name,
-        'shop': assistant.assigned_shop,
-        'display_text': f"{assistant.name} ({assistant.assigned_shop})"
+        'phone': assistant.get_formatted_phone(),
+        'display_text': f"{assistant.name} ({assistant.get_formatted_phone()})"
     } for assistant in assistants]
     
     return JsonResponse({
@@ -0,0 +1,8 @@
+"""
+Latency and query-count benchmarks for the hot endpoints.
+
+Run with ``manage.py benchmark`` against a seeded database (see
+``manage.py seed_scale``). Results are compared with ``baseline.json`` in
+this package; regenerate it with ``--save-baseline`` after an intended
+change in performance.
+"""
@@ -0,0 +1,189 @@
+"""
+Concurrent checkout load against a running server.
+
+Each simulated cashier is a thread with its own session. A cashier logs in,
+then repeatedly looks up products (and sometimes a customer) through the POS
+search APIs and submits a sale. Every request is timed; sales rejected
+because the database was locked (HTTP 503) or because stock ran out are
+counted separately from other failures.
+"""
+import json
+import random
+import threading
+import time
+from http.cookiejar import CookieJar
+from statistics import quantiles
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode, urljoin
+from urllib.request import HTTPCookieProcessor, Request, build_opener
+
+# Probability of each basket size at the till
+BASKET_SIZES = {1: 35, 2: 25, 3: 15, 4: 10, 5: 6, 6: 4, 8: 3, 12: 2}
+CUSTOMER_LOOKUP_RATE = 0.4
+TIMEOUT = 60
+
+
+class CashierSession:
+    """A logged-in browser-like session talking to the server"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.cookies = CookieJar()
+        self.opener = build_opener(HTTPCookieProcessor(self.cookies))
+
+    def csrf_token(self):
+        for cookie in self.cookies:
+            if cookie.name == 'csrftoken':
+                return cookie.value
+        return ''
+
+    def request(self, path, data=None, headers=None):
+        """Return (status, body bytes); HTTP errors are returned, not raised"""
+        url = urljoin(self.base_url, path)
+        request = Request(url, data=data, headers={'Referer': url, **(headers or {})})
+        try:
+            with self.opener.open(request, timeout=TIMEOUT) as response:
+                return response.status, response.read()
+        except HTTPError as e:
+            return e.code, e.read()
+
+    def login(self, username, password):
+        self.request('/login/')
+        status, body = self.request('/login/', data=urlencode({
+            'username': username,
+            'password': password,
+            'csrfmiddlewaretoken': self.csrf_token(),
+        }).encode())
+        if status != 200 or not any(cookie.name == 'sessionid' for cookie in self.cookies):
+            raise RuntimeError(f'Could not log in as {username} (HTTP {status})')
+
+    def get_json(self, path, **params):
+        return self.request(f'{path}?{urlencode(params)}')
+
+    def post_json(self, path, payload):
+        return self.request(path, data=json.dumps(payload).encode(), headers={
+            'Content-Type': 'application/json',
+            'X-CSRFToken': self.csrf_token(),
+        })
+
+
+class LoadStats:
+    """Thread-safe collection of request timings and outcomes"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.timings = {}
+        self.outcomes = {}
+        self.order_ids = []
+
+    def record(self, endpoint, elapsed, outcome):
+        with self.lock:
+            self.timings.setdefault(endpoint, []).append(elapsed)
+            counts = self.outcomes.setdefault(endpoint, {})
+            counts[outcome] = counts.get(outcome, 0) + 1
+
+    def add_order(self, order_id):
+        with self.lock:
+            self.order_ids.append(order_id)
+
+    def summary(self, duration):
+        endpoints = {}
+        for endpoint, timings in self.timings.items():
+            cuts = quantiles(timings, n=100, method='inclusive') if len(timings) > 1 else timings * 99
+            endpoints[endpoint] = {
+                'requests': len(timings),
+                'per_second': round(len(timings) / duration, 2),
+                'p50_ms': round(cuts[49] * 1000, 1),
+                'p95_ms': round(cuts[94] * 1000, 1),
+                'p99_ms': round(cuts[98] * 1000, 1),
+                'max_ms': round(max(timings) * 1000, 1),
+                'outcomes': self.outcomes[endpoint],
+            }
+        return endpoints
+
+
+def classify_sale(status, body):
+    if status == 200:
+        try:
+            if json.loads(body).get('success'):
+                return 'ok'
+        except ValueError:
+            pass
+        return 'error'
+    if status == 503 or b'locked' in body:
+        return 'locked'
+    if status == 400 and b'Insufficient stock' in body:
+        return 'out_of_stock'
+    return f'http_{status}'
+
+
+class Cashier(threading.Thread):
+    def __init__(self, number, base_url, credentials, catalogue, deadline, stats, seed):
+        super().__init__(name=f'cashier-{number}', daemon=True)
+        self.session = CashierSession(base_url)
+        self.credentials = credentials
+        self.catalogue = catalogue
+        self.deadline = deadline
+        self.stats = stats
+        self.rng = random.Random(seed)
+        self.error = None
+
+    def timed(self, endpoint, call, classify=None):
+        start = time.perf_counter()
+        status, body = call()
+        elapsed = time.perf_counter() - start
+        outcome = classify(status, body) if classify else ('ok' if status == 200 else f'http_{status}')
+        self.stats.record(endpoint, elapsed, outcome)
+        return outcome, body
+
+    def run(self):
+        try:
+            self.session.login(*self.credentials)
+            while time.monotonic() < self.deadline:
+                self.checkout()
+        except (RuntimeError, URLError, OSError) as e:
+            self.error = str(e)
+
+    def checkout(self):
+        rng = self.rng
+        products = self.catalogue['products']
+        size = rng.choices(list(BASKET_SIZES), weights=list(BASKET_SIZES.values()))[0]
+        basket = rng.sample(products, min(size, len(products)))
+
+        for product in basket:
+            term = product['name'].split()[0]
+            self.timed('product_search', lambda: self.session.get_json('/inventory/api/product-search/', q=term))
+
+        payload = {
+            'items': [{'id': product['id'], 'quantity': 1, 'price': product['price']} for product in basket],
+            'payment_method': rng.choice(('cash', 'cash', 'card', 'upi')),
+            'amount_paid': str(sum(float(product['price']) for product in basket)),
+        }
+        customers = self.catalogue['customers']
+        if customers and rng.random() < CUSTOMER_LOOKUP_RATE:
+            customer = rng.choice(customers)
+            self.timed('search_customers', lambda: self.session.get_json('/sales/api/search-customers/', q=customer['name'][:4]))
+            payload['customer'] = customer['id']
+
+        outcome, body = self.timed(
+            'complete_sale', lambda: self.session.post_json('/sales/api/complete-sale/', payload), classify_sale
+        )
+        if outcome == 'ok':
+            self.stats.add_order(json.loads(body)['order_id'])
+
+
+def run_load(base_url, credentials, catalogue, cashiers, duration, seed=1):
+    """Run the cashiers for ``duration`` seconds and return (stats, elapsed seconds, thread errors)"""
+    stats = LoadStats()
+    deadline = time.monotonic() + duration
+    threads = [
+        Cashier(number, base_url, credentials, catalogue, deadline, stats, seed + number)
+        for number in range(cashiers)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return stats, elapsed, [f'{thread.name}: {thread.error}' for thread in threads if thread.error]
@@ -0,0 +1,84 @@
+"""Run benchmark scenarios and compare their results with a baseline"""
+import time
+from statistics import fmean, quantiles
+
+from django.db import connection, transaction
+from django.test import Client
+
+from core.instrumentation import QueryRecorder
+
+PERCENTILES = (50, 95, 99)
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+def summarise(timings, query_counts):
+    """Return p50/p95/p99 and mean latency in milliseconds plus the query count"""
+    cuts = quantiles(timings, n=100, method='inclusive')
+    result = {f'p{p}_ms': round(cuts[p - 1] * 1000, 2) for p in PERCENTILES}
+    result['mean_ms'] = round(fmean(timings) * 1000, 2)
+    result['queries'] = max(query_counts)
+    return result
+
+
+def timed_request(client, method, path, kwargs, rollback):
+    recorder = QueryRecorder()
+    with connection.execute_wrapper(recorder):
+        start = time.perf_counter()
+        if rollback:
+            with transaction.atomic():
+                response = getattr(client, method)(path, **kwargs)
+                transaction.set_rollback(True)
+        else:
+            response = getattr(client, method)(path, **kwargs)
+        elapsed = time.perf_counter() - start
+    if response.status_code != 200:
+        raise BenchmarkError(f'{method.upper()} {path} returned {response.status_code}')
+    if response.streaming:
+        b''.join(response.streaming_content)
+    return elapsed, recorder.count
+
+
+def run_scenario(user, scenario, fixtures, iterations, warmup):
+    # 127.0.0.1 is in ALLOWED_HOSTS, unlike the test client's default host
+    client = Client(SERVER_NAME='127.0.0.1')
+    client.force_login(user)
+    method, path, kwargs = scenario.prepare(fixtures)
+
+    for _ in range(warmup):
+        timed_request(client, method, path, kwargs, scenario.mutating)
+
+    timings, query_counts = [], []
+    for _ in range(iterations):
+        elapsed, queries = timed_request(client, method, path, kwargs, scenario.mutating)
+        timings.append(elapsed)
+        query_counts.append(queries)
+    return {'path': path, **summarise(timings, query_counts)}
+
+
+def compare(results, baseline, latency_threshold, query_threshold):
+    """
+    Return a list of regression messages.
+
+    A scenario regresses when its p95 latency exceeds the baseline by more
+    than ``latency_threshold`` (a fraction) or it runs more than
+    ``query_threshold`` queries over the baseline.
+    """
+    regressions = []
+    for name, result in results['scenarios'].items():
+        expected = baseline.get('scenarios', {}).get(name)
+        if expected is None:
+            continue
+        limit = expected['p95_ms'] * (1 + latency_threshold)
+        if result['p95_ms'] > limit:
+            regressions.append(
+                f"{name}: p95 {result['p95_ms']:.1f}ms exceeds baseline {expected['p95_ms']:.1f}ms "
+                f"by more than {latency_threshold:.0%}"
+            )
+        if result['queries'] > expected['queries'] + query_threshold:
+            regressions.append(
+                f"{name}: {result['queries']} queries, baseline {expected['queries']}"
+            )
+    return regressions
@@ -0,0 +1,79 @@
+"""
+Benchmark scenarios.
+
+Each scenario names a URL and, for POST requests, a payload. ``prepare``
+receives the dataset facts gathered once per run (see ``get_fixtures``) and
+returns the request arguments, so scenarios adapt to whatever data was
+seeded. Scenarios that write are rolled back after every request.
+"""
+import json
+
+from django.urls import reverse
+
+from accounts.models import Customer
+from inventory.models import Product
+
+BASKET_SIZE = 3
+
+
+class Scenario:
+    def __init__(self, name, url_name, query='', method='get', payload=None, mutating=False):
+        self.name = name
+        self.url_name = url_name
+        self.query = query
+        self.method = method
+        self.payload = payload
+        self.mutating = mutating
+
+    def prepare(self, fixtures):
+        """Return (method, path, keyword arguments for the test client)"""
+        path = reverse(self.url_name)
+        if self.query:
+            path = f'{path}?{self.query.format(**fixtures)}'
+        kwargs = {}
+        if self.payload:
+            kwargs = {'data': json.dumps(self.payload(fixtures)), 'content_type': 'application/json'}
+        return self.method, path, kwargs
+
+
+def sale_payload(fixtures):
+    products = fixtures['basket']
+    return {
+        'customer': fixtures['customer_id'],
+        'items': [{'id': product.pk, 'quantity': 1, 'price': str(product.price)} for product in products],
+        'payment_method': 'cash',
+        'amount_paid': str(sum(product.price for product in products)),
+    }
+
+
+SCENARIOS = [
+    Scenario('pos', 'sales:pos'),
+    Scenario('complete_sale', 'sales:complete-sale', method='post', payload=sale_payload, mutating=True),
+    Scenario('product_search', 'inventory:product-search', query='q={product_term}'),
+    Scenario('search_customers', 'sales:search-customers', query='q={customer_term}'),
+    Scenario('dashboard', 'dashboard:dashboard'),
+    Scenario('sales_report_daily', 'dashboard:sales-report', query='report_type=daily'),
+    Scenario('sales_report_hourly', 'dashboard:sales-report', query='report_type=hourly'),
+    Scenario('sales_export', 'dashboard:sales-report-export'),
+    Scenario('inventory_export', 'dashboard:inventory-report-export'),
+    Scenario('shop_assistant_analytics', 'accounts:shop-assistant-analytics'),
+]
+
+
+def get_fixtures():
+    """Pick search terms and a sellable basket from the current database"""
+    product = Product.objects.filter(is_active=True).order_by('id').first()
+    customer = Customer.objects.order_by('id').first()
+    # Sales are rolled back, so any product in stock can be sold repeatedly
+    basket = list(
+        Product.objects.filter(is_active=True, inventory__quantity__gte=1)
+        .order_by('-inventory__quantity')[:BASKET_SIZE]
+    )
+    if product is None or customer is None or not basket:
+        raise ValueError('The database has no products, customers or stock; seed it with seed_scale first')
+    return {
+        'product_term': product.name.split()[0],
+        'customer_term': customer.name[:3],
+        'customer_id': customer.pk,
+        'basket': basket,
+    }
@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+
+
+class CoreConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'core'
+
+    def ready(self):
+        from .slow_queries import install_slow_query_logger
+        connection_created.connect(install_slow_query_logger, dispatch_uid='core.slow_query_logger')
@@ -0,0 +1,100 @@
+"""
+Streaming readers and reporting shared by the bulk import commands and upload views.
+
+Rows are read lazily from CSV or JSON Lines and handed to an importer in
+chunks, so memory stays flat however long the file is. A JSON array is
+also accepted but has to be parsed whole. Importers report bad rows on an
+ImportReport instead of aborting, so one typo does not throw away a
+200k-row file.
+"""
+import csv
+import io
+import json
+from itertools import islice
+from pathlib import Path
+
+FORMATS = ('csv', 'json', 'jsonl')
+BATCH_SIZE = 1000
+# Problems beyond this many are counted but not listed
+MAX_REPORTED_PROBLEMS = 200
+
+
+class ImportFileError(ValueError):
+    """The file as a whole cannot be read"""
+
+
+def get_format(filename, fmt=None):
+    fmt = (fmt or Path(filename).suffix.lstrip('.')).lower()
+    if fmt == 'ndjson':
+        fmt = 'jsonl'
+    if fmt not in FORMATS:
+        raise ImportFileError(f'Unsupported import format "{fmt}"; use one of {", ".join(FORMATS)}')
+    return fmt
+
+
+def read_rows(stream, fmt):
+    """Yield one dict per record of a binary or text stream, with lower-cased CSV headers"""
+    if isinstance(stream, io.TextIOBase):
+        text = stream
+    else:
+        text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    try:
+        if fmt == 'csv':
+            reader = csv.DictReader(text)
+            if reader.fieldnames is None:
+                return
+            reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+            yield from reader
+        elif fmt == 'jsonl':
+            for line in text:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            records = json.load(text)
+            if not isinstance(records, list):
+                raise ImportFileError('A JSON import must be an array of objects')
+            yield from records
+    except (UnicodeDecodeError, json.JSONDecodeError, csv.Error) as e:
+        raise ImportFileError(f'Could not read the file: {e}') from e
+    finally:
+        if text is not stream:
+            text.detach()
+
+
+def chunked(iterable, size=BATCH_SIZE):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def get_text(row, *names):
+    """First non-empty value among ``names``, stripped; JSON numbers are turned into text"""
+    for name in names:
+        value = row.get(name)
+        if value not in (None, ''):
+            return str(value).strip()
+    return ''
+
+
+class ImportReport:
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.problem_count = 0
+        self.problems = []
+
+    def add_problem(self, row, message):
+        self.problem_count += 1
+        if len(self.problems) < MAX_REPORTED_PROBLEMS:
+            self.problems.append((row, message))
+
+    @property
+    def skipped(self):
+        return self.problem_count
+
+    def __str__(self):
+        summary = f'{self.rows} rows: {self.created} created'
+        if self.updated:
+            summary += f', {self.updated} updated'
+        return f'{summary}, {self.skipped} skipped'
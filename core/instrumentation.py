@@ -0,0 +1,126 @@
+"""
+Lightweight SQL instrumentation.
+
+QueryRecorder is a database execute wrapper (see
+``connection.execute_wrapper``) that counts queries and their time without
+relying on ``DEBUG``. ORM queries reach the wrapper already parameterised, so
+the SQL text itself identifies a query shape; ``fingerprint`` additionally
+collapses literals and IN lists for raw SQL and for reporting.
+"""
+import re
+import threading
+import time
+from collections import Counter
+
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+IN_LIST_RE = re.compile(r"\bIN\s*\((?:\s*(?:%s|\?|\d+|'[^']*')\s*,?)+\)", re.IGNORECASE)
+WHITESPACE_RE = re.compile(r"\s+")
+
+
+def fingerprint(sql):
+    """Normalise a SQL statement so that queries differing only in values match"""
+    sql = STRING_RE.sub('?', sql)
+    sql = NUMBER_RE.sub('?', sql)
+    sql = IN_LIST_RE.sub('IN (...)', sql)
+    return WHITESPACE_RE.sub(' ', sql).strip()
+
+
+class QueryRecorder:
+    """Execute wrapper recording the number, duration and shape of queries"""
+
+    def __init__(self, keep_queries=False):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+        self.queries = [] if keep_queries else None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.duration += elapsed
+            self.statements[sql] += 1
+            if self.queries is not None:
+                self.queries.append({'sql': sql, 'params': params, 'many': many, 'duration': elapsed})
+
+    def duplicates(self, limit=5):
+        return get_duplicates(self.statements, limit)
+
+
+def get_duplicates(statements, limit=5):
+    """Return the most repeated query fingerprints of a SQL -> count Counter as (fingerprint, count) pairs"""
+    counts = Counter()
+    for sql, count in statements.items():
+        counts[fingerprint(sql)] += count
+    return [(sql, count) for sql, count in counts.most_common(limit) if count > 1]
+
+
+class RequestStatsStore:
+    """Per-process aggregate of request statistics keyed by view name"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, record, statements=None):
+        """
+        Add a request record; ``statements`` (SQL -> count) is kept for the
+        view's worst request, whose duplicate queries are only fingerprinted
+        when the summary is read.
+        """
+        view_name = record['view'] or '(unresolved)'
+        with self._lock:
+            stats = self._stats.get(view_name)
+            if stats is None:
+                stats = self._stats[view_name] = {
+                    'view': view_name,
+                    'requests': 0,
+                    'over_budget': 0,
+                    'total_queries': 0,
+                    'max_queries': 0,
+                    'total_sql_ms': 0.0,
+                    'total_wall_ms': 0.0,
+                    'max_wall_ms': 0.0,
+                    'worst': None,
+                    'worst_statements': None,
+                }
+            stats['requests'] += 1
+            stats['over_budget'] += 1 if record['over_budget'] else 0
+            stats['total_queries'] += record['queries']
+            stats['total_sql_ms'] += record['sql_ms']
+            stats['total_wall_ms'] += record['wall_ms']
+            stats['max_wall_ms'] = max(stats['max_wall_ms'], record['wall_ms'])
+            if record['queries'] >= stats['max_queries']:
+                stats['max_queries'] = record['queries']
+                stats['worst'] = record
+                stats['worst_statements'] = statements
+
+    def summary(self, order_by='max_queries', limit=50):
+        """Return aggregated stats per view, worst offenders first"""
+        with self._lock:
+            rows = [dict(stats) for stats in self._stats.values()]
+        for row in rows:
+            row['avg_queries'] = row['total_queries'] / row['requests']
+            row['avg_sql_ms'] = row['total_sql_ms'] / row['requests']
+            row['avg_wall_ms'] = row['total_wall_ms'] / row['requests']
+        rows.sort(key=lambda row: (row[order_by], row['max_queries']), reverse=True)
+        rows = rows[:limit]
+        for row in rows:
+            statements = row.pop('worst_statements')
+            if statements is not None and 'duplicates' not in row['worst']:
+                row['worst'] = {
+                    **row['worst'],
+                    'duplicates': [{'sql': sql, 'count': count} for sql, count in get_duplicates(statements)],
+                }
+        return rows
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+request_stats = RequestStatsStore()
@@ -0,0 +1,17 @@
+"""Logging handlers referenced from the LOGGING setting"""
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+
+
+class LazyRotatingFileHandler(RotatingFileHandler):
+    """
+    RotatingFileHandler that opens its file, creating the directory, when the
+    first record is written, so importing the settings touches no files.
+    """
+    def __init__(self, filename, *args, **kwargs):
+        kwargs['delay'] = True
+        super().__init__(filename, *args, **kwargs)
+
+    def _open(self):
+        Path(self.baseFilename).parent.mkdir(parents=True, exist_ok=True)
+        return super()._open()
@@ -0,0 +1,127 @@
+import json
+import logging
+import platform
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from accounts.models import Customer
+from benchmarks.runner import BenchmarkError, compare, run_scenario
+from benchmarks.scenarios import SCENARIOS, get_fixtures
+from inventory.models import Product
+from sales.models import Order
+
+BASELINE_PATH = Path(settings.BASE_DIR) / 'benchmarks' / 'baseline.json'
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the hot endpoints and compare latency and query counts with the stored baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20, help='Timed requests per scenario')
+        parser.add_argument('--warmup', type=int, default=2, help='Untimed requests per scenario before timing')
+        parser.add_argument('--only', nargs='+', metavar='SCENARIO', help='Run only these scenarios')
+        parser.add_argument('--username', help='Salesperson to log in as (default: the first active salesperson, superusers first)')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+        parser.add_argument('--baseline', default=str(BASELINE_PATH), help='Baseline JSON file to compare with')
+        parser.add_argument('--save-baseline', action='store_true', help='Store the results as the new baseline')
+        parser.add_argument(
+            '--latency-threshold', type=float, default=0.25,
+            help='Allowed p95 latency increase over the baseline, as a fraction (default 0.25)'
+        )
+        parser.add_argument(
+            '--query-threshold', type=int, default=0,
+            help='Allowed number of extra queries over the baseline (default 0)'
+        )
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 2:
+            raise CommandError('--iterations must be at least 2')
+
+        scenarios = SCENARIOS
+        if options['only']:
+            unknown = set(options['only']) - {scenario.name for scenario in SCENARIOS}
+            if unknown:
+                raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+            scenarios = [scenario for scenario in SCENARIOS if scenario.name in options['only']]
+
+        user = self.get_user(options['username'])
+        try:
+            fixtures = get_fixtures()
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        results = {
+            'generated_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'database': {
+                'vendor': settings.DATABASES['default']['ENGINE'].rsplit('.', 1)[-1],
+                'orders': Order.objects.count(),
+                'products': Product.objects.count(),
+                'customers': Customer.objects.count(),
+            },
+            'iterations': options['iterations'],
+            'scenarios': {},
+        }
+
+        self.stdout.write(f"{'scenario':<26} {'p50':>9} {'p95':>9} {'p99':>9} {'queries':>8}")
+        # Benchmarked views are expected to exceed their budgets on large data
+        performance_logger = logging.getLogger('kidstore.performance')
+        previous_level = performance_logger.level
+        performance_logger.setLevel(logging.ERROR)
+        try:
+            for scenario in scenarios:
+                result = run_scenario(user, scenario, fixtures, options['iterations'], options['warmup'])
+                results['scenarios'][scenario.name] = result
+                self.stdout.write(
+                    f"{scenario.name:<26} {result['p50_ms']:>7.1f}ms {result['p95_ms']:>7.1f}ms "
+                    f"{result['p99_ms']:>7.1f}ms {result['queries']:>8}"
+                )
+        except BenchmarkError as e:
+            raise CommandError(str(e))
+        finally:
+            performance_logger.setLevel(previous_level)
+
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(results, indent=2))
+            self.stdout.write(f"Results written to {options['output']}")
+
+        baseline_path = Path(options['baseline'])
+        if options['save_baseline']:
+            baseline = json.loads(baseline_path.read_text()) if baseline_path.exists() else {}
+            # Keep scenarios that were not part of this run
+            results['scenarios'] = {**baseline.get('scenarios', {}), **results['scenarios']}
+            baseline_path.write_text(json.dumps(results, indent=2) + '\n')
+            self.stdout.write(self.style.SUCCESS(f'Baseline saved to {baseline_path}'))
+            return
+
+        if not baseline_path.exists():
+            self.stdout.write(self.style.WARNING(f'No baseline at {baseline_path}; run with --save-baseline to create one'))
+            return
+
+        baseline = json.loads(baseline_path.read_text())
+        if baseline.get('database') != results['database']:
+            self.stdout.write(self.style.WARNING(
+                f"Dataset differs from the baseline ({baseline.get('database')}); latency comparisons may not be meaningful"
+            ))
+        regressions = compare(results, baseline, options['latency_threshold'], options['query_threshold'])
+        if regressions:
+            for regression in regressions:
+                self.stderr.write(regression)
+            raise CommandError(f'{len(regressions)} benchmark regression(s) against {baseline_path}')
+        self.stdout.write(self.style.SUCCESS('No regressions against the baseline'))
+
+    def get_user(self, username):
+        users = User.objects.filter(is_active=True)
+        if username:
+            user = users.filter(username=username).first()
+        else:
+            user = users.filter(userprofile__is_salesperson=True).order_by('-is_superuser', 'id').first()
+        if user is None:
+            raise CommandError(f"User {username or '(salesperson)'} not found")
+        if not user.userprofile.is_salesperson:
+            raise CommandError(f'{user.username} must be a salesperson to open the POS')
+        return user
@@ -1,10 +1,28 @@
-from django.core.management.base import BaseCommand
+import time
+from datetime import date, datetime
+
+from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
 from django.utils import timezone
-from decimal import Decimal
+
+from accounts.autocomplete import customer_index
+from accounts.models import Customer, CustomerRFM, SalesTarget
+from inventory.models import (
+    Product, Inventory, StockAdjustment, ProductClassification, GoodsReceivedNote, GoodsReceivedLine,
+    StockCount, StockCountLine, Category, Brand, Color, Size, Supplier
+)
+from sales.models import Order, OrderItem, Transaction, SalespersonDailySales
+
+CHUNK_SIZE = 1000
+# A progress line is written every this many chunks
+PROGRESS_EVERY = 10
+
 
 class Command(BaseCommand):
-    help = 'Clean up system data while preserving users, shop assistants, and customers'
+    help = (
+        'Clean up system data while preserving users, shop assistants, and customers. '
+        'With --before DATE, only delete records older than DATE (retention cleanup)'
+    )
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -12,118 +30,179 @@ class Command(BaseCommand):
             action='store_true',
             help='Confirm that you want to delete the data (required for safety)',
         )
+        parser.add_argument(
+            '--before',
+            type=date.fromisoformat,
+            metavar='YYYY-MM-DD',
+            help='Only delete orders, stock adjustments, received goods notes and applied stock counts older than this date',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=CHUNK_SIZE,
+            help=f'Rows deleted per transaction (default: {CHUNK_SIZE})',
+        )
+        parser.add_argument(
+            '--pause',
+            type=float,
+            default=0,
+            help='Seconds to wait between chunks so other writers get the database (default: 0)',
+        )
 
     def handle(self, *args, **options):
+        before = options['before']
         if not options['confirm']:
+            if before:
+                self.stdout.write(self.style.WARNING(
+                    f'This command will delete everything recorded before {before}:\n'
+                    '- Sales orders, order items and transactions\n'
+                    '- Stock adjustments\n'
+                    '- Received goods notes and applied stock counts\n\n'
+                    'Customer purchase totals are recomputed from the remaining orders.\n\n'
+                    f'To confirm, run: python manage.py cleanup_data --before {before} --confirm'
+                ))
+                return
             self.stdout.write(
                 self.style.WARNING(
                     'This command will delete:\n'
                     '- All sales orders and transactions\n'
                     '- All inventory and product data\n'
-                    '- All stock adjustments\n\n'
+                    '- All stock adjustments, goods received notes and stock counts\n'
+                    '- Sales rollups and customer RFM scores\n\n'
                     'The following will be PRESERVED:\n'
                     '- System users (admin, staff)\n'
-                    '- Shop assistants\n'
+                    '- Shop assistants and sales targets\n'
                     '- Customer data\n\n'
                     'To confirm, run: python manage.py cleanup_data --confirm'
                 )
             )
             return
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1')
+
+        self.chunk_size = options['chunk_size']
+        self.pause = options['pause']
+        self.verbosity = options['verbosity']
+        started = time.perf_counter()
+        if before:
+            cutoff = timezone.make_aware(datetime.combine(before, datetime.min.time()))
+            self.stdout.write(f'Deleting records before {before}...')
+            deleted_counts = self.cleanup_before(cutoff)
+        else:
+            self.stdout.write('Starting data cleanup...')
+            deleted_counts = self.cleanup_data()
+
+        lines = '\n'.join(f'- {label}: {count}' for label, count in deleted_counts.items())
+        self.stdout.write(self.style.SUCCESS(
+            f'\nData cleanup completed in {time.perf_counter() - started:.1f}s\n\nDeleted:\n{lines}'
+        ))
+
+    def delete_in_chunks(self, queryset, label, before_chunk=None, after_chunk=None):
+        """
+        Delete the rows of ``queryset`` in primary key order, one short
+        transaction per chunk, and return the number of deleted rows.
 
-        self.stdout.write('Starting data cleanup...')
-        
-        try:
+        Each chunk is a ``pk__in`` delete. For tables that nothing references
+        Django sends it as a single DELETE without loading the rows; other
+        tables get their cascades deleted set-based per chunk.
+        ``before_chunk`` is called with the chunk's primary keys and its
+        result is passed to ``after_chunk``, both inside the chunk's
+        transaction.
+        """
+        model = queryset.model
+        total, last_pk, chunks = 0, None, 0
+        while True:
             with transaction.atomic():
-                deleted_counts = self.cleanup_data()
-                
-            self.stdout.write(
-                self.style.SUCCESS(
-                    f'\nData cleanup completed successfully!\n\n'
-                    f'Deleted:\n'
-                    f'- Orders: {deleted_counts["orders"]}\n'
-                    f'- Order Items: {deleted_counts["order_items"]}\n'
-                    f'- Transactions: {deleted_counts["transactions"]}\n'
-                    f'- Products: {deleted_counts["products"]}\n'
-                    f'- Inventory Records: {deleted_counts["inventory"]}\n'
-                    f'- Stock Adjustments: {deleted_counts["stock_adjustments"]}\n'
-                    f'- Categories: {deleted_counts["categories"]}\n'
-                    f'- Brands: {deleted_counts["brands"]}\n'
-                    f'- Colors: {deleted_counts["colors"]}\n'
-                    f'- Sizes: {deleted_counts["sizes"]}\n'
-                    f'- Suppliers: {deleted_counts["suppliers"]}\n\n'
-                    f'Preserved:\n'
-                    f'- System users: ✓\n'
-                    f'- Shop assistants: ✓\n'
-                    f'- Customers: ✓'
-                )
-            )
-            
-        except Exception as e:
-            self.stdout.write(
-                self.style.ERROR(f'Error during cleanup: {str(e)}')
-            )
-            raise
+                pending = queryset.order_by('pk')
+                if last_pk is not None:
+                    pending = pending.filter(pk__gt=last_pk)
+                pks = list(pending.values_list('pk', flat=True)[:self.chunk_size])
+                if not pks:
+                    break
+                context = before_chunk(pks) if before_chunk else None
+                _, deleted = model.objects.filter(pk__in=pks).delete()
+                if after_chunk:
+                    after_chunk(context)
+            total += deleted.get(model._meta.label, 0)
+            last_pk, chunks = pks[-1], chunks + 1
+            if self.verbosity >= 2 or (self.verbosity and chunks % PROGRESS_EVERY == 0):
+                self.stdout.write(f'  {label}: {total} deleted...')
+            if self.pause:
+                time.sleep(self.pause)
+        if self.verbosity:
+            self.stdout.write(f'{label}: {total}')
+        return total
 
-    def cleanup_data(self):
-        """Clean up data and return counts of deleted items"""
-        
-        # Import models
-        from sales.models import Order, OrderItem, Transaction
-        from inventory.models import (
-            Product, Inventory, StockAdjustment, 
-            Category, Brand, Color, Size, Supplier
+    def delete_orders(self, orders, deleted_counts):
+        """Delete orders with their items and transactions, keeping customer totals in step"""
+        def before_chunk(pks):
+            deleted_counts['Transactions'] += Transaction.objects.filter(order_id__in=pks).delete()[0]
+            deleted_counts['Order Items'] += OrderItem.objects.filter(order_id__in=pks).delete()[0]
+            return set(Order.objects.filter(pk__in=pks).values_list('customer_id', flat=True))
+
+        def after_chunk(customer_ids):
+            Customer.objects.filter(pk__in=customer_ids).refresh_order_stats()
+
+        deleted_counts['Transactions'] = deleted_counts['Order Items'] = 0
+        deleted_counts['Orders'] = self.delete_in_chunks(orders, 'Orders', before_chunk, after_chunk)
+        # refresh_order_stats() is an UPDATE and sends no signals
+        customer_index.invalidate()
+
+    def cleanup_before(self, cutoff):
+        """Retention cleanup: delete records older than ``cutoff``, chunk by chunk"""
+        deleted_counts = {}
+        self.delete_orders(Order.objects.filter(order_date__lt=cutoff), deleted_counts)
+        deleted_counts['Stock Adjustments'] = self.delete_in_chunks(
+            StockAdjustment.objects.filter(created_at__lt=cutoff), 'Stock Adjustments'
         )
-        
+        notes = GoodsReceivedNote.objects.filter(status='received', received_at__lt=cutoff)
+        self.delete_in_chunks(GoodsReceivedLine.objects.filter(note__in=notes), 'Goods Received Lines')
+        deleted_counts['Goods Received Notes'] = self.delete_in_chunks(notes, 'Goods Received Notes')
+        counts = StockCount.objects.filter(status='applied', applied_at__lt=cutoff)
+        self.delete_in_chunks(StockCountLine.objects.filter(count__in=counts), 'Stock Count Lines')
+        deleted_counts['Stock Counts'] = self.delete_in_chunks(counts, 'Stock Counts')
+        # Daily sales rollups, sales targets and RFM scores are kept: they
+        # summarise the deleted orders
+        return deleted_counts
+
+    def cleanup_data(self):
+        """Clean up data chunk by chunk and return counts of deleted items"""
         deleted_counts = {}
-        
-        # 1. Delete sales-related data (transactions must be deleted before orders due to protected FK)
+
+        # 1. Sales data and everything computed from it
         self.stdout.write('Deleting sales data...')
-        deleted_counts['transactions'] = Transaction.objects.count()
-        Transaction.objects.all().delete()
-        
-        deleted_counts['order_items'] = OrderItem.objects.count()
-        OrderItem.objects.all().delete()
-        
-        deleted_counts['orders'] = Order.objects.count()  
-        Order.objects.all().delete()
-        
-        # 2. Delete inventory and product data
+        self.delete_orders(Order.objects.all(), deleted_counts)
+        deleted_counts['Daily Sales Rollups'] = self.delete_in_chunks(
+            SalespersonDailySales.objects.all(), 'Daily Sales Rollups'
+        )
+        deleted_counts['Customer RFM Scores'] = self.delete_in_chunks(CustomerRFM.objects.all(), 'Customer RFM Scores')
+        SalesTarget.objects.update(achieved_sales=0, achieved_orders=0)
+
+        # 2. Stock documents, then inventory and product data
         self.stdout.write('Deleting inventory data...')
-        deleted_counts['stock_adjustments'] = StockAdjustment.objects.count()
-        StockAdjustment.objects.all().delete()
-        
-        deleted_counts['inventory'] = Inventory.objects.count()
-        Inventory.objects.all().delete()
-        
-        deleted_counts['products'] = Product.objects.count()
-        Product.objects.all().delete()
-        
-        # 3. Delete product attributes (these might be referenced by products)
+        self.delete_in_chunks(StockCountLine.objects.all(), 'Stock Count Lines')
+        deleted_counts['Stock Counts'] = self.delete_in_chunks(StockCount.objects.all(), 'Stock Counts')
+        self.delete_in_chunks(GoodsReceivedLine.objects.all(), 'Goods Received Lines')
+        deleted_counts['Goods Received Notes'] = self.delete_in_chunks(
+            GoodsReceivedNote.objects.all(), 'Goods Received Notes'
+        )
+        deleted_counts['Stock Adjustments'] = self.delete_in_chunks(StockAdjustment.objects.all(), 'Stock Adjustments')
+        deleted_counts['Inventory Records'] = self.delete_in_chunks(Inventory.objects.all(), 'Inventory Records')
+        self.delete_in_chunks(ProductClassification.objects.all(), 'Product Classifications')
+        deleted_counts['Products'] = self.delete_in_chunks(Product.objects.all(), 'Products')
+
+        # 3. Product attributes (referenced by products)
         self.stdout.write('Deleting product attributes...')
-        deleted_counts['categories'] = Category.objects.count()
-        Category.objects.all().delete()
-        
-        deleted_counts['brands'] = Brand.objects.count()
-        Brand.objects.all().delete()
-        
-        deleted_counts['colors'] = Color.objects.count()
-        Color.objects.all().delete()
-        
-        deleted_counts['sizes'] = Size.objects.count()
-        Size.objects.all().delete()
-        
-        deleted_counts['suppliers'] = Supplier.objects.count()
-        Supplier.objects.all().delete()
-        
+        deleted_counts['Categories'] = self.delete_in_chunks(Category.objects.all(), 'Categories')
+        deleted_counts['Brands'] = self.delete_in_chunks(Brand.objects.all(), 'Brands')
+        deleted_counts['Colors'] = self.delete_in_chunks(Color.objects.all(), 'Colors')
+        deleted_counts['Sizes'] = self.delete_in_chunks(Size.objects.all(), 'Sizes')
+        deleted_counts['Suppliers'] = self.delete_in_chunks(Supplier.objects.all(), 'Suppliers')
+
         # Note: We're NOT deleting:
         # - User objects (system users)
-        # - ShopAssistant objects
+        # - ShopAssistant objects and their sales targets
         # - Customer objects
         # - UserProfile objects
-        
-        return deleted_counts
 
-    def get_confirmation(self):
-        """Get user confirmation for the cleanup"""
-        response = input('Are you sure you want to proceed? Type "yes" to confirm: ')
-        return response.lower() == 'yes'
\ No newline at end of file
+        return deleted_counts
@@ -0,0 +1,128 @@
+import json
+import os
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Sum
+from django.utils import timezone
+
+from accounts.models import Customer
+from benchmarks.load import run_load
+from inventory.models import Inventory
+from sales.models import Order, OrderItem
+
+
+class Command(BaseCommand):
+    help = (
+        'Simulate concurrent cashiers against a running server (runserver or WSGI) '
+        'that uses the same database, then check stock consistency'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Base URL of the running server')
+        parser.add_argument('--cashiers', type=int, default=12, help='Number of concurrent cashiers')
+        parser.add_argument('--duration', type=int, default=30, help='Seconds to run')
+        parser.add_argument('--username', required=True, help='Salesperson account the cashiers log in with')
+        parser.add_argument(
+            '--password', default=os.environ.get('LOADTEST_PASSWORD'),
+            help='Password of the account (default: $LOADTEST_PASSWORD)'
+        )
+        parser.add_argument('--products', type=int, default=200, help='Number of in-stock products to sell from')
+        parser.add_argument('--seed', type=int, default=1, help='Random seed for the basket mix')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+
+    def handle(self, *args, **options):
+        if options['cashiers'] < 1 or options['duration'] < 1:
+            raise CommandError('--cashiers and --duration must be at least 1')
+        if not options['password']:
+            raise CommandError('Pass --password or set LOADTEST_PASSWORD')
+        user = User.objects.filter(username=options['username'], userprofile__is_salesperson=True).first()
+        if user is None:
+            raise CommandError(f"{options['username']} is not a salesperson")
+
+        inventories = list(
+            Inventory.objects.filter(product__is_active=True, quantity__gt=0)
+            .select_related('product').order_by('-quantity')[:options['products']]
+        )
+        if not inventories:
+            raise CommandError('No products in stock; seed the database with seed_scale first')
+        catalogue = {
+            'products': [
+                {'id': inventory.product_id, 'name': inventory.product.name, 'price': str(inventory.product.price)}
+                for inventory in inventories
+            ],
+            'customers': list(Customer.objects.order_by('?').values('id', 'name')[:500]),
+        }
+        stock_before = {inventory.product_id: inventory.quantity for inventory in inventories}
+        started_at = timezone.now()
+
+        self.stdout.write(
+            f"Running {options['cashiers']} cashiers against {options['url']} for {options['duration']}s "
+            f"over {len(inventories)} products"
+        )
+        stats, elapsed, errors = run_load(
+            options['url'], (options['username'], options['password']), catalogue,
+            options['cashiers'], options['duration'], options['seed']
+        )
+        for error in errors:
+            self.stderr.write(error)
+
+        endpoints = stats.summary(elapsed)
+        consistency = self.check_stock(stock_before, stats.order_ids, user, started_at)
+        results = {
+            'url': options['url'],
+            'cashiers': options['cashiers'],
+            'duration_s': round(elapsed, 1),
+            'sales_per_second': round(len(stats.order_ids) / elapsed, 2),
+            'endpoints': endpoints,
+            'stock_consistency': consistency,
+        }
+
+        self.stdout.write(f"\n{'endpoint':<18} {'req':>7} {'req/s':>8} {'p50':>9} {'p95':>9} {'p99':>9}  outcomes")
+        for name, row in endpoints.items():
+            outcomes = ', '.join(f'{outcome}={count}' for outcome, count in sorted(row['outcomes'].items()))
+            self.stdout.write(
+                f"{name:<18} {row['requests']:>7} {row['per_second']:>8.1f} {row['p50_ms']:>7.1f}ms "
+                f"{row['p95_ms']:>7.1f}ms {row['p99_ms']:>7.1f}ms  {outcomes}"
+            )
+        sale_outcomes = endpoints.get('complete_sale', {}).get('outcomes', {})
+        self.stdout.write(
+            f"\n{len(stats.order_ids)} sales in {elapsed:.1f}s ({results['sales_per_second']} sales/s), "
+            f"{sale_outcomes.get('locked', 0)} rejected with database locked"
+        )
+
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(results, indent=2))
+            self.stdout.write(f"Results written to {options['output']}")
+
+        if consistency['mismatched_products'] or consistency['negative_stock'] or consistency['unconfirmed_orders']:
+            raise CommandError(f'Stock is inconsistent after the run: {consistency}')
+        self.stdout.write(self.style.SUCCESS(f"Stock consistent for {consistency['checked_products']} products"))
+
+    def check_stock(self, stock_before, order_ids, user, started_at):
+        """
+        Compare stock with what the confirmed sales should have left.
+
+        Also counts orders written by the account during the run that no
+        cashier saw confirmed, which would mean a sale was half applied.
+        Assumes no other sales touch these products during the run.
+        """
+        sold = dict(
+            OrderItem.objects.filter(order_id__in=order_ids, product_id__in=stock_before)
+            .values_list('product_id').annotate(units=Sum('quantity')).order_by()
+        )
+        stock_after = dict(Inventory.objects.filter(product_id__in=stock_before).values_list('product_id', 'quantity'))
+        mismatched = {
+            product_id: {'before': before, 'sold': sold.get(product_id, 0), 'after': stock_after.get(product_id)}
+            for product_id, before in stock_before.items()
+            if before - sold.get(product_id, 0) != stock_after.get(product_id)
+        }
+        return {
+            'checked_products': len(stock_before),
+            'mismatched_products': mismatched,
+            'negative_stock': Inventory.objects.filter(quantity__lt=0).count(),
+            'unconfirmed_orders': Order.objects.filter(
+                salesperson=user, order_date__gte=started_at
+            ).exclude(id__in=order_ids).count(),
+        }
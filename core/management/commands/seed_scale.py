@@ -0,0 +1,355 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import ROUND_CEILING, Decimal
+from itertools import accumulate
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.autocomplete import customer_index
+from accounts.models import Customer, ShopAssistant
+from accounts.phone import get_local_digits, get_search_fields
+from inventory.models import Brand, Category, Color, Inventory, Product, Size, StockAdjustment, Supplier
+from sales.models import Order, OrderItem, SalespersonDailySales, Transaction
+
+CATEGORY_TREE = {
+    'Clothing': {'Baby': ['Bodysuits', 'Sleepsuits', 'Sets'], 'Kids': ['T-Shirts', 'Dresses', 'Trousers']},
+    'Feeding': {'Bottles': ['Glass Bottles', 'Plastic Bottles'], 'Tableware': ['Bowls', 'Cups']},
+    'Toys': {'Educational': ['Blocks', 'Puzzles'], 'Soft Toys': ['Plush', 'Rattles']},
+    'Baby Care': {'Bath': ['Shampoo', 'Lotion'], 'Diapering': ['Diapers', 'Wipes']},
+    'Nursery': {'Furniture': ['Cribs', 'Chairs'], 'Bedding': ['Blankets', 'Pillows']},
+}
+BRANDS = ['Tiny Steps', 'Little Star', 'Mom & Me', 'Happy Tots', 'Babyland', 'Kiddo', 'Snuggle', 'Sunny Days']
+COLORS = ['White', 'Pink', 'Blue', 'Yellow', 'Green', 'Red', 'Grey']
+SIZES = ['0-3M', '3-6M', '6-12M', '1-2Y', '2-3Y', '3-4Y', '4-5Y']
+FIRST_NAMES = ['Ayesha', 'Rahim', 'Karim', 'Fatema', 'Nusrat', 'Tanvir', 'Sadia', 'Imran', 'Farhana', 'Arif', 'Mitu', 'Sabbir']
+LAST_NAMES = ['Hossain', 'Rahman', 'Ahmed', 'Islam', 'Khan', 'Chowdhury', 'Begum', 'Akter', 'Sarkar', 'Das']
+PRICE_BANDS = [(150, 600, 50), (600, 1500, 30), (1500, 5000, 15), (5000, 25000, 5)]
+PAYMENT_METHODS = ['cash'] * 6 + ['card'] * 3 + ['upi']
+# Relative order volume per hour of the day (shop opens at 10 and closes at 22)
+HOUR_WEIGHTS = [0] * 10 + [3, 5, 6, 5, 4, 4, 5, 7, 9, 10, 8, 4] + [0] * 2
+WEEKDAY_WEIGHTS = [8, 8, 8, 9, 12, 14, 10]
+
+
+@contextmanager
+def historical_dates(*fields):
+    """Let bulk_create keep explicit values for auto_now_add fields"""
+    previous = [field.auto_now_add for field in fields]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, value in zip(fields, previous):
+            field.auto_now_add = value
+
+
+def get_first_or_create(model, defaults=None, **lookup):
+    """Like get_or_create, for models whose names are not unique"""
+    return model.objects.filter(**lookup).first() or model.objects.create(**lookup, **(defaults or {}))
+
+
+def zipf_weights(count, exponent):
+    """Cumulative weights where the item at rank r is chosen about 1 / r ** exponent as often"""
+    return list(accumulate(1 / (rank + 1) ** exponent for rank in range(count)))
+
+
+class Command(BaseCommand):
+    help = 'Generate a large deterministic dataset for benchmarking with bulk inserts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=100000, help='Number of orders to create')
+        parser.add_argument('--products', type=int, default=5000, help='Number of products to create')
+        parser.add_argument('--customers', type=int, default=20000, help='Number of customers to create')
+        parser.add_argument('--assistants', type=int, default=20, help='Number of shop assistants to create')
+        parser.add_argument('--salespersons', type=int, default=10, help='Number of salesperson users to create')
+        parser.add_argument('--days', type=int, default=365, help='Spread orders over this many past days')
+        parser.add_argument('--seed', type=int, default=1, help='Random seed; the same seed produces the same data')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk insert')
+
+    def handle(self, *args, **options):
+        for name in ('orders', 'products', 'customers', 'assistants', 'salespersons', 'days', 'batch_size'):
+            if options[name] < 1:
+                raise CommandError(f'--{name.replace("_", "-")} must be at least 1')
+        if options['customers'] > 10 ** 8:
+            raise CommandError('--customers cannot exceed 100000000')
+
+        self.rng = random.Random(options['seed'])
+        self.seed = options['seed']
+        self.batch_size = options['batch_size']
+        self.prefix = f'S{self.seed}-'
+        if Product.objects.filter(sku__startswith=self.prefix).exists():
+            raise CommandError(f'Data for seed {self.seed} already exists; use another --seed or clean up first')
+        # Phone numbers only carry the last digit of the seed, so seeds such as 1 and 11 share them
+        first, last = (get_local_digits(self.customer_phone(i)) for i in (0, options['customers'] - 1))
+        if Customer.objects.filter(phone_digits__range=(first, last)).exists():
+            raise CommandError(
+                f'Customer phone numbers of seed {self.seed} are already taken by another seed ending in '
+                f'{self.seed % 10}; use another --seed or clean up first'
+            )
+
+        self.now = timezone.now().replace(microsecond=0)
+        self.started = time.perf_counter()
+        self.total_rows = 0
+
+        with transaction.atomic():
+            references = self.create_references()
+            users = self.create_salespersons(options['salespersons'])
+            assistants = self.create_assistants(options['assistants'])
+            products = self.create_products(options['products'], references)
+            customers = self.create_customers(options['customers'])
+        sold = self.create_orders(options['orders'], options['days'], products, customers, users, assistants)
+        self.create_inventory(products, sold, users[0], options['days'])
+        self.update_customer_stats()
+        self.rebuild_rollups()
+
+        elapsed = time.perf_counter() - self.started
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {self.total_rows} rows in {elapsed:.1f}s ({self.total_rows / elapsed:,.0f} rows/s)'
+        ))
+
+    def report(self, label, rows, started):
+        elapsed = max(time.perf_counter() - started, 1e-6)
+        self.total_rows += rows
+        self.stdout.write(f'{label:<18} {rows:>10,} rows {elapsed:>8.1f}s {rows / elapsed:>12,.0f} rows/s')
+
+    def create_references(self):
+        started = time.perf_counter()
+        leaves = []
+        for root_name, children in CATEGORY_TREE.items():
+            root = get_first_or_create(Category, name=root_name, parent=None)
+            for child_name, leaf_names in children.items():
+                child = get_first_or_create(Category, name=child_name, parent=root)
+                leaves.extend(get_first_or_create(Category, name=leaf_name, parent=child) for leaf_name in leaf_names)
+
+        references = {
+            'categories': leaves,
+            'brands': [get_first_or_create(Brand, name=name) for name in BRANDS],
+            'colors': [Color.objects.get_or_create(name=name)[0] for name in COLORS],
+            'sizes': [Size.objects.get_or_create(name=name)[0] for name in SIZES],
+            'suppliers': [
+                get_first_or_create(
+                    Supplier,
+                    name=f'{brand} Distribution',
+                    defaults={
+                        'contact_person': self.person_name(),
+                        'contact_info': f'+88017{self.rng.randrange(10 ** 8):08d}',
+                        'lead_time_days': self.rng.choice([3, 5, 7, 10, 14]),
+                    }
+                )
+                for brand in BRANDS
+            ],
+        }
+        self.report('reference data', len(leaves) + len(BRANDS) * 2 + len(COLORS) + len(SIZES), started)
+        return references
+
+    def create_salespersons(self, count):
+        started = time.perf_counter()
+        users = []
+        for i in range(count):
+            user, created = User.objects.get_or_create(
+                username=f'seller{self.seed}_{i}',
+                defaults={'first_name': self.person_name().split()[0], 'is_staff': True}
+            )
+            if created:
+                user.set_unusable_password()
+                user.save()
+            user.userprofile.is_salesperson = True
+            user.userprofile.save()
+            users.append(user)
+        self.report('salespersons', count, started)
+        return users
+
+    def create_assistants(self, count):
+        started = time.perf_counter()
+        assistants = ShopAssistant.objects.bulk_create([
+            ShopAssistant(
+                name=self.person_name(),
+                contact_number=f'+88019{self.seed % 10}{i:07d}',
+                joining_date=(self.now - timedelta(days=self.rng.randrange(30, 1500))).date(),
+                is_active=self.rng.random() > 0.1,
+            )
+            for i in range(count)
+        ], batch_size=self.batch_size)
+        self.report('shop assistants', count, started)
+        return assistants
+
+    def create_products(self, count, references):
+        started = time.perf_counter()
+        rng = self.rng
+        products = []
+        for i in range(count):
+            low, high, _ = rng.choices(PRICE_BANDS, weights=[band[2] for band in PRICE_BANDS])[0]
+            category = rng.choice(references['categories'])
+            brand_index = rng.randrange(len(BRANDS))
+            products.append(Product(
+                name=f'{BRANDS[brand_index]} {category.name} {i + 1}',
+                description=f'{category.name} by {BRANDS[brand_index]}',
+                price=Decimal(rng.randrange(low, high, 10)),
+                category=category,
+                brand=references['brands'][brand_index],
+                supplier=references['suppliers'][brand_index],
+                color=rng.choice(references['colors']),
+                size=rng.choice(references['sizes']),
+                sku=f'{self.prefix}{i:07d}',
+                is_active=rng.random() > 0.02,
+            ))
+        products = Product.objects.bulk_create(products, batch_size=self.batch_size)
+        self.report('products', count, started)
+        return products
+
+    def create_customers(self, count):
+        started = time.perf_counter()
+        customers = []
+        for start in range(0, count, self.batch_size):
+            batch = [
+                Customer(
+                    name=self.person_name(),
+                    phone_number=phone,
+                    email=f'customer{self.seed}_{i}@example.com' if self.rng.random() < 0.4 else None,
+                    **get_search_fields(phone),
+                )
+                for i in range(start, min(start + self.batch_size, count))
+                for phone in [self.customer_phone(i)]
+            ]
+            customers.extend(Customer.objects.bulk_create(batch))
+        self.report('customers', count, started)
+        return customers
+
+    def customer_phone(self, i):
+        """+8801, the last digit of the seed and eight digits"""
+        return f'+8801{self.seed % 10}{i:08d}'
+
+    def create_orders(self, count, days, products, customers, users, assistants):
+        """
+        Create orders with items and payments in chunks.
+
+        Returns units sold per product id and completed order totals per
+        customer id, so inventory and customers can be finished without
+        reading the orders back.
+        """
+        rng = self.rng
+        product_weights = zipf_weights(len(products), 0.9)
+        customer_weights = zipf_weights(len(customers), 0.6)
+        # Volume grows gently towards today
+        day_weights = list(accumulate(1.0 + i / days for i in range(days)))
+        hours = list(range(24))
+        sold = {}
+        started = time.perf_counter()
+        related_rows = 0
+
+        with historical_dates(Order._meta.get_field('order_date'), Transaction._meta.get_field('transaction_date')):
+            for start in range(0, count, self.batch_size):
+                size = min(self.batch_size, count - start)
+                orders, baskets = [], []
+                for _ in range(size):
+                    date = self.order_date(days, day_weights, hours)
+
+                    basket = {}
+                    for product in rng.choices(products, cum_weights=product_weights, k=rng.choice((1, 1, 2, 2, 3, 4, 5))):
+                        basket[product] = basket.get(product, 0) + rng.choice((1, 1, 1, 2, 3))
+                    total = sum((product.price * quantity for product, quantity in basket.items()), Decimal('0.00'))
+
+                    status = 'completed' if rng.random() < 0.97 else rng.choice(('cancelled', 'pending'))
+                    customer = rng.choices(customers, cum_weights=customer_weights)[0] if rng.random() < 0.6 else None
+                    orders.append(Order(
+                        customer=customer,
+                        salesperson=rng.choice(users),
+                        shop_assistant=rng.choice(assistants) if rng.random() < 0.8 else None,
+                        order_date=date,
+                        subtotal=total,
+                        tax=Decimal('0.00'),
+                        total=total,
+                        status=status,
+                    ))
+                    baskets.append(basket)
+
+                    if status == 'completed':
+                        for product, quantity in basket.items():
+                            sold[product.pk] = sold.get(product.pk, 0) + quantity
+
+                with transaction.atomic():
+                    Order.objects.bulk_create(orders)
+                    items = [
+                        OrderItem(order=order, product=product, quantity=quantity, price=product.price)
+                        for order, basket in zip(orders, baskets)
+                        for product, quantity in basket.items()
+                    ]
+                    OrderItem.objects.bulk_create(items, batch_size=self.batch_size)
+                    payments = []
+                    for order in orders:
+                        if order.status != 'completed':
+                            continue
+                        method = rng.choice(PAYMENT_METHODS)
+                        # Cash is usually paid with round notes
+                        paid = order.total if method != 'cash' else (order.total / 100).to_integral_value(rounding=ROUND_CEILING) * 100
+                        payments.append(Transaction(
+                            order=order,
+                            payment_method=method,
+                            amount_paid=paid,
+                            change_amount=paid - order.total,
+                            transaction_date=order.order_date,
+                        ))
+                    Transaction.objects.bulk_create(payments, batch_size=self.batch_size)
+                related_rows += len(items) + len(payments)
+                self.stdout.write(f'  orders {start + size:,}/{count:,}')
+
+        self.report('orders', count + related_rows, started)
+        return sold
+
+    def create_inventory(self, products, sold, user, days):
+        """Opening stock covers every sale, so stock on hand = opening stock - units sold"""
+        started = time.perf_counter()
+        rng = self.rng
+        inventories, adjustments = [], []
+        opened_at = self.now - timedelta(days=days)
+        for product in products:
+            units_sold = sold.get(product.pk, 0)
+            on_hand = rng.choice((0, rng.randrange(1, 10), rng.randrange(10, 200)))
+            threshold = rng.choice((5, 10, 20))
+            inventories.append(Inventory(product=product, quantity=on_hand, low_stock_threshold=threshold))
+            adjustments.append(StockAdjustment(
+                product=product,
+                quantity=units_sold + on_hand,
+                adjustment_type='addition',
+                reason='Opening stock',
+                adjusted_by=user,
+                created_at=opened_at,
+            ))
+        with transaction.atomic():
+            Inventory.objects.bulk_create(inventories, batch_size=self.batch_size)
+            StockAdjustment.objects.bulk_create(adjustments, batch_size=self.batch_size)
+        self.report('inventory', len(inventories) + len(adjustments), started)
+
+    def update_customer_stats(self):
+        started = time.perf_counter()
+        with transaction.atomic():
+            rows = Customer.objects.refresh_order_stats()
+        customer_index.invalidate()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'{"customer stats":<18} {rows:>10,} rows {elapsed:>8.1f}s')
+
+    def rebuild_rollups(self):
+        started = time.perf_counter()
+        rows = SalespersonDailySales.rebuild()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'{"salesperson days":<18} {rows:>10,} rows {elapsed:>8.1f}s')
+
+    def order_date(self, days, day_weights, hours):
+        """Pick an order time, busier on weekends and in the evening"""
+        rng = self.rng
+        while True:
+            days_ago = days - 1 - rng.choices(range(days), cum_weights=day_weights)[0]
+            date = self.now - timedelta(days=days_ago)
+            if rng.random() * max(WEEKDAY_WEIGHTS) < WEEKDAY_WEIGHTS[date.weekday()]:
+                break
+        date = date.replace(hour=rng.choices(hours, weights=HOUR_WEIGHTS)[0], minute=rng.randrange(60), second=rng.randrange(60))
+        # Orders from today cannot be in the future
+        return min(date, self.now)
+
+    def person_name(self):
+        return f'{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)}'
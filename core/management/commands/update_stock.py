@@ -1,10 +1,17 @@
-from django.core.management.base import BaseCommand
-from django.db import models
-from inventory.models import Product, Inventory
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Avg, Count, Q
+from inventory.models import Product, Inventory, StockAdjustment
+
+AUDIT_REASON = 'Stock top-up (update_stock)'
 
 
 class Command(BaseCommand):
-    help = 'Update stock levels for all products to ensure minimum stock of 10 items'
+    help = (
+        'Top up every product below a minimum stock level. Missing inventory rows are created in one '
+        'INSERT, low rows are raised in one UPDATE and each change is recorded as a stock adjustment'
+    )
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -19,100 +26,90 @@ class Command(BaseCommand):
             default=15,
             help='Set stock to this level if below minimum (default: 15)',
         )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would change without writing anything',
+        )
+        parser.add_argument(
+            '--user',
+            help='Username recorded on the stock adjustments; defaults to the first superuser',
+        )
 
     def handle(self, *args, **options):
         min_stock = options['min_stock']
         set_to_stock = options['set_to']
-        
-        self.stdout.write("Updating Product Stock Levels...")
-        self.stdout.write("=" * 50)
-        
-        # Get all products and their inventory
-        products_updated = 0
-        products_created = 0
-        total_products = Product.objects.count()
-        
-        self.stdout.write(f"Checking {total_products} products...")
-        self.stdout.write(f"Minimum stock level: {min_stock}")
-        self.stdout.write(f"Update stock to: {set_to_stock}")
-        self.stdout.write("")
-        
-        for product in Product.objects.all():
-            try:
-                # Get or create inventory for this product
-                inventory, created = Inventory.objects.get_or_create(
-                    product=product,
-                    defaults={
-                        'quantity': set_to_stock,
-                        'low_stock_threshold': 5
-                    }
-                )
-                
-                if created:
-                    self.stdout.write(f"Created inventory for {product.name}: {set_to_stock} units")
-                    products_created += 1
-                elif inventory.quantity < min_stock:
-                    old_quantity = inventory.quantity
-                    inventory.quantity = set_to_stock
-                    inventory.save()
-                    
-                    self.stdout.write(f"Updated {product.name}: {old_quantity} → {inventory.quantity}")
-                    products_updated += 1
-                else:
-                    self.stdout.write(f"OK: {product.name} - Current stock: {inventory.quantity}")
-                    
-            except Exception as e:
-                self.stdout.write(
-                    self.style.ERROR(f"Error updating {product.name}: {e}")
-                )
-        
-        self.stdout.write("")
-        self.stdout.write("=" * 50)
-        self.stdout.write(
-            self.style.SUCCESS(f"Stock Update Complete!")
-        )
-        self.stdout.write(f"✅ Products Updated: {products_updated}")
-        self.stdout.write(f"✅ Inventories Created: {products_created}")
-        self.stdout.write(f"✅ Products Already OK: {total_products - products_updated - products_created}")
-        
-        # Show summary statistics
+        dry_run = options['dry_run']
+        if set_to_stock < min_stock:
+            raise CommandError('--set-to must be at least --min-stock')
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+        else:
+            user = User.objects.filter(is_superuser=True).order_by('pk').first()
+        if user is None and not dry_run:
+            raise CommandError('No user to record the stock adjustments; pass --user')
+
+        self.stdout.write(f"Minimum stock level: {min_stock}, top up to: {set_to_stock}")
+
+        with transaction.atomic():
+            missing = list(Product.objects.filter(inventory__isnull=True).values_list('pk', 'name'))
+            # Locked so that a sale cannot slip in between reading and raising the quantity
+            low = list(
+                Inventory.objects.select_for_update().filter(quantity__lt=min_stock)
+                .values_list('product_id', 'product__name', 'quantity')
+            )
+            if options['verbosity'] >= 2:
+                for _, name in missing:
+                    self.stdout.write(f"Create inventory for {name}: {set_to_stock} units")
+                for _, name, quantity in low:
+                    self.stdout.write(f"Update {name}: {quantity} → {set_to_stock}")
+
+            if not dry_run:
+                Inventory.objects.bulk_create([
+                    Inventory(product_id=product_id, quantity=set_to_stock, low_stock_threshold=5)
+                    for product_id, _ in missing
+                ])
+                Inventory.objects.filter(quantity__lt=min_stock).update(quantity=set_to_stock)
+                adjustments = [(product_id, set_to_stock) for product_id, _ in missing if set_to_stock]
+                adjustments += [(product_id, set_to_stock - quantity) for product_id, _, quantity in low]
+                StockAdjustment.objects.bulk_create([
+                    StockAdjustment(
+                        product_id=product_id, quantity=change, adjustment_type='addition',
+                        reason=AUDIT_REASON, adjusted_by=user,
+                    )
+                    for product_id, change in adjustments
+                ])
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING(
+                f"Dry run: would update {len(low)} products and create {len(missing)} inventories"
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Updated {len(low)} products and created {len(missing)} inventories"))
         self.show_stock_summary(min_stock)
 
     def show_stock_summary(self, min_stock):
-        """Show current stock summary"""
-        
-        self.stdout.write(f"\nStock Summary:")
+        """Stock level bands, average and total in one aggregate query"""
+        summary = Inventory.objects.aggregate(
+            very_low=Count('pk', filter=Q(quantity__lt=5)),
+            low=Count('pk', filter=Q(quantity__gte=5, quantity__lt=min_stock)),
+            good=Count('pk', filter=Q(quantity__gte=min_stock, quantity__lt=20)),
+            high=Count('pk', filter=Q(quantity__gte=20)),
+            below_minimum=Count('pk', filter=Q(quantity__lt=min_stock)),
+            average=Avg('quantity'),
+            total=Count('pk'),
+        )
+
+        self.stdout.write("\nStock Summary:")
         self.stdout.write("-" * 30)
-        
-        # Stock level categories
-        very_low = Inventory.objects.filter(quantity__lt=5).count()
-        low = Inventory.objects.filter(quantity__gte=5, quantity__lt=min_stock).count() 
-        good = Inventory.objects.filter(quantity__gte=min_stock, quantity__lt=20).count()
-        high = Inventory.objects.filter(quantity__gte=20).count()
-        
-        self.stdout.write(f"Very Low (< 5):       {very_low} products")
-        self.stdout.write(f"Low (5-{min_stock-1}):           {low} products")
-        self.stdout.write(f"Good ({min_stock}-19):        {good} products")
-        self.stdout.write(f"High (20+):           {high} products")
-        
-        # Calculate average
-        avg_stock = Inventory.objects.aggregate(
-            avg_stock=models.Avg('quantity')
-        )['avg_stock'] or 0
-        
-        self.stdout.write(f"\nAverage stock level: {avg_stock:.1f}")
-        self.stdout.write(f"Total inventory items: {Inventory.objects.count()}")
-        
-        # Products that might need attention
-        low_stock = Inventory.objects.select_related('product').filter(
-            quantity__lt=min_stock
-        ).order_by('quantity')
-        
-        if low_stock.exists():
-            self.stdout.write(f"\n⚠️  Products Below {min_stock} Units:")
-            for inv in low_stock:
-                self.stdout.write(f"• {inv.product.name}: {inv.quantity} units")
+        self.stdout.write(f"Very Low (< 5):       {summary['very_low']} products")
+        self.stdout.write(f"Low (5-{min_stock-1}):           {summary['low']} products")
+        self.stdout.write(f"Good ({min_stock}-19):        {summary['good']} products")
+        self.stdout.write(f"High (20+):           {summary['high']} products")
+        self.stdout.write(f"\nAverage stock level: {summary['average'] or 0:.1f}")
+        self.stdout.write(f"Total inventory items: {summary['total']}")
+
+        if summary['below_minimum']:
+            self.stdout.write(self.style.WARNING(f"{summary['below_minimum']} products are below {min_stock} units"))
         else:
-            self.stdout.write(
-                self.style.SUCCESS(f"\n✅ All products have at least {min_stock} units in stock!")
-            )
\ No newline at end of file
+            self.stdout.write(self.style.SUCCESS(f"All products have at least {min_stock} units in stock"))
@@ -0,0 +1,253 @@
+"""
+Prometheus metrics.
+
+Counters and histograms are aggregated in memory per process. When the
+server sets METRICS_DIR (from the KIDSTORE_METRICS_DIR environment
+variable), each process writes its totals to ``METRICS_DIR/metrics-<pid>.json``
+after recording something (atomically, at most once per FLUSH_INTERVAL),
+and the /metrics endpoint sums the files of every worker, so the numbers
+are complete under gunicorn with several workers. Events recorded within
+FLUSH_INTERVAL of the last write are written by a timer thread once the
+interval has passed, so an idle worker's files are at most FLUSH_INTERVAL
+behind when scraped. Like the Prometheus
+client's multiprocess mode, a process starting to use the directory
+removes the files of processes that are no longer running, so a restart
+starts the counters from zero. Without METRICS_DIR only the serving
+process is reported.
+
+Gauges describing the current state of the shop (low-stock SKUs) are read
+from the database at scrape time.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from pathlib import Path
+
+from django.conf import settings
+
+FLUSH_INTERVAL = 1.0
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# name: (type, help text)
+METRICS = {
+    'kidstore_http_requests_total': ('counter', 'HTTP requests by view, method and status'),
+    'kidstore_http_request_duration_seconds': ('histogram', 'HTTP request latency by view'),
+    'kidstore_db_queries_total': ('counter', 'Database queries by view'),
+    'kidstore_db_query_duration_seconds_total': ('counter', 'Time spent in database queries by view'),
+    'kidstore_cache_requests_total': ('counter', 'Cache lookups by cache and result (hit or miss)'),
+    'kidstore_checkouts_total': ('counter', 'Completed checkouts by till'),
+    'kidstore_checkout_failures_total': ('counter', 'Failed checkouts by till and reason'),
+    'kidstore_checkout_duration_seconds': ('histogram', 'Checkout latency by till'),
+}
+
+
+def labels_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        # key -> [count per bucket (last is +Inf), sum]
+        self._histograms = {}
+        self._last_flush = 0.0
+        # Whether anything was recorded since the last flush
+        self._dirty = False
+        # The directory dead processes' files were last removed from
+        self._cleaned_directory = None
+        # Pending flush of events recorded while writes were throttled
+        self._timer = None
+
+    @property
+    def directory(self):
+        directory = getattr(settings, 'METRICS_DIR', None)
+        return Path(directory) if directory else None
+
+    def inc(self, name, labels, amount=1):
+        key = (name, labels_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+            self._dirty = True
+        self.maybe_flush()
+
+    def observe(self, name, labels, value):
+        key = (name, labels_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * (len(LATENCY_BUCKETS) + 1), 0.0]
+            histogram[0][bisect_left(LATENCY_BUCKETS, value)] += 1
+            histogram[1] += value
+            self._dirty = True
+        self.maybe_flush()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': [[name, dict(labels), value] for (name, labels), value in self._counters.items()],
+                'histograms': [
+                    [name, dict(labels), list(buckets), total]
+                    for (name, labels), (buckets, total) in self._histograms.items()
+                ],
+            }
+
+    def maybe_flush(self):
+        if self.directory is None:
+            return
+        wait = FLUSH_INTERVAL - (time.monotonic() - self._last_flush)
+        if wait <= 0:
+            self.flush()
+            return
+        with self._lock:
+            if self._timer is None:
+                self._timer = threading.Timer(wait, self._timed_flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _timed_flush(self):
+        with self._lock:
+            self._timer = None
+        self.flush()
+
+    def reset_after_fork(self):
+        # Timer threads do not survive a fork
+        self._timer = None
+
+    def prepare(self, directory):
+        """Create ``directory`` and, the first time this process uses it, remove the files of dead processes"""
+        if self._cleaned_directory == directory:
+            return
+        directory.mkdir(parents=True, exist_ok=True)
+        for path in directory.glob('metrics-*.json'):
+            pid = path.stem.removeprefix('metrics-')
+            if pid.isdigit() and int(pid) != os.getpid() and not pid_exists(int(pid)):
+                path.unlink(missing_ok=True)
+        self._cleaned_directory = directory
+
+    def flush(self):
+        """Write this process's totals, unless nothing was recorded since the last flush"""
+        directory = self.directory
+        if directory is None or not self._dirty:
+            return
+        self._last_flush = time.monotonic()
+        self.prepare(directory)
+        with self._lock:
+            self._dirty = False
+        path = directory / f'metrics-{os.getpid()}.json'
+        temporary = path.with_suffix(f'.{threading.get_ident()}.tmp')
+        temporary.write_text(json.dumps(self.snapshot()))
+        os.replace(temporary, path)
+
+    def collect(self):
+        """Return (counters, histograms) summed over every process"""
+        snapshots = []
+        if self.directory is None:
+            snapshots.append(self.snapshot())
+        else:
+            self.prepare(self.directory)
+            self.flush()
+            for path in self.directory.glob('metrics-*.json'):
+                try:
+                    snapshots.append(json.loads(path.read_text()))
+                except (OSError, ValueError):
+                    continue
+
+        counters, histograms = {}, {}
+        for snapshot in snapshots:
+            for name, labels, value in snapshot['counters']:
+                key = (name, labels_key(labels))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, buckets, total in snapshot['histograms']:
+                key = (name, labels_key(labels))
+                merged = histograms.setdefault(key, [[0] * len(buckets), 0.0])
+                merged[0] = [a + b for a, b in zip(merged[0], buckets)]
+                merged[1] += total
+        return counters, histograms
+
+
+def pid_exists(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Running, under another user
+        return True
+    return True
+
+
+registry = MetricsRegistry()
+atexit.register(registry.flush)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=registry.reset_after_fork)
+
+
+def record_request(view, method, status, seconds, queries, sql_seconds):
+    view = view or 'unresolved'
+    registry.inc('kidstore_http_requests_total', {'view': view, 'method': method, 'status': str(status)})
+    registry.observe('kidstore_http_request_duration_seconds', {'view': view}, seconds)
+    registry.inc('kidstore_db_queries_total', {'view': view}, queries)
+    registry.inc('kidstore_db_query_duration_seconds_total', {'view': view}, sql_seconds)
+
+
+def record_cache(cache, hit):
+    registry.inc('kidstore_cache_requests_total', {'cache': cache, 'result': 'hit' if hit else 'miss'})
+
+
+def record_checkout(till, seconds, failure_reason=None):
+    if failure_reason:
+        registry.inc('kidstore_checkout_failures_total', {'till': till, 'reason': failure_reason})
+    else:
+        registry.inc('kidstore_checkouts_total', {'till': till})
+    registry.observe('kidstore_checkout_duration_seconds', {'till': till}, seconds)
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_labels(labels, extra=()):
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in pairs) + '}'
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(gauges=()):
+    """
+    Render every metric in the Prometheus text exposition format.
+
+    ``gauges`` is a list of (name, help, value) computed by the caller.
+    """
+    counters, histograms = registry.collect()
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'counter':
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{format_labels(labels)} {format_value(value)}')
+            continue
+        for (metric, labels), (buckets, total) in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip((*LATENCY_BUCKETS, '+Inf'), buckets):
+                cumulative += count
+                lines.append(f'{name}_bucket{format_labels(labels, [("le", bound)])} {cumulative}')
+            lines.append(f'{name}_sum{format_labels(labels)} {format_value(total)}')
+            lines.append(f'{name}_count{format_labels(labels)} {cumulative}')
+    for name, help_text, value in gauges:
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} gauge')
+        lines.append(f'{name} {format_value(value)}')
+    return '\n'.join(lines) + '\n'
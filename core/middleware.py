@@ -0,0 +1,109 @@
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.urls import reverse
+
+from .instrumentation import QueryRecorder, request_stats
+from .metrics import record_request
+from .profiling import profile_request, profile_store, profiling_lock
+
+logger = logging.getLogger('kidstore.performance')
+
+DEFAULT_BUDGET = {'queries': 50, 'wall_ms': 1000}
+
+
+def format_duplicates(recorder):
+    return [{'sql': sql, 'count': count} for sql, count in recorder.duplicates()]
+
+
+class QueryBudgetMiddleware:
+    """
+    Record SQL count, SQL time, duplicate queries and wall time per request.
+
+    Every request is logged as one JSON line on the ``kidstore.performance``
+    logger, aggregated for the staff performance page and counted in the
+    /metrics latency and query metrics. Requests exceeding
+    the budget for their URL name (``QUERY_BUDGETS``, falling back to
+    ``QUERY_BUDGET_DEFAULT``) are logged as warnings.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.default_budget = {**DEFAULT_BUDGET, **getattr(settings, 'QUERY_BUDGET_DEFAULT', {})}
+        self.budgets = getattr(settings, 'QUERY_BUDGETS', {})
+
+    def get_budget(self, view_name):
+        return {**self.default_budget, **self.budgets.get(view_name, {})}
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        wall_ms = (time.perf_counter() - start) * 1000
+
+        match = request.resolver_match
+        view_name = match.view_name if match else None
+        budget = self.get_budget(view_name)
+        over_budget = recorder.count > budget['queries'] or wall_ms > budget['wall_ms']
+
+        record = {
+            'view': view_name,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': recorder.count,
+            'sql_ms': round(recorder.duration * 1000, 2),
+            'wall_ms': round(wall_ms, 2),
+            'over_budget': over_budget,
+        }
+        request_stats.record(record, recorder.statements)
+        record_request(view_name, request.method, response.status_code, wall_ms / 1000, recorder.count, recorder.duration)
+
+        # Duplicates are fingerprinted only for lines that are actually logged
+        if over_budget:
+            logger.warning(json.dumps({**record, 'duplicates': format_duplicates(recorder), 'budget': budget}))
+        elif logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({**record, 'duplicates': format_duplicates(recorder)}))
+
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Profile a single request on demand.
+
+    A staff user adds ``?_profile=1`` to the URL or sends an ``X-Profile: 1``
+    header; ``cprofile`` instead of ``1`` forces cProfile when a sampling
+    profiler is installed. The artifact is stored for the staff profile pages
+    and its id and URL are returned in the ``X-Profile-Id`` and
+    ``X-Profile-Url`` response headers. Must come after
+    AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'PROFILING_ENABLED', True)
+
+    def __call__(self, request):
+        requested = request.GET.get('_profile') or request.headers.get('X-Profile')
+        if not (self.enabled and requested and request.user.is_staff):
+            return self.get_response(request)
+
+        if not profiling_lock.acquire(blocking=False):
+            # Another request is being profiled; profilers cannot be nested
+            response = self.get_response(request)
+            response['X-Profile-Skipped'] = 'busy'
+            return response
+        try:
+            response, artifact = profile_request(self.get_response, request, requested)
+        finally:
+            profiling_lock.release()
+
+        profile_store.save(artifact)
+        response['X-Profile-Id'] = artifact['id']
+        response['X-Profile-Url'] = reverse('dashboard:profile-detail', args=[artifact['id']])
+        return response
@@ -0,0 +1,166 @@
+"""
+On-demand profiling of single requests.
+
+ProfilingMiddleware runs a request under a profiler when a staff user asks
+for it. The result is stored as a JSON artifact holding the top functions,
+every SQL query with its duration and the template render time, and can be
+browsed on the staff performance pages.
+
+cProfile is always available. pyinstrument, a sampling profiler with far
+less overhead on deep call stacks, is used instead when it is installed.
+"""
+import cProfile
+import json
+import pstats
+import re
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection
+from django.template.base import Template
+from django.utils import timezone
+
+from .instrumentation import QueryRecorder
+
+try:
+    import pyinstrument
+except ImportError:
+    pyinstrument = None
+
+TOP_FUNCTIONS = 40
+profiling_lock = threading.Lock()
+ARTIFACT_ID_RE = re.compile(r'^\d{8}T\d{6}-[0-9a-f]{8}$')
+
+# cProfile key of Template.render, whose cumulative time is the template time
+TEMPLATE_RENDER_KEY = (
+    Template.render.__code__.co_filename,
+    Template.render.__code__.co_firstlineno,
+    Template.render.__code__.co_name,
+)
+
+
+def get_profiler_name(requested):
+    if requested == 'cprofile' or pyinstrument is None:
+        return 'cprofile'
+    return 'sampling'
+
+
+def summarise_cprofile(profiler):
+    """Return (top functions by cumulative time, template render time in ms)"""
+    stats = pstats.Stats(profiler)
+    rows = []
+    for (filename, line, name), (_, calls, own_time, cumulative, _) in stats.stats.items():
+        rows.append({
+            'function': name,
+            'location': f'{filename}:{line}',
+            'calls': calls,
+            'own_ms': round(own_time * 1000, 2),
+            'cumulative_ms': round(cumulative * 1000, 2),
+        })
+    rows.sort(key=lambda row: row['cumulative_ms'], reverse=True)
+    template = stats.stats.get(TEMPLATE_RENDER_KEY)
+    return rows[:TOP_FUNCTIONS], round(template[3] * 1000, 2) if template else 0.0
+
+
+def profile_request(get_response, request, requested='auto'):
+    """
+    Run the request under a profiler and return (response, artifact).
+
+    Only one request is profiled at a time per process; the caller holds
+    ``profiling_lock``.
+    """
+    profiler_name = get_profiler_name(requested)
+    recorder = QueryRecorder(keep_queries=True)
+    if profiler_name == 'sampling':
+        profiler = pyinstrument.Profiler(interval=0.001)
+        start_profiler, stop_profiler = profiler.start, profiler.stop
+    else:
+        profiler = cProfile.Profile()
+        start_profiler, stop_profiler = profiler.enable, profiler.disable
+
+    start = time.perf_counter()
+    with connection.execute_wrapper(recorder):
+        start_profiler()
+        try:
+            response = get_response(request)
+        finally:
+            stop_profiler()
+    wall_ms = (time.perf_counter() - start) * 1000
+
+    now = timezone.now()
+    match = request.resolver_match
+    artifact = {
+        'id': f"{now.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}",
+        'created_at': now.isoformat(),
+        'user': request.user.get_username(),
+        'method': request.method,
+        'path': request.get_full_path(),
+        'view': match.view_name if match else None,
+        'status': response.status_code,
+        'profiler': profiler_name,
+        'wall_ms': round(wall_ms, 2),
+        'sql_ms': round(recorder.duration * 1000, 2),
+        'query_count': recorder.count,
+        'queries': [
+            {'sql': query['sql'], 'duration_ms': round(query['duration'] * 1000, 3), 'many': query['many']}
+            for query in recorder.queries
+        ],
+        'duplicates': [{'sql': sql, 'count': count} for sql, count in recorder.duplicates(limit=10)],
+    }
+    if profiler_name == 'cprofile':
+        artifact['functions'], artifact['template_ms'] = summarise_cprofile(profiler)
+    else:
+        # The sampling profiler reports a call tree rather than per-function totals
+        artifact['functions'], artifact['template_ms'] = [], None
+        artifact['call_tree'] = profiler.output_text(unicode=False, color=False)
+    return response, artifact
+
+
+class ProfileStore:
+    """Profile artifacts stored as JSON files in PROFILE_ARTIFACT_DIR"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    @property
+    def directory(self):
+        return Path(getattr(settings, 'PROFILE_ARTIFACT_DIR', Path(settings.BASE_DIR) / 'profiles'))
+
+    def save(self, artifact):
+        directory = self.directory
+        with self._lock:
+            directory.mkdir(parents=True, exist_ok=True)
+            (directory / f"{artifact['id']}.json").write_text(json.dumps(artifact))
+            # Keep only the newest artifacts
+            limit = getattr(settings, 'PROFILE_ARTIFACT_LIMIT', 100)
+            for path in sorted(directory.glob('*.json'), reverse=True)[limit:]:
+                path.unlink(missing_ok=True)
+
+    def get(self, artifact_id):
+        if not ARTIFACT_ID_RE.match(artifact_id):
+            return None
+        path = self.directory / f'{artifact_id}.json'
+        if not path.exists():
+            return None
+        return json.loads(path.read_text())
+
+    def list(self):
+        """Return artifacts without their function and query lists, newest first"""
+        if not self.directory.exists():
+            return []
+        artifacts = []
+        for path in sorted(self.directory.glob('*.json'), reverse=True):
+            try:
+                artifact = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+            for key in ('functions', 'queries', 'duplicates', 'call_tree'):
+                artifact.pop(key, None)
+            artifacts.append(artifact)
+        return artifacts
+
+
+profile_store = ProfileStore()
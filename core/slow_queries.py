@@ -0,0 +1,198 @@
+"""
+Slow query log.
+
+SlowQueryLogger is installed as an execute wrapper on every database
+connection (see CoreConfig.ready). Statements slower than
+SLOW_QUERY_THRESHOLD_MS are written as JSON lines to the
+``kidstore.slow_queries`` logger (a rotating file by default) and aggregated
+per fingerprint for the staff slow query page.
+
+The query plan is captured once per fingerprint with EXPLAIN QUERY PLAN
+(EXPLAIN on other databases) on a separate raw cursor, so it neither goes
+through the wrappers again nor disturbs the result set being read. Plans
+that scan a whole watched table (SLOW_QUERY_SCAN_TABLES) are flagged; those
+are the report filters that need an index.
+"""
+import json
+import logging
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.template.base import Template
+from django.utils import timezone
+
+from .instrumentation import fingerprint
+
+logger = logging.getLogger('kidstore.slow_queries')
+
+DEFAULT_THRESHOLD_MS = 100
+DEFAULT_SCAN_TABLES = ('sales_order', 'sales_orderitem', 'inventory_product')
+EXPLAINABLE_RE = re.compile(r'^\s*(SELECT|WITH|UPDATE|DELETE)\b', re.IGNORECASE)
+# "SCAN sales_order" (SQLite 3.36+) or "SCAN TABLE sales_order" (older); an
+# index lookup reads "SEARCH ..." instead
+SCAN_RE = re.compile(r'\bSCAN (?:TABLE )?"?(\w+)"?')
+BASE_DIR = str(Path(settings.BASE_DIR))
+# Instrumentation frames wrap every query and never explain where it came from
+SKIPPED_PATHS = ('/site-packages/', __file__, 'core/middleware.py', 'core/profiling.py', 'core/instrumentation.py')
+TEMPLATE_RENDER_CODE = Template.render.__code__
+
+
+def redact(params):
+    """Replace parameter values by their type, keeping their position"""
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {key: f'<{type(value).__name__}>' for key, value in params.items()}
+    return [f'<{type(value).__name__}>' for value in params]
+
+
+def get_call_site():
+    """
+    Return where the query was issued: the innermost project frame as
+    'path:line in function', or the template being rendered when a lazy
+    queryset is evaluated by a template.
+    """
+    frame = sys._getframe(1)
+    while frame is not None:
+        code = frame.f_code
+        if code is TEMPLATE_RENDER_CODE:
+            origin = frame.f_locals['self'].origin
+            return f'template {origin.template_name or origin.name}'
+        filename = code.co_filename
+        if filename.startswith(BASE_DIR) and not any(part in filename for part in SKIPPED_PATHS):
+            return f'{filename[len(BASE_DIR) + 1:]}:{frame.f_lineno} in {code.co_name}'
+        frame = frame.f_back
+    return None
+
+
+def get_scanned_tables(plan, watched):
+    """Return the watched tables read in full according to the plan"""
+    tables = []
+    for line in plan:
+        match = SCAN_RE.search(line)
+        if match and match.group(1) in watched and match.group(1) not in tables:
+            tables.append(match.group(1))
+    return tables
+
+
+class SlowQueryStore:
+    """Per-process aggregate of slow queries keyed by fingerprint"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queries = {}
+
+    def get_plan(self, key):
+        with self._lock:
+            entry = self._queries.get(key)
+            return entry['plan'] if entry else None
+
+    def record(self, record):
+        key = record['fingerprint']
+        with self._lock:
+            entry = self._queries.get(key)
+            if entry is None:
+                entry = self._queries[key] = {
+                    'fingerprint': key,
+                    'count': 0,
+                    'total_ms': 0.0,
+                    'max_ms': 0.0,
+                    'plan': record['plan'],
+                    'full_scans': record['full_scans'],
+                    'call_sites': Counter(),
+                    'last_seen': None,
+                    'example_params': record['params'],
+                }
+            entry['count'] += 1
+            entry['total_ms'] += record['duration_ms']
+            entry['max_ms'] = max(entry['max_ms'], record['duration_ms'])
+            entry['call_sites'][record['call_site']] += 1
+            entry['last_seen'] = record['time']
+
+    def summary(self, order_by='total_ms', limit=100):
+        """Return aggregated slow queries, worst first"""
+        with self._lock:
+            rows = [{**entry, 'call_sites': entry['call_sites'].most_common(3)} for entry in self._queries.values()]
+        for row in rows:
+            row['avg_ms'] = row['total_ms'] / row['count']
+        rows.sort(key=lambda row: row[order_by], reverse=True)
+        return rows[:limit]
+
+    def reset(self):
+        with self._lock:
+            self._queries.clear()
+
+
+slow_queries = SlowQueryStore()
+
+
+class SlowQueryLogger:
+    """Execute wrapper logging statements slower than the threshold"""
+
+    def __init__(self):
+        self.threshold = getattr(settings, 'SLOW_QUERY_THRESHOLD_MS', DEFAULT_THRESHOLD_MS) / 1000
+        self.redact_params = getattr(settings, 'SLOW_QUERY_REDACT_PARAMS', True)
+        self.scan_tables = set(getattr(settings, 'SLOW_QUERY_SCAN_TABLES', DEFAULT_SCAN_TABLES))
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            if elapsed >= self.threshold:
+                self.log(sql, params, many, elapsed, context['connection'])
+
+    def explain(self, sql, params, connection):
+        prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+        cursor = connection.create_cursor()
+        try:
+            cursor.execute(prefix + sql, params)
+            # SQLite rows are (id, parent, notused, detail)
+            return [str(row[-1]) for row in cursor.fetchall()]
+        except Exception as e:
+            return [f'EXPLAIN failed: {e}']
+        finally:
+            cursor.close()
+
+    def log(self, sql, params, many, elapsed, connection):
+        key = fingerprint(sql)
+        plan = slow_queries.get_plan(key)
+        if plan is None:
+            plan = self.explain(sql, params, connection) if not many and EXPLAINABLE_RE.match(sql) else []
+
+        if many:
+            # executemany parameters may be a generator that is already consumed
+            params = None
+        elif self.redact_params:
+            params = redact(params)
+        else:
+            params = repr(params)[:500]
+        record = {
+            'time': timezone.now().isoformat(),
+            'fingerprint': key,
+            'duration_ms': round(elapsed * 1000, 2),
+            'params': params,
+            'many': many,
+            'call_site': get_call_site(),
+            'plan': plan,
+            'full_scans': get_scanned_tables(plan, self.scan_tables),
+        }
+        slow_queries.record(record)
+        if record['full_scans']:
+            logger.warning(json.dumps(record, default=str))
+        else:
+            logger.info(json.dumps(record, default=str))
+
+
+def install_slow_query_logger(sender, connection, **kwargs):
+    """connection_created receiver adding the logger to each new connection once"""
+    if not getattr(settings, 'SLOW_QUERY_LOG_ENABLED', True):
+        return
+    if not any(isinstance(wrapper, SlowQueryLogger) for wrapper in connection.execute_wrappers):
+        connection.execute_wrappers.insert(0, SlowQueryLogger())
@@ -0,0 +1,180 @@
+"""
+Helpers for the query budget tests.
+
+``seed_store`` builds a small but realistic shop: more customers, products,
+orders and staff than any list view shows on one page, with orders spread
+over the last weeks. ``QueryBudgetMixin`` asserts that a request stays within
+a fixed number of queries, so a per-row query on a list page fails the test
+no matter how many rows the page shows. ``TestRunner`` keeps the files the
+tests write out of the project directory.
+"""
+import logging
+import random
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.runner import DiscoverRunner
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+
+from accounts.models import Customer, ShopAssistant
+from accounts.phone import get_search_fields
+from inventory.models import Brand, Category, Color, Inventory, Product, Size, Supplier
+from sales.models import Order, OrderItem, SalespersonDailySales, Transaction
+
+PASSWORD = 'budget-test-password'
+
+
+def seed_store(customers=25, products=30, orders=60, assistants=15, salespersons=12, days=28, seed=1):
+    """
+    Create a shop dataset and return the main objects in a dict.
+
+    Every count defaults to more than the largest page size used by the list
+    views, so pages are full and per-row queries show up in the query count.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+
+    admin = User.objects.create_superuser('budget-admin', 'admin@example.com', PASSWORD)
+    admin.userprofile.is_salesperson = True
+    admin.userprofile.save()
+
+    staff = []
+    for i in range(salespersons):
+        user = User.objects.create_user(f'seller{i}', password=PASSWORD, first_name=f'Seller {i}')
+        user.userprofile.is_salesperson = True
+        user.userprofile.save()
+        staff.append(user)
+
+    root = Category.objects.create(name='Clothing')
+    middle = Category.objects.create(name='Baby', parent=root)
+    categories = [Category.objects.create(name=f'Range {i}', parent=middle) for i in range(3)]
+    brand = Brand.objects.create(name='Kidstore')
+    supplier = Supplier.objects.create(name='Wholesale', contact_person='Rahim', contact_info='01700000000')
+    colors = [Color.objects.create(name=name) for name in ('Red', 'Blue')]
+    sizes = [Size.objects.create(name=name) for name in ('0-3M', '3-6M')]
+
+    product_list = Product.objects.bulk_create([
+        Product(
+            name=f'Product {i}',
+            description='Seeded product',
+            price=Decimal(rng.randint(100, 2000)),
+            category=categories[i % len(categories)],
+            brand=brand,
+            supplier=supplier,
+            color=colors[i % len(colors)],
+            size=sizes[i % len(sizes)],
+            sku=f'SKU-{i:05d}',
+        )
+        for i in range(products)
+    ])
+    Inventory.objects.bulk_create([
+        # Every third product is low on stock
+        Inventory(product=product, quantity=2 if i % 3 == 0 else 500, low_stock_threshold=5)
+        for i, product in enumerate(product_list)
+    ])
+
+    customer_list = Customer.objects.bulk_create([
+        Customer(
+            name=f'Customer {i}', phone_number=phone, email=f'customer{i}@example.com', **get_search_fields(phone)
+        )
+        for i in range(customers)
+        for phone in [f'+8801{i:09d}']
+    ])
+    assistant_list = ShopAssistant.objects.bulk_create([
+        ShopAssistant(name=f'Assistant {i}', contact_number=f'+8801{i + 500:09d}', joining_date=now.date())
+        for i in range(assistants)
+    ])
+
+    order_list = Order.objects.bulk_create([
+        Order(
+            customer=rng.choice(customer_list + [None]),
+            salesperson=rng.choice(staff),
+            shop_assistant=rng.choice(assistant_list),
+            status='completed',
+        )
+        for _ in range(orders)
+    ])
+
+    items = []
+    for order in order_list:
+        # order_date is auto_now_add, so spread the orders out afterwards
+        order.order_date = now - timedelta(days=rng.randrange(days), minutes=rng.randrange(600))
+        for product in rng.sample(product_list, rng.randint(1, 4)):
+            items.append(OrderItem(order=order, product=product, quantity=rng.randint(1, 3), price=product.price))
+    OrderItem.objects.bulk_create(items)
+
+    for order in order_list:
+        order.subtotal = order.total = sum(
+            (item.price * item.quantity for item in items if item.order is order), Decimal('0.00')
+        )
+    Order.objects.bulk_update(order_list, ['order_date', 'subtotal', 'total'])
+    Transaction.objects.bulk_create([
+        Transaction(order=order, payment_method='cash', amount_paid=order.total)
+        for order in order_list
+    ])
+
+    Customer.objects.refresh_order_stats()
+    SalespersonDailySales.rebuild()
+
+    return {
+        'admin': admin,
+        'salespersons': staff,
+        'products': product_list,
+        'customers': customer_list,
+        'assistants': assistant_list,
+        'orders': order_list,
+    }
+
+
+class QueryBudgetMixin:
+    """TestCase mixin asserting the maximum number of queries of a request"""
+
+    def assertQueryBudget(self, budget, url, method='get', **kwargs):
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(self.client, method)(url, **kwargs)
+        self.assertLess(response.status_code, 400, f'{url} returned {response.status_code}')
+        self.assertLessEqual(
+            len(context.captured_queries), budget,
+            f'{url} ran {len(context.captured_queries)} queries, budget is {budget}:\n'
+            + '\n'.join(query['sql'] for query in context.captured_queries)
+        )
+        return response
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Test settings: metrics stay in memory unless a test sets METRICS_DIR, the
+    customer index version file and the log files are written to a temporary
+    directory, and the customer index is built in the request that searches it.
+    """
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.run_dir = tempfile.TemporaryDirectory()
+        self.test_settings = override_settings(
+            METRICS_DIR=None,
+            CUSTOMER_INDEX_VERSION_FILE=Path(self.run_dir.name) / 'customer_index.version',
+            CUSTOMER_INDEX_BACKGROUND=False,
+        )
+        self.test_settings.enable()
+        # The LOGGING handlers are already configured, so their files are moved instead
+        self.log_files = {}
+        for name in settings.LOGGING.get('loggers', {}):
+            for handler in logging.getLogger(name).handlers:
+                if isinstance(handler, logging.FileHandler):
+                    handler.close()
+                    self.log_files[handler] = handler.baseFilename
+                    handler.baseFilename = str(Path(self.run_dir.name) / Path(handler.baseFilename).name)
+
+    def teardown_test_environment(self, **kwargs):
+        for handler, filename in self.log_files.items():
+            handler.close()
+            handler.baseFilename = filename
+        self.test_settings.disable()
+        self.run_dir.cleanup()
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.db.models import Count, Q
+from django.http import HttpResponse, HttpResponseForbidden
+
+from inventory.models import Inventory, reorder_level
+
+from .metrics import render
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def get_stock_gauges():
+    """Low-stock and out-of-stock SKU counts of active products, read at scrape time"""
+    counts = Inventory.objects.filter(product__is_active=True).aggregate(
+        low=Count('id', filter=Q(quantity__gt=0, quantity__lte=reorder_level())),
+        out=Count('id', filter=Q(quantity__lte=0)),
+    )
+    return [
+        ('kidstore_low_stock_skus', 'Active products at or below their reorder level', counts['low']),
+        ('kidstore_out_of_stock_skus', 'Active products with no stock', counts['out']),
+    ]
+
+
+def metrics(request):
+    """
+    Prometheus scrape endpoint.
+
+    Open to staff users and to the addresses in METRICS_ALLOWED_IPS, so a
+    scraper on the same host needs no login.
+    """
+    allowed_ips = getattr(settings, 'METRICS_ALLOWED_IPS', ['127.0.0.1'])
+    if request.META.get('REMOTE_ADDR') not in allowed_ips and not request.user.is_staff:
+        return HttpResponseForbidden('Forbidden', content_type='text/plain')
+    return HttpResponse(render(get_stock_gauges()), content_type=CONTENT_TYPE)
@@ -1,3 +1,105 @@
-from django.test import TestCase
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from core import instrumentation
+from core.instrumentation import request_stats
+from core.slow_queries import SlowQueryLogger, slow_queries
+from core.testing import QueryBudgetMixin, seed_store
+from sales.models import Order
+
+
+class DashboardQueryBudgetTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_store()
+
+    def setUp(self):
+        self.client.force_login(self.data['admin'])
+
+    def test_dashboard(self):
+        self.assertQueryBudget(17, '/')
+
+    def test_sales_report(self):
+        self.assertQueryBudget(8, '/reports/sales/')
+        self.assertQueryBudget(8, '/reports/sales/?report_type=monthly')
+
+    def test_inventory_report(self):
+        self.assertQueryBudget(7, '/reports/inventory/')
+
+    def test_performance_summary(self):
+        self.assertQueryBudget(2, '/performance/')
+
+    def test_exports(self):
+        self.assertQueryBudget(1, '/reports/sales/export/')
+        self.assertQueryBudget(1, '/reports/inventory/export/')
+
+    def test_duplicates_fingerprinted_only_when_read(self):
+        request_stats.reset()
+        with mock.patch.object(instrumentation, 'fingerprint', wraps=instrumentation.fingerprint) as fingerprint:
+            # Within budget and with INFO off, nothing is fingerprinted per request
+            self.client.get('/reports/sales/')
+            fingerprint.assert_not_called()
+            row, = [row for row in request_stats.summary() if row['view'] == 'dashboard:sales-report']
+            fingerprint.assert_called()
+        self.assertIsInstance(row['worst']['duplicates'], list)
+
+
+class ProfilingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_store(customers=5, products=5, orders=5, assistants=2, salespersons=2)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(override_settings(PROFILE_ARTIFACT_DIR=directory.name))
+
+    def test_staff_request_is_profiled(self):
+        self.client.force_login(self.data['admin'])
+        response = self.client.get('/reports/sales/?_profile=cprofile')
+        self.assertEqual(response.status_code, 200)
+
+        detail = self.client.get(response['X-Profile-Url'])
+        profile = detail.context['profile']
+        self.assertEqual(profile['view'], 'dashboard:sales-report')
+        self.assertEqual(profile['query_count'], len(profile['queries']))
+        self.assertGreater(profile['template_ms'], 0)
+        self.assertTrue(profile['functions'])
+        self.assertContains(self.client.get('/performance/profiles/'), profile['id'])
+
+    def test_other_users_are_not_profiled(self):
+        self.client.force_login(self.data['salespersons'][0])
+        response = self.client.get('/reports/sales/?_profile=1')
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(self.client.get('/performance/profiles/').status_code, 403)
+
+
+class SlowQueryLogTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_store(customers=5, products=5, orders=5, assistants=2, salespersons=2)
+
+    def setUp(self):
+        slow_queries.reset()
+        self.addCleanup(slow_queries.reset)
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0)
+    def test_full_scan_is_flagged(self):
+        with self.assertLogs('kidstore.slow_queries', 'INFO') as logs:
+            with connection.execute_wrapper(SlowQueryLogger()):
+                list(Order.objects.filter(total__gt=5))
+                Order.objects.get(pk=self.data['orders'][0].pk)
+
+        scan, lookup = sorted(slow_queries.summary(), key=lambda row: row['full_scans'], reverse=True)
+        self.assertEqual(scan['full_scans'], ['sales_order'])
+        self.assertEqual(scan['example_params'], ['<Decimal>'])
+        self.assertTrue(scan['call_sites'][0][0].startswith('dashboard/tests.py:'))
+        self.assertEqual(lookup['full_scans'], [])
+        self.assertTrue(any(line.startswith('SEARCH') for line in lookup['plan']))
+        self.assertEqual([record.levelname for record in logs.records], ['WARNING', 'INFO'])
+
+        self.client.force_login(self.data['admin'])
+        self.assertContains(self.client.get('/performance/slow-queries/?scans=1'), 'Full scan: sales_order')
@@ -7,6 +7,10 @@ urlpatterns = [
     path('', views.DashboardView.as_view(), name='dashboard'),
     path('reports/sales/', views.SalesReportView.as_view(), name='sales-report'),
     path('reports/inventory/', views.InventoryReportView.as_view(), name='inventory-report'),
+    path('performance/', views.PerformanceSummaryView.as_view(), name='performance'),
+    path('performance/slow-queries/', views.SlowQueryView.as_view(), name='slow-queries'),
+    path('performance/profiles/', views.ProfileListView.as_view(), name='profile-list'),
+    path('performance/profiles/<str:profile_id>/', views.ProfileDetailView.as_view(), name='profile-detail'),
     path('reports/sales/export/', views.export_sales_report, name='sales-report-export'),
     path('reports/inventory/export/', views.export_inventory_report, name='inventory-report-export'),
 ]
@@ -1,14 +1,20 @@
 from datetime import datetime, timedelta
 from decimal import Decimal
-from django.contrib.auth.mixins import LoginRequiredMixin
+from django.conf import settings
+from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.db import models
 from django.db.models import Sum, Count, Avg, F, Q, Max
 from django.db.models.functions import TruncDate, TruncHour, Coalesce
-from django.http import HttpResponse
+from django.http import Http404, HttpResponse
 from django.utils import timezone
 from django.views.generic import TemplateView
-from accounts.models import Customer
-from inventory.models import Product, Inventory
+from accounts.models import Customer, CustomerRFM
+from accounts.rfm import get_segment_counts
+from core.instrumentation import request_stats
+from core.profiling import profile_store
+from core.slow_queries import slow_queries
+from inventory.classification import filter_by_class
+from inventory.models import Product, Inventory, ProductClassification, reorder_level
 from sales.models import Order, OrderItem
 import csv
 import json
@@ -56,12 +62,9 @@ class DashboardView(LoginRequiredMixin, TemplateView):
             'low_stock_products': inventory_insights['low_stock_products'],
             'top_products': self.get_top_selling_products(thirty_days_ago),
             'recent_customers': Customer.objects.filter(
-                order__status='completed'
-            ).annotate(
-                total_orders=Count('order'),
-                total_spending=Sum('order__total'),
-                last_order_date=Max('order__order_date')
-            ).order_by('-last_order_date')[:5],
+                last_order_at__isnull=False
+            ).order_by('-last_order_at')[:5],
+            'customer_metrics': customer_metrics,
             'charts_data': charts_data
         })
         
@@ -105,9 +108,9 @@ class DashboardView(LoginRequiredMixin, TemplateView):
         }
 
     def get_inventory_insights(self):
-        # Get low stock products (where quantity is below threshold)
+        # Get low stock products (where quantity is at or below the reorder level)
         low_stock_products = Product.objects.filter(
-            inventory__quantity__lte=F('inventory__low_stock_threshold')
+            inventory__quantity__lte=reorder_level('inventory__')
         ).select_related('inventory')[:5]
 
         # Get top selling products
@@ -135,25 +138,15 @@ class DashboardView(LoginRequiredMixin, TemplateView):
             created_at__gte=start_of_month
         ).count()
 
-        # Top customers by revenue
-        top_customers = Order.objects.filter(
-            status='completed'
-        ).values(
-            'customer__name'
-        ).annotate(
-            total_spent=Sum('total'),
-            order_count=Count('id')
-        ).order_by('-total_spent')[:5]
+        # Top customers by revenue, read from the precomputed RFM table
+        top_customers = CustomerRFM.objects.select_related(
+            'customer'
+        ).order_by('-monetary')[:5]
 
         # Calculate retention rate
         total_customers = Customer.objects.count()
         if total_customers > 0:
-            repeat_customers = Order.objects.filter(
-                status='completed'
-            ).values('customer').annotate(
-                order_count=Count('id')
-            ).filter(order_count__gt=1).count()
-            
+            repeat_customers = Customer.objects.filter(order_count__gt=1).count()
             retention_rate = (repeat_customers / total_customers) * 100
         else:
             retention_rate = 0
@@ -161,7 +154,8 @@ class DashboardView(LoginRequiredMixin, TemplateView):
         return {
             'new_customers': new_customers,
             'top_customers': top_customers,
-            'retention_rate': retention_rate
+            'retention_rate': retention_rate,
+            'segments': get_segment_counts()
         }
 
     def get_top_selling_products(self, thirty_days_ago):
@@ -288,7 +282,7 @@ class SalesReportView(LoginRequiredMixin, TemplateView):
             },
             'category_sales': category_data,
             'top_products': top_products,
-            'orders': orders[:50],  # Limit to last 50 orders
+            'orders': orders.annotate(item_count=Count('orderitem'))[:50],  # Limit to last 50 orders
             'report_type': report_type,
             'start_date': start_date.strftime('%Y-%m-%d'),
             'end_date': end_date.strftime('%Y-%m-%d')
@@ -406,12 +400,13 @@ class InventoryReportView(LoginRequiredMixin, TemplateView):
         
         # Get all products with their inventory
         products = Product.objects.select_related(
-            'inventory', 'category', 'brand', 'supplier'
+            'inventory', 'category', 'brand', 'supplier', 'classification'
         ).all()
+        products = filter_by_class(products, self.request.GET)
 
         # Get low stock products
         low_stock = products.filter(
-            inventory__quantity__lte=F('inventory__low_stock_threshold')
+            inventory__quantity__lte=reorder_level('inventory__')
         )
 
         # Get out of stock products
@@ -430,8 +425,97 @@ class InventoryReportView(LoginRequiredMixin, TemplateView):
             'low_stock': low_stock,
             'out_of_stock': out_of_stock,
             'category_totals': category_totals,
+            'abc_choices': ProductClassification.ABC_CHOICES,
+            'xyz_choices': ProductClassification.XYZ_CHOICES,
+        })
+
+        return context
+
+
+class PerformanceSummaryView(LoginRequiredMixin, UserPassesTestMixin, TemplateView):
+    """Staff-only summary of the slowest and most query-heavy views in this process"""
+    template_name = 'dashboard/performance.html'
+    order_choices = {
+        'max_queries': 'Most queries',
+        'avg_queries': 'Average queries',
+        'over_budget': 'Over budget',
+        'max_wall_ms': 'Slowest request',
+        'avg_wall_ms': 'Average time',
+    }
+
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        order_by = self.request.GET.get('order', 'max_queries')
+        if order_by not in self.order_choices:
+            order_by = 'max_queries'
+        context.update({
+            'views': request_stats.summary(order_by=order_by),
+            'order_by': order_by,
+            'order_choices': self.order_choices,
+        })
+        return context
+
+
+class SlowQueryView(LoginRequiredMixin, UserPassesTestMixin, TemplateView):
+    """Staff-only list of slow queries in this process, aggregated by fingerprint"""
+    template_name = 'dashboard/slow_queries.html'
+    order_choices = {
+        'total_ms': 'Total time',
+        'max_ms': 'Slowest',
+        'avg_ms': 'Average time',
+        'count': 'Most frequent',
+    }
+
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        order_by = self.request.GET.get('order', 'total_ms')
+        if order_by not in self.order_choices:
+            order_by = 'total_ms'
+        queries = slow_queries.summary(order_by=order_by)
+        if self.request.GET.get('scans'):
+            queries = [query for query in queries if query['full_scans']]
+        context.update({
+            'queries': queries,
+            'order_by': order_by,
+            'order_choices': self.order_choices,
+            'scans_only': bool(self.request.GET.get('scans')),
+            'threshold_ms': getattr(settings, 'SLOW_QUERY_THRESHOLD_MS', 100),
         })
+        return context
+
+
+class ProfileListView(LoginRequiredMixin, UserPassesTestMixin, TemplateView):
+    """Staff-only list of stored request profiles"""
+    template_name = 'dashboard/profile_list.html'
+
+    def test_func(self):
+        return self.request.user.is_staff
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['profiles'] = profile_store.list()
+        return context
+
+
+class ProfileDetailView(LoginRequiredMixin, UserPassesTestMixin, TemplateView):
+    """Staff-only view of one request profile: top functions, SQL and template time"""
+    template_name = 'dashboard/profile_detail.html'
+
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        profile = profile_store.get(self.kwargs['profile_id'])
+        if profile is None:
+            raise Http404('Profile not found')
+        context['profile'] = profile
         return context
 
 
@@ -469,12 +553,12 @@ def export_sales_report(request):
         'Payment Method', 'Status'
     ])
 
-    for order in orders:
+    for order in orders.annotate(item_count=Count('orderitem')).iterator(chunk_size=1000):
         writer.writerow([
             order.id,
             order.order_date.strftime('%Y-%m-%d %H:%M'),
             order.customer.name if order.customer else 'Walk-in Customer',
-            order.orderitem_set.count(),
+            order.item_count,
             order.total,
             order.transaction.payment_method if hasattr(order, 'transaction') else 'N/A',
             order.status
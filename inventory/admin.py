@@ -1,5 +1,8 @@
-from django.contrib import admin
-from .models import Category, Brand, Supplier, Product, Inventory
+from django.contrib import admin, messages
+from .models import (
+    Category, Brand, Supplier, Product, Inventory, ProductClassification, GoodsReceivedNote, GoodsReceivedLine,
+    StockCount
+)
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -13,7 +16,7 @@ class BrandAdmin(admin.ModelAdmin):
 
 @admin.register(Supplier)
 class SupplierAdmin(admin.ModelAdmin):
-    list_display = ('name', 'contact_person', 'contact_info')
+    list_display = ('name', 'contact_person', 'contact_info', 'lead_time_days')
     search_fields = ('name', 'contact_person')
 
 @admin.register(Product)
@@ -25,9 +28,68 @@ class ProductAdmin(admin.ModelAdmin):
 
 @admin.register(Inventory)
 class InventoryAdmin(admin.ModelAdmin):
-    list_display = ('product', 'quantity', 'low_stock_threshold')
+    list_display = ('product', 'quantity', 'low_stock_threshold', 'reorder_point', 'suggested_order_quantity')
+    readonly_fields = ('forecast_daily_demand', 'reorder_point', 'suggested_order_quantity', 'forecast_updated_at')
     list_filter = ('product__category', 'product__brand')
     search_fields = ('product__name', 'product__sku')
 
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('product')
+
+@admin.register(ProductClassification)
+class ProductClassificationAdmin(admin.ModelAdmin):
+    list_display = ('product', 'abc_class', 'xyz_class', 'revenue', 'revenue_share', 'units_sold', 'demand_cv', 'computed_at')
+    list_filter = ('abc_class', 'xyz_class')
+    search_fields = ('product__name', 'product__sku')
+    list_select_related = ('product',)
+
+class GoodsReceivedLineInline(admin.TabularInline):
+    model = GoodsReceivedLine
+    autocomplete_fields = ('product',)
+    extra = 0
+
+@admin.register(GoodsReceivedNote)
+class GoodsReceivedNoteAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'reference', 'status', 'created_at', 'received_at', 'received_by')
+    list_filter = ('status', 'supplier')
+    search_fields = ('reference', 'supplier__name')
+    list_select_related = ('supplier', 'received_by')
+    readonly_fields = ('status', 'created_by', 'created_at', 'received_by', 'received_at')
+    inlines = [GoodsReceivedLineInline]
+    actions = ['receive_selected']
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            obj.created_by = request.user
+        super().save_model(request, obj, form, change)
+
+    @admin.action(description='Add selected notes to stock')
+    def receive_selected(self, request, queryset):
+        received = 0
+        for note in queryset.filter(status='draft'):
+            note.receive(request.user)
+            received += 1
+        if received:
+            self.message_user(request, f'Received {received} notes.')
+        else:
+            self.message_user(request, 'No draft notes selected.', messages.WARNING)
+
+@admin.register(StockCount)
+class StockCountAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'category', 'status', 'started_by', 'started_at', 'applied_at')
+    list_filter = ('status',)
+    search_fields = ('name',)
+    list_select_related = ('category', 'started_by')
+    readonly_fields = ('status', 'started_by', 'started_at', 'applied_by', 'applied_at')
+    actions = ['apply_selected']
+
+    def has_add_permission(self, request):
+        # A count needs its stock snapshot; start counts from the inventory pages
+        return False
+
+    @admin.action(description='Apply selected counts to stock')
+    def apply_selected(self, request, queryset):
+        corrections = 0
+        for count in queryset.filter(status='open'):
+            corrections += count.apply(request.user)
+        self.message_user(request, f'Wrote {corrections} stock corrections.')
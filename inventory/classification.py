@@ -0,0 +1,166 @@
+"""
+ABC/XYZ classification of the product catalogue.
+
+ABC ranks active products by their share of revenue over a trailing window:
+the products making up the first 80% of revenue are A, the next 15% B and the
+rest C. XYZ classifies demand variability by the coefficient of variation of
+units sold per period (a week by default): X is steady, Y variable and Z
+irregular or without demand.
+
+All products are classified from a single grouped query over OrderItem and
+the results are upserted into ProductClassification, so reports only need a
+join to filter and sort by class.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from math import sqrt
+
+from django.db import transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from sales.models import OrderItem
+from .models import Product, ProductClassification
+
+DEFAULT_WINDOW_DAYS = 90
+DEFAULT_PERIOD_DAYS = 7
+BATCH_SIZE = 1000
+
+# Cumulative revenue share (percent) closing the A and B classes
+ABC_THRESHOLDS = (80, 95)
+# Coefficient of variation closing the X and Y classes
+XYZ_THRESHOLDS = (0.5, 1.0)
+
+
+def get_abc_class(cumulative_share_before, revenue):
+    if revenue <= 0:
+        return 'C'
+    if cumulative_share_before < ABC_THRESHOLDS[0]:
+        return 'A'
+    if cumulative_share_before < ABC_THRESHOLDS[1]:
+        return 'B'
+    return 'C'
+
+
+def get_xyz_class(demand_cv):
+    if demand_cv is None:
+        return 'Z'
+    if demand_cv <= XYZ_THRESHOLDS[0]:
+        return 'X'
+    if demand_cv <= XYZ_THRESHOLDS[1]:
+        return 'Y'
+    return 'Z'
+
+
+def get_demand_cv(period_units, periods):
+    """Coefficient of variation of demand, counting periods without sales as zero"""
+    total = sum(period_units)
+    if total <= 0:
+        return None
+    mean = total / periods
+    variance = max(0.0, sum(units * units for units in period_units) / periods - mean * mean)
+    return sqrt(variance) / mean
+
+
+def classify_products(window_days=DEFAULT_WINDOW_DAYS, period_days=DEFAULT_PERIOD_DAYS):
+    """
+    Classify every active product and store the result.
+
+    Returns a dict with the number of products per ABC and XYZ class.
+    """
+    now = timezone.now()
+    today = timezone.localdate(now)
+    periods = max(1, window_days // period_days)
+    window_start = now - timedelta(days=periods * period_days)
+
+    daily_sales = OrderItem.objects.filter(
+        order__status='completed',
+        order__order_date__gte=window_start,
+    ).annotate(
+        day=TruncDate('order__order_date')
+    ).values('product_id', 'day').annotate(
+        units=Sum('quantity'),
+        revenue=Sum(F('quantity') * F('price')),
+    ).order_by()
+
+    period_units = defaultdict(lambda: [0] * periods)
+    revenue = defaultdict(Decimal)
+    for row in daily_sales.iterator(chunk_size=BATCH_SIZE):
+        period = min(periods - 1, (today - row['day']).days // period_days)
+        period_units[row['product_id']][period] += row['units']
+        revenue[row['product_id']] += row['revenue']
+
+    product_ids = list(Product.objects.filter(is_active=True).values_list('id', flat=True))
+    product_ids.sort(key=lambda product_id: revenue.get(product_id, 0), reverse=True)
+    total_revenue = sum(revenue.get(product_id, 0) for product_id in product_ids)
+
+    rows = []
+    cumulative = Decimal('0')
+    counts = defaultdict(int)
+    for product_id in product_ids:
+        product_revenue = revenue.get(product_id, Decimal('0'))
+        share = float(product_revenue * 100 / total_revenue) if total_revenue else 0.0
+        cumulative_share_before = float(cumulative * 100 / total_revenue) if total_revenue else 0.0
+        cumulative += product_revenue
+
+        units = period_units.get(product_id, [0] * periods)
+        demand_cv = get_demand_cv(units, periods)
+        row = ProductClassification(
+            product_id=product_id,
+            abc_class=get_abc_class(cumulative_share_before, product_revenue),
+            xyz_class=get_xyz_class(demand_cv),
+            revenue=product_revenue,
+            revenue_share=share,
+            units_sold=sum(units),
+            demand_cv=demand_cv,
+            computed_at=now,
+        )
+        counts[row.abc_class] += 1
+        counts[row.xyz_class] += 1
+        rows.append(row)
+
+    with transaction.atomic():
+        ProductClassification.objects.bulk_create(
+            rows,
+            batch_size=BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['product'],
+            update_fields=[
+                'abc_class', 'xyz_class', 'revenue', 'revenue_share',
+                'units_sold', 'demand_cv', 'computed_at',
+            ],
+        )
+        # Products deactivated since the last run drop out of the classification
+        ProductClassification.objects.exclude(computed_at=now).delete()
+
+    return dict(counts)
+
+
+CLASS_ORDERINGS = {
+    'class': ('{lookup}__abc_class', '{lookup}__xyz_class', '-{lookup}__revenue'),
+    'revenue': ('-{lookup}__revenue',),
+    'variability': ('{lookup}__demand_cv',),
+}
+
+
+def filter_by_class(queryset, params, lookup='classification'):
+    """
+    Apply the abc, xyz and sort request parameters to a queryset.
+
+    ``lookup`` is the path to ProductClassification from the queryset's model,
+    e.g. 'classification' for products or 'product__classification' for
+    inventory rows.
+    """
+    abc_class = params.get('abc', '').upper()
+    xyz_class = params.get('xyz', '').upper()
+    sort = params.get('sort', '')
+
+    if abc_class in dict(ProductClassification.ABC_CHOICES):
+        queryset = queryset.filter(**{f'{lookup}__abc_class': abc_class})
+    if xyz_class in dict(ProductClassification.XYZ_CHOICES):
+        queryset = queryset.filter(**{f'{lookup}__xyz_class': xyz_class})
+    if sort in CLASS_ORDERINGS:
+        queryset = queryset.order_by(*(field.format(lookup=lookup) for field in CLASS_ORDERINGS[sort]))
+    return queryset
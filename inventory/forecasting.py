@@ -0,0 +1,128 @@
+"""
+Demand forecasting and reorder points for the whole catalogue.
+
+Daily demand per SKU is forecast with simple exponential smoothing over the
+trailing sales window. Sales are sparse, so instead of stepping through every
+day of every SKU the smoothed level is evaluated in closed form from the days
+that actually had sales:
+
+    level = (1 - alpha) ** days * mean + sum(alpha * (1 - alpha) ** age * units)
+
+where ``age`` is the number of days since the sale and ``mean`` seeds the
+series with the window average. The same is done for squared demand to get a
+smoothed variance. From these the engine derives:
+
+    reorder point   = demand * lead time + z * sigma * sqrt(lead time)
+    order quantity  = reorder point + demand * review period - stock on hand
+
+The reorder point is stored next to the manual ``Inventory.low_stock_threshold``
+and the low-stock checks use it while it is set (see ``reorder_level``), so
+SKUs without sales history fall back to their threshold.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from math import ceil, sqrt
+from statistics import NormalDist
+
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from sales.models import OrderItem
+from .models import Inventory
+
+DEFAULT_WINDOW_DAYS = 90
+DEFAULT_ALPHA = 0.2
+DEFAULT_SERVICE_LEVEL = 0.95
+DEFAULT_REVIEW_DAYS = 14
+BATCH_SIZE = 1000
+
+
+def forecast_demand(window_days=DEFAULT_WINDOW_DAYS, alpha=DEFAULT_ALPHA,
+                    service_level=DEFAULT_SERVICE_LEVEL, review_days=DEFAULT_REVIEW_DAYS):
+    """
+    Forecast demand for every active product and write reorder points back.
+
+    Returns a dict with the number of inventory rows updated, how many of
+    them had sales history and how many need reordering.
+    """
+    now = timezone.now()
+    today = timezone.localdate(now)
+    window_start = now - timedelta(days=window_days)
+    z = NormalDist().inv_cdf(service_level)
+
+    # Weight of a sale ``age`` days ago, and of the seed level after the window
+    weights = [alpha * (1 - alpha) ** age for age in range(window_days + 1)]
+    seed_weight = (1 - alpha) ** window_days
+
+    daily_sales = OrderItem.objects.filter(
+        order__status='completed',
+        order__order_date__gte=window_start,
+    ).annotate(
+        day=TruncDate('order__order_date')
+    ).values('product_id', 'day').annotate(
+        units=Sum('quantity')
+    ).order_by()
+
+    total_units = defaultdict(int)
+    total_squares = defaultdict(int)
+    smoothed = defaultdict(float)
+    smoothed_squares = defaultdict(float)
+    for row in daily_sales.iterator(chunk_size=BATCH_SIZE):
+        product_id, units = row['product_id'], row['units']
+        weight = weights[min(window_days, max(0, (today - row['day']).days))]
+        total_units[product_id] += units
+        total_squares[product_id] += units * units
+        smoothed[product_id] += weight * units
+        smoothed_squares[product_id] += weight * units * units
+
+    inventories = Inventory.objects.filter(
+        product__is_active=True
+    ).select_related('product__supplier').only(
+        'id', 'quantity', 'product__supplier__lead_time_days'
+    )
+
+    rows = []
+    with_history = 0
+    to_reorder = 0
+    for inventory in inventories.iterator(chunk_size=BATCH_SIZE):
+        product_id = inventory.product_id
+        inventory.forecast_updated_at = now
+
+        if product_id not in total_units:
+            # No sales in the window: nothing to forecast, keep the manual threshold
+            inventory.forecast_daily_demand = 0
+            inventory.reorder_point = None
+            inventory.suggested_order_quantity = 0
+            rows.append(inventory)
+            continue
+
+        mean = total_units[product_id] / window_days
+        mean_square = total_squares[product_id] / window_days
+        demand = seed_weight * mean + smoothed[product_id]
+        variance = max(0.0, seed_weight * mean_square + smoothed_squares[product_id] - demand * demand)
+
+        lead_time = inventory.product.supplier.lead_time_days
+        reorder_point = ceil(demand * lead_time + z * sqrt(variance) * sqrt(lead_time))
+        target_stock = reorder_point + ceil(demand * review_days)
+
+        inventory.forecast_daily_demand = round(demand, 4)
+        inventory.reorder_point = reorder_point
+        inventory.suggested_order_quantity = max(0, target_stock - inventory.quantity) if inventory.quantity <= reorder_point else 0
+        rows.append(inventory)
+
+        with_history += 1
+        if inventory.suggested_order_quantity:
+            to_reorder += 1
+
+    with transaction.atomic():
+        Inventory.objects.bulk_update(
+            rows,
+            [
+                'forecast_daily_demand', 'reorder_point', 'suggested_order_quantity', 'forecast_updated_at',
+            ],
+            batch_size=BATCH_SIZE,
+        )
+
+    return {'updated': len(rows), 'with_history': with_history, 'to_reorder': to_reorder}
@@ -1,5 +1,8 @@
+from decimal import Decimal, InvalidOperation
+
 from django import forms
-from .models import Product, Inventory
+from django.db import transaction
+from .models import GoodsReceivedLine, GoodsReceivedNote, Product, Inventory, StockCount
 
 class ProductForm(forms.ModelForm):
     class Meta:
@@ -41,3 +44,136 @@ class StockAdjustmentForm(forms.Form):
         widget=forms.Textarea(attrs={'rows': 3}),
         help_text='Please provide a reason for this stock adjustment.'
     )
+
+
+class ProductImportForm(forms.Form):
+    file = forms.FileField(
+        label='Product file',
+        help_text='CSV, JSON or JSON Lines with sku, name, category, brand, supplier, color, size, price and stock columns'
+    )
+
+
+class GoodsReceivedNoteForm(forms.ModelForm):
+    """A delivery with one "SKU, quantity, unit cost" line per product"""
+    lines = forms.CharField(
+        widget=forms.Textarea(attrs={'rows': 12, 'placeholder': 'SKU-001, 24, 180.00'}),
+        help_text='One product per line: SKU, quantity and unit cost separated by commas. The cost is optional.'
+    )
+    receive = forms.BooleanField(
+        label='Add to stock now',
+        required=False,
+        initial=True,
+        help_text='Leave unticked to save a draft and receive it later.'
+    )
+
+    class Meta:
+        model = GoodsReceivedNote
+        fields = ['supplier', 'reference', 'notes']
+        widgets = {
+            'notes': forms.Textarea(attrs={'rows': 2}),
+        }
+
+    def clean_lines(self):
+        """(sku, quantity, unit cost) tuples, then product ids resolved with one query"""
+        parsed, errors, seen = [], [], set()
+        for number, text in enumerate(self.cleaned_data['lines'].splitlines(), start=1):
+            if not text.strip():
+                continue
+            parts = [part.strip() for part in text.split(',')]
+            if len(parts) not in (2, 3) or not parts[0]:
+                errors.append(f'Line {number}: expected "SKU, quantity, unit cost".')
+                continue
+            sku, quantity, cost = parts[0], parts[1], parts[2] if len(parts) == 3 and parts[2] else '0'
+            try:
+                quantity = int(quantity)
+                cost = Decimal(cost).quantize(Decimal('0.01'))
+            except (ValueError, InvalidOperation):
+                errors.append(f'Line {number}: quantity and unit cost must be numbers.')
+                continue
+            if quantity < 1 or cost < 0:
+                errors.append(f'Line {number}: quantity must be at least 1 and unit cost cannot be negative.')
+                continue
+            if sku in seen:
+                errors.append(f'Line {number}: SKU {sku} is listed twice.')
+                continue
+            seen.add(sku)
+            parsed.append((sku, quantity, cost))
+
+        products = dict(Product.objects.filter(sku__in=seen).values_list('sku', 'id'))
+        unknown = [sku for sku, _, _ in parsed if sku not in products]
+        if unknown:
+            errors.append(f'Unknown SKU: {", ".join(unknown)}.')
+        if errors:
+            raise forms.ValidationError(errors)
+        if not parsed:
+            raise forms.ValidationError('Enter at least one line.')
+        return [(products[sku], quantity, cost) for sku, quantity, cost in parsed]
+
+    def save(self, commit=True):
+        note = super().save(commit=False)
+        if commit:
+            with transaction.atomic():
+                note.save()
+                GoodsReceivedLine.objects.bulk_create([
+                    GoodsReceivedLine(note=note, product_id=product_id, quantity=quantity, unit_cost=cost)
+                    for product_id, quantity, cost in self.cleaned_data['lines']
+                ])
+        return note
+
+
+class StockCountForm(forms.ModelForm):
+    class Meta:
+        model = StockCount
+        fields = ['name', 'category', 'notes']
+        widgets = {
+            'notes': forms.Textarea(attrs={'rows': 2}),
+        }
+
+
+class StockCountEntryForm(forms.Form):
+    """Scanned or typed counts: "SKU" for one unit or "SKU, quantity" per line"""
+    entries = forms.CharField(
+        label='Counted items',
+        widget=forms.Textarea(attrs={'rows': 12, 'placeholder': 'SKU-001, 12', 'autofocus': True}),
+        help_text='One SKU per line, optionally followed by a comma and the quantity. '
+                  'A SKU on its own counts one unit, so a barcode scanner can be used directly.'
+    )
+    replace = forms.BooleanField(
+        label='Replace earlier counts',
+        required=False,
+        help_text='By default these quantities are added to what was already counted for the same products.'
+    )
+
+    def __init__(self, *args, count, **kwargs):
+        self.count = count
+        super().__init__(*args, **kwargs)
+
+    def clean_entries(self):
+        """{line id: quantity}, with repeated SKUs added up"""
+        quantities, errors = {}, []
+        for number, text in enumerate(self.cleaned_data['entries'].splitlines(), start=1):
+            if not text.strip():
+                continue
+            parts = [part.strip() for part in text.split(',')]
+            if len(parts) > 2 or not parts[0]:
+                errors.append(f'Line {number}: expected "SKU" or "SKU, quantity".')
+                continue
+            try:
+                quantity = int(parts[1]) if len(parts) == 2 else 1
+            except ValueError:
+                errors.append(f'Line {number}: quantity must be a whole number.')
+                continue
+            if quantity < 0:
+                errors.append(f'Line {number}: quantity cannot be negative.')
+                continue
+            quantities[parts[0]] = quantities.get(parts[0], 0) + quantity
+
+        lines = dict(self.count.lines.filter(product__sku__in=quantities).values_list('product__sku', 'pk'))
+        unknown = [sku for sku in quantities if sku not in lines]
+        if unknown:
+            errors.append(f'Not part of this count: {", ".join(unknown)}.')
+        if errors:
+            raise forms.ValidationError(errors)
+        if not quantities:
+            raise forms.ValidationError('Enter at least one SKU.')
+        return {lines[sku]: quantity for sku, quantity in quantities.items()}
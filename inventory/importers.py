@@ -0,0 +1,247 @@
+"""
+Bulk product and stock import.
+
+Rows are handled in chunks. For every chunk, brands, colors, sizes,
+suppliers and categories are loaded with one ``name__in`` query per model
+into dictionaries that live for the whole import. Missing brands, colors,
+sizes and categories are created in bulk; suppliers have contact details
+and must already exist. A category is given as a path such as
+``Clothing > Boys > Shirts`` and is resolved one level at a time.
+
+Products are upserted on ``sku`` with ``bulk_create(update_conflicts=True)``.
+Description, color, size and is_active are optional columns: an existing
+product only has them overwritten by rows that have the column, so rows
+are upserted in groups by the optional columns they supply. Stock is
+upserted the same way on the inventory's product. Each quantity
+change is recorded as a StockAdjustment, as for a manual stock update.
+"""
+import re
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Q
+
+from core.importing import BATCH_SIZE, ImportReport, chunked, get_text
+
+from .models import Brand, Category, Color, Inventory, Product, Size, StockAdjustment, Supplier
+
+# 'A > B', 'A >> B' (as shown by Category.get_hierarchy) or 'A / B'
+CATEGORY_SEPARATOR = re.compile(r'\s*(?:>>?|/)\s*')
+DEFAULT_LOW_STOCK_THRESHOLD = 5
+PRODUCT_UPDATE_FIELDS = ['name', 'price', 'category', 'brand', 'supplier', 'updated_at']
+# Only updated from rows that have the column
+OPTIONAL_PRODUCT_FIELDS = ('description', 'color', 'size', 'is_active')
+BOOLEAN_VALUES = {'1': True, 'true': True, 'yes': True, 'y': True, '0': False, 'false': False, 'no': False, 'n': False}
+
+
+def parse_number(value, label, convert):
+    try:
+        number = convert(value)
+    except (InvalidOperation, ValueError):
+        raise ValidationError(f'{label} "{value}" is not a number')
+    if number < 0:
+        raise ValidationError(f'{label} cannot be negative')
+    return number
+
+
+def get_optional_text(row, *names):
+    """Like ``get_text``, but None when the row has none of the columns"""
+    if not any(name in row for name in names):
+        return None
+    return get_text(row, *names)
+
+
+def parse_boolean(value, label):
+    if isinstance(value, bool):
+        return value
+    try:
+        return BOOLEAN_VALUES[str(value).strip().lower()]
+    except KeyError:
+        raise ValidationError(f'{label} "{value}" is not yes or no')
+
+
+def parse_row(row):
+    """Cleaned values of a row, or raise ValidationError"""
+    if not isinstance(row, dict):
+        raise ValidationError('not a record')
+    values = {
+        'sku': get_text(row, 'sku'),
+        'name': get_text(row, 'name', 'product_name'),
+        'category': tuple(part for part in CATEGORY_SEPARATOR.split(get_text(row, 'category', 'category_path')) if part),
+        'brand': get_text(row, 'brand'),
+        'supplier': get_text(row, 'supplier'),
+        'color': get_optional_text(row, 'color', 'colour'),
+        'size': get_optional_text(row, 'size'),
+        'description': get_optional_text(row, 'description'),
+    }
+    missing = [field for field in ('sku', 'name', 'category', 'brand', 'supplier') if not values[field]]
+    if missing:
+        raise ValidationError(f'{", ".join(missing)} missing')
+    price = get_text(row, 'price')
+    if not price:
+        raise ValidationError('price missing')
+    values['price'] = parse_number(price, 'price', Decimal).quantize(Decimal('0.01'))
+    stock = get_text(row, 'stock', 'quantity')
+    values['stock'] = parse_number(stock, 'stock', int) if stock else None
+    threshold = get_text(row, 'low_stock_threshold')
+    values['low_stock_threshold'] = parse_number(threshold, 'low_stock_threshold', int) if threshold else None
+    active = row.get('is_active', '')
+    values['is_active'] = parse_boolean(active, 'is_active') if active not in (None, '') else None
+    return values
+
+
+class ProductImporter:
+    def __init__(self, user, batch_size=BATCH_SIZE):
+        self.user = user
+        self.batch_size = batch_size
+        self.report = ImportReport()
+        self.seen_skus = {}
+        # name -> id, filled chunk by chunk
+        self.brands, self.colors, self.sizes, self.suppliers = {}, {}, {}, {}
+        # (parent id, name) -> id
+        self.categories = {}
+
+    def run(self, rows):
+        for chunk in chunked(enumerate(rows, start=1), self.batch_size):
+            self.import_chunk(chunk)
+        return self.report
+
+    def resolve_names(self, model, cache, names, create=True):
+        """Fill ``cache`` for ``names`` with one query, creating the missing rows in bulk"""
+        wanted = {name for name in names if name and name not in cache}
+        if not wanted:
+            return
+        # The oldest row wins when names are not unique
+        for pk, name in model.objects.filter(name__in=wanted).order_by('-pk').values_list('pk', 'name'):
+            cache[name] = pk
+        missing = sorted(wanted - cache.keys())
+        if missing and create:
+            for instance in model.objects.bulk_create([model(name=name) for name in missing]):
+                cache[instance.name] = instance.pk
+
+    def resolve_categories(self, paths):
+        """Category id for every path, walking the tree one level per query"""
+        resolved = {(): None}
+        for depth in range(1, max(map(len, paths), default=0) + 1):
+            level = {path[:depth] for path in paths if len(path) >= depth}
+            wanted = {
+                (resolved[path[:-1]], path[-1]) for path in level
+                if (resolved[path[:-1]], path[-1]) not in self.categories
+            }
+            if wanted:
+                parents = {parent for parent, _ in wanted}
+                under = Q(parent_id__in=parents - {None})
+                if None in parents:
+                    under |= Q(parent__isnull=True)
+                existing = Category.objects.filter(under, name__in={name for _, name in wanted}).order_by('-pk')
+                for pk, parent_id, name in existing.values_list('pk', 'parent_id', 'name'):
+                    if (parent_id, name) in wanted:
+                        self.categories[parent_id, name] = pk
+                missing = sorted(key for key in wanted if key not in self.categories)
+                created = Category.objects.bulk_create([Category(parent_id=parent, name=name) for parent, name in missing])
+                for category in created:
+                    self.categories[category.parent_id, category.name] = category.pk
+            for path in level:
+                resolved[path] = self.categories[resolved[path[:-1]], path[-1]]
+        return resolved
+
+    def import_chunk(self, chunk):
+        report = self.report
+        rows = []
+        for number, row in chunk:
+            report.rows += 1
+            try:
+                values = parse_row(row)
+            except ValidationError as e:
+                report.add_problem(number, '; '.join(e.messages))
+                continue
+            if values['sku'] in self.seen_skus:
+                report.add_problem(number, f'SKU {values["sku"]} already imported from row {self.seen_skus[values["sku"]]}')
+                continue
+            self.seen_skus[values['sku']] = number
+            rows.append((number, values))
+
+        with transaction.atomic():
+            self.resolve_names(Brand, self.brands, [values['brand'] for _, values in rows])
+            self.resolve_names(Color, self.colors, [values['color'] for _, values in rows])
+            self.resolve_names(Size, self.sizes, [values['size'] for _, values in rows])
+            self.resolve_names(Supplier, self.suppliers, [values['supplier'] for _, values in rows], create=False)
+            valid = []
+            for number, values in rows:
+                if values['supplier'] not in self.suppliers:
+                    report.add_problem(number, f'unknown supplier "{values["supplier"]}"')
+                else:
+                    valid.append((number, values))
+            categories = self.resolve_categories({values['category'] for _, values in valid})
+            self.save_products(valid, categories)
+
+    def save_products(self, rows, categories):
+        if not rows:
+            return
+        skus = [values['sku'] for _, values in rows]
+        existing = dict(Product.objects.filter(sku__in=skus).values_list('sku', 'id'))
+        # One upsert per set of optional columns, so a row never clears a column it does not have
+        groups = defaultdict(list)
+        for _, values in rows:
+            supplied = tuple(field for field in OPTIONAL_PRODUCT_FIELDS if values[field] is not None)
+            groups[supplied].append(Product(
+                sku=values['sku'],
+                name=values['name'],
+                description=values['description'] or '',
+                price=values['price'],
+                category_id=categories[values['category']],
+                brand_id=self.brands[values['brand']],
+                supplier_id=self.suppliers[values['supplier']],
+                color_id=self.colors.get(values['color']),
+                size_id=self.sizes.get(values['size']),
+                is_active=values['is_active'] is not False,
+            ))
+        for supplied, products in groups.items():
+            Product.objects.bulk_create(
+                products, update_conflicts=True, unique_fields=['sku'],
+                update_fields=PRODUCT_UPDATE_FIELDS + list(supplied)
+            )
+        product_ids = dict(Product.objects.filter(sku__in=skus).values_list('sku', 'id'))
+        self.report.created += len(rows) - len(existing)
+        self.report.updated += len(existing)
+        self.save_stock(rows, product_ids)
+
+    def save_stock(self, rows, product_ids):
+        current = {
+            product_id: (quantity, threshold)
+            for product_id, quantity, threshold in Inventory.objects.filter(
+                product_id__in=product_ids.values()
+            ).values_list('product_id', 'quantity', 'low_stock_threshold')
+        }
+        inventories, adjustments = [], []
+        for _, values in rows:
+            product_id = product_ids[values['sku']]
+            quantity, threshold = current.get(product_id, (None, DEFAULT_LOW_STOCK_THRESHOLD))
+            if values['stock'] is None and quantity is not None and values['low_stock_threshold'] is None:
+                continue
+            new_quantity = values['stock'] if values['stock'] is not None else quantity or 0
+            inventories.append(Inventory(
+                product_id=product_id,
+                quantity=new_quantity,
+                low_stock_threshold=threshold if values['low_stock_threshold'] is None else values['low_stock_threshold'],
+            ))
+            change = new_quantity - (quantity or 0)
+            if change:
+                adjustments.append(StockAdjustment(
+                    product_id=product_id,
+                    quantity=change,
+                    adjustment_type='addition' if quantity is None else 'correction',
+                    reason='Product import',
+                    adjusted_by=self.user,
+                ))
+        Inventory.objects.bulk_create(
+            inventories, update_conflicts=True, unique_fields=['product'],
+            update_fields=['quantity', 'low_stock_threshold']
+        )
+        StockAdjustment.objects.bulk_create(adjustments)
+
+
+def import_products(rows, user, batch_size=BATCH_SIZE):
+    return ProductImporter(user, batch_size).run(rows)
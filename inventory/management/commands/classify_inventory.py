@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from inventory.classification import classify_products, DEFAULT_WINDOW_DAYS, DEFAULT_PERIOD_DAYS
+
+class Command(BaseCommand):
+    help = 'Assign ABC (revenue share) and XYZ (demand variability) classes to all active products'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--window-days',
+            type=int,
+            default=DEFAULT_WINDOW_DAYS,
+            help=f'Trailing sales window in days (default: {DEFAULT_WINDOW_DAYS})',
+        )
+        parser.add_argument(
+            '--period-days',
+            type=int,
+            default=DEFAULT_PERIOD_DAYS,
+            help=f'Length of the demand periods used for XYZ in days (default: {DEFAULT_PERIOD_DAYS})',
+        )
+
+    def handle(self, *args, **options):
+        counts = classify_products(
+            window_days=options['window_days'],
+            period_days=options['period_days'],
+        )
+
+        self.stdout.write(self.style.SUCCESS('Inventory classification complete'))
+        self.stdout.write(
+            'ABC: ' + ', '.join(f"{cls}={counts.get(cls, 0)}" for cls in 'ABC')
+        )
+        self.stdout.write(
+            'XYZ: ' + ', '.join(f"{cls}={counts.get(cls, 0)}" for cls in 'XYZ')
+        )
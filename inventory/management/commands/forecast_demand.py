@@ -0,0 +1,61 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from inventory.forecasting import (
+    forecast_demand, DEFAULT_WINDOW_DAYS, DEFAULT_ALPHA,
+    DEFAULT_SERVICE_LEVEL, DEFAULT_REVIEW_DAYS
+)
+
+class Command(BaseCommand):
+    help = 'Forecast daily demand per product and update reorder points and suggested order quantities'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--window-days',
+            type=int,
+            default=DEFAULT_WINDOW_DAYS,
+            help=f'Trailing sales window in days (default: {DEFAULT_WINDOW_DAYS})',
+        )
+        parser.add_argument(
+            '--alpha',
+            type=float,
+            default=DEFAULT_ALPHA,
+            help=f'Exponential smoothing factor between 0 and 1 (default: {DEFAULT_ALPHA})',
+        )
+        parser.add_argument(
+            '--service-level',
+            type=float,
+            default=DEFAULT_SERVICE_LEVEL,
+            help=f'Probability of not running out during the lead time (default: {DEFAULT_SERVICE_LEVEL})',
+        )
+        parser.add_argument(
+            '--review-days',
+            type=int,
+            default=DEFAULT_REVIEW_DAYS,
+            help=f'Days of demand each purchase order should cover (default: {DEFAULT_REVIEW_DAYS})',
+        )
+
+    def handle(self, *args, **options):
+        if not 0 < options['alpha'] < 1:
+            raise CommandError('--alpha must be between 0 and 1')
+        if not 0 < options['service_level'] < 1:
+            raise CommandError('--service-level must be between 0 and 1')
+        if options['window_days'] < 1:
+            raise CommandError('--window-days must be at least 1')
+
+        started = time.monotonic()
+        result = forecast_demand(
+            window_days=options['window_days'],
+            alpha=options['alpha'],
+            service_level=options['service_level'],
+            review_days=options['review_days'],
+        )
+        elapsed = time.monotonic() - started
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Forecast updated for {result['updated']} products in {elapsed:.1f}s"
+            )
+        )
+        self.stdout.write(f"Products with sales history: {result['with_history']}")
+        self.stdout.write(f"Products to reorder: {result['to_reorder']}")
@@ -0,0 +1,43 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from core.importing import BATCH_SIZE, FORMATS, ImportFileError, get_format, read_rows
+from inventory.importers import import_products
+
+
+class Command(BaseCommand):
+    help = (
+        'Import or update products and stock from a CSV, JSON or JSON Lines file with sku, name, '
+        'category, brand, supplier, price and stock columns, and optional description, color, size and is_active columns'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--user', help='Username recorded on the stock adjustments; defaults to the first superuser')
+
+    def handle(self, *args, **options):
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+        else:
+            user = User.objects.filter(is_superuser=True).order_by('pk').first()
+        if user is None:
+            raise CommandError('No user to record the stock adjustments; pass --user')
+
+        started = time.perf_counter()
+        try:
+            fmt = get_format(options['path'], options['format'])
+            with open(options['path'], 'rb') as stream:
+                report = import_products(read_rows(stream, fmt), user, batch_size=options['batch_size'])
+        except (OSError, ImportFileError) as e:
+            raise CommandError(str(e))
+
+        for row, message in report.problems:
+            self.stdout.write(self.style.WARNING(f'Row {row}: {message}'))
+        if report.problem_count > len(report.problems):
+            self.stdout.write(self.style.WARNING(f'... and {report.problem_count - len(report.problems)} more'))
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Imported products in {elapsed:.1f}s: {report}'))
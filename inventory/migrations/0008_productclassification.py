@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0007_product_is_active'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductClassification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('abc_class', models.CharField(choices=[('A', 'A - High revenue'), ('B', 'B - Medium revenue'), ('C', 'C - Low revenue')], max_length=1)),
+                ('xyz_class', models.CharField(choices=[('X', 'X - Steady demand'), ('Y', 'Y - Variable demand'), ('Z', 'Z - Irregular demand')], max_length=1)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('revenue_share', models.FloatField(default=0, help_text='Share of total revenue in the window, in percent')),
+                ('units_sold', models.IntegerField(default=0)),
+                ('demand_cv', models.FloatField(blank=True, help_text='Coefficient of variation of periodic demand', null=True)),
+                ('computed_at', models.DateTimeField()),
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='classification', to='inventory.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['abc_class', 'xyz_class'], name='classification_abc_xyz_idx'), models.Index(fields=['xyz_class'], name='classification_xyz_idx'), models.Index(fields=['-revenue'], name='classification_revenue_idx')],
+            },
+        ),
+    ]
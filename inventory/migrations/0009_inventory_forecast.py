@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0008_productclassification'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventory',
+            name='forecast_daily_demand',
+            field=models.FloatField(default=0, help_text='Smoothed units sold per day'),
+        ),
+        migrations.AddField(
+            model_name='inventory',
+            name='forecast_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='inventory',
+            name='reorder_point',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='inventory',
+            name='suggested_order_quantity',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='supplier',
+            name='lead_time_days',
+            field=models.PositiveIntegerField(default=7, help_text='Days between placing an order and receiving it'),
+        ),
+        migrations.AddIndex(
+            model_name='inventory',
+            index=models.Index(fields=['suggested_order_quantity'], name='inventory_suggested_qty_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0011_stock_counts'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='stockcountline',
+            name='expected_quantity',
+            field=models.IntegerField(help_text='Stock when the product was counted, or when the count started'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0012_stock_count_expected_at_count'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='inventory',
+            name='reorder_point',
+            field=models.IntegerField(blank=True, help_text='Forecast by forecast_demand; replaces the low stock threshold while set', null=True),
+        ),
+    ]
@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.core.validators import MinValueValidator
 from django.conf import settings
 from django.contrib.auth import get_user_model
@@ -41,6 +43,7 @@ class Supplier(models.Model):
     name = models.CharField(max_length=100)
     contact_person = models.CharField(max_length=100)
     contact_info = models.CharField(max_length=200)
+    lead_time_days = models.PositiveIntegerField(default=7, help_text="Days between placing an order and receiving it")
 
     def __str__(self):
         return self.name
@@ -81,16 +84,36 @@ class Product(models.Model):
     def __str__(self):
         return f"{self.name} ({self.sku})"
 
+def reorder_level(prefix=''):
+    """``Inventory.reorder_level`` as an expression; ``prefix`` is the path to the inventory, e.g. 'inventory__'"""
+    return Coalesce(f'{prefix}reorder_point', f'{prefix}low_stock_threshold')
+
+
 class Inventory(models.Model):
     product = models.OneToOneField(Product, on_delete=models.CASCADE)
     quantity = models.IntegerField(default=0)
     low_stock_threshold = models.IntegerField()
+    forecast_daily_demand = models.FloatField(default=0, help_text="Smoothed units sold per day")
+    reorder_point = models.IntegerField(
+        null=True, blank=True,
+        help_text="Forecast by forecast_demand; replaces the low stock threshold while set"
+    )
+    suggested_order_quantity = models.IntegerField(default=0)
+    forecast_updated_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return f"{self.product.name} - Qty: {self.quantity}"
 
+    @property
+    def reorder_level(self):
+        """Stock at or below which the product is low: the forecast reorder point, else the manual threshold"""
+        return self.low_stock_threshold if self.reorder_point is None else self.reorder_point
+
     class Meta:
         verbose_name_plural = "Inventories"
+        indexes = [
+            models.Index(fields=['suggested_order_quantity'], name='inventory_suggested_qty_idx'),
+        ]
 
 
 class StockAdjustment(models.Model):
@@ -110,3 +133,264 @@ class StockAdjustment(models.Model):
     def __str__(self):
         action = "added to" if self.quantity > 0 else "removed from"
         return f"{abs(self.quantity)} items {action} {self.product.name}"
+
+
+class GoodsReceivedNote(models.Model):
+    """A supplier delivery; its lines are added to stock together when the note is received"""
+    STATUS_CHOICES = [
+        ('draft', 'Draft'),
+        ('received', 'Received'),
+    ]
+
+    supplier = models.ForeignKey(Supplier, on_delete=models.PROTECT, related_name='goods_received_notes')
+    reference = models.CharField(max_length=100, blank=True, help_text="Supplier's delivery note or invoice number")
+    notes = models.TextField(blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='draft')
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    received_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.PROTECT, null=True, blank=True, related_name='+'
+    )
+    received_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"GRN #{self.pk} - {self.supplier.name}"
+
+    @property
+    def reason(self):
+        reason = f"Goods received note #{self.pk}"
+        return f"{reason} ({self.reference})" if self.reference else reason
+
+    def receive(self, user):
+        """
+        Add every line to stock in one transaction.
+
+        Adjustments are written with one bulk_create and inventory is updated
+        with one UPDATE, whatever the number of lines. Raises ValueError if
+        the note was already received.
+        """
+        with transaction.atomic():
+            now = timezone.now()
+            # The status change is the guard against receiving a note twice
+            if not GoodsReceivedNote.objects.filter(pk=self.pk, status='draft').update(
+                status='received', received_by=user, received_at=now
+            ):
+                raise ValueError(f"{self} has already been received")
+            self.status, self.received_by, self.received_at = 'received', user, now
+
+            lines = list(self.lines.values_list('product_id', 'quantity'))
+            Inventory.objects.bulk_create([
+                Inventory(product_id=product_id, quantity=0, low_stock_threshold=5)
+                for product_id, _ in lines
+            ], ignore_conflicts=True)
+            StockAdjustment.objects.bulk_create([
+                StockAdjustment(
+                    product_id=product_id, quantity=quantity, adjustment_type='addition',
+                    reason=self.reason, adjusted_by=user, created_at=now,
+                )
+                for product_id, quantity in lines
+            ])
+            received = GoodsReceivedLine.objects.filter(note=self, product_id=OuterRef('product_id'))
+            # The lines are matched with a subquery, not a list of ids bound one parameter each
+            Inventory.objects.filter(product_id__in=self.lines.values('product_id')).update(
+                quantity=F('quantity') + Subquery(received.values('quantity')[:1])
+            )
+        return len(lines)
+
+
+class GoodsReceivedLine(models.Model):
+    note = models.ForeignKey(GoodsReceivedNote, on_delete=models.CASCADE, related_name='lines')
+    product = models.ForeignKey(Product, on_delete=models.PROTECT, related_name='goods_received_lines')
+    quantity = models.PositiveIntegerField(validators=[MinValueValidator(1)])
+    unit_cost = models.DecimalField(max_digits=10, decimal_places=2, default=0, validators=[MinValueValidator(0)])
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['note', 'product'], name='unique_goods_received_line'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product.name}"
+
+    @property
+    def total_cost(self):
+        return self.unit_cost * self.quantity
+
+
+class StockCount(models.Model):
+    """
+    A stock-taking session.
+
+    Starting a count creates a line for every product in scope. When a
+    product is first counted, its stock at that moment is stored on the line
+    as the expected quantity; the shelf count reflects the same sales. On
+    apply each variance is added to the current stock, so sales and
+    deliveries made after a product was counted are kept too.
+    """
+    STATUS_CHOICES = [
+        ('open', 'Open'),
+        ('applied', 'Applied'),
+    ]
+
+    name = models.CharField(max_length=100)
+    category = models.ForeignKey(
+        Category, on_delete=models.SET_NULL, null=True, blank=True, related_name='+',
+        help_text="Count one category and its subcategories; leave empty for the whole store"
+    )
+    notes = models.TextField(blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='open')
+    started_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT, related_name='+')
+    started_at = models.DateTimeField(default=timezone.now)
+    applied_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.PROTECT, null=True, blank=True, related_name='+'
+    )
+    applied_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-started_at']
+
+    def __str__(self):
+        return f"Stock count #{self.pk} - {self.name}"
+
+    def get_category_ids(self):
+        """The category and all its subcategories, one query per tree level"""
+        ids, level = set(), {self.category_id}
+        while level:
+            ids |= level
+            level = set(Category.objects.filter(parent_id__in=level).values_list('pk', flat=True)) - ids
+        return ids
+
+    def take_snapshot(self):
+        """Create a line holding the current stock of every active product in scope"""
+        products = Product.objects.filter(is_active=True)
+        if self.category_id:
+            products = products.filter(category_id__in=self.get_category_ids())
+        snapshot = products.values_list('pk', Coalesce('inventory__quantity', 0))
+        return len(StockCountLine.objects.bulk_create([
+            StockCountLine(count=self, product_id=product_id, expected_quantity=quantity)
+            for product_id, quantity in snapshot.iterator(chunk_size=2000)
+        ], batch_size=2000))
+
+    def record(self, quantities, replace=False):
+        """
+        Add (or with ``replace``, set) counted quantities given as {line id: quantity}.
+
+        A line counted for the first time, or replaced, takes the current stock
+        as its expected quantity.
+        """
+        with transaction.atomic():
+            now = timezone.now()
+            lines = list(self.lines.filter(pk__in=quantities).annotate(
+                stock=Coalesce('product__inventory__quantity', 0)
+            ))
+            for line in lines:
+                quantity = quantities[line.pk]
+                if replace or line.counted_quantity is None:
+                    line.expected_quantity = line.stock
+                else:
+                    quantity += line.counted_quantity
+                line.counted_quantity, line.counted_at = quantity, now
+            StockCountLine.objects.bulk_update(
+                lines, ['expected_quantity', 'counted_quantity', 'counted_at'], batch_size=500
+            )
+        return len(lines)
+
+    def apply(self, user):
+        """
+        Write every variance as a correction in one transaction.
+
+        Lines that were not counted are left alone. Raises ValueError if the
+        count was already applied.
+        """
+        with transaction.atomic():
+            now = timezone.now()
+            if not StockCount.objects.filter(pk=self.pk, status='open').update(
+                status='applied', applied_by=user, applied_at=now
+            ):
+                raise ValueError(f"{self} has already been applied")
+            self.status, self.applied_by, self.applied_at = 'applied', user, now
+
+            variances = self.lines.filter(counted_quantity__isnull=False).exclude(
+                counted_quantity=F('expected_quantity')
+            )
+            changes = list(variances.values_list('product_id', F('counted_quantity') - F('expected_quantity')))
+            Inventory.objects.bulk_create([
+                Inventory(product_id=product_id, quantity=0, low_stock_threshold=5)
+                for product_id, _ in changes
+            ], ignore_conflicts=True)
+            StockAdjustment.objects.bulk_create([
+                StockAdjustment(
+                    product_id=product_id, quantity=variance, adjustment_type='correction',
+                    reason=f"Stock count #{self.pk}", adjusted_by=user, created_at=now,
+                )
+                for product_id, variance in changes
+            ])
+            variance = variances.filter(product_id=OuterRef('product_id')).values(
+                variance=F('counted_quantity') - F('expected_quantity')
+            )
+            Inventory.objects.filter(product_id__in=variances.values('product_id')).update(
+                quantity=F('quantity') + Subquery(variance[:1])
+            )
+        return len(changes)
+
+
+class StockCountLine(models.Model):
+    count = models.ForeignKey(StockCount, on_delete=models.CASCADE, related_name='lines')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    expected_quantity = models.IntegerField(help_text="Stock when the product was counted, or when the count started")
+    counted_quantity = models.PositiveIntegerField(null=True, blank=True)
+    counted_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['count', 'product'], name='unique_stock_count_line'),
+        ]
+
+    def __str__(self):
+        return f"{self.product.name}: {self.counted_quantity} counted, {self.expected_quantity} expected"
+
+    @property
+    def variance(self):
+        if self.counted_quantity is None:
+            return None
+        return self.counted_quantity - self.expected_quantity
+
+
+class ProductClassification(models.Model):
+    """ABC (revenue share) and XYZ (demand variability) class of a product, refreshed by classify_inventory"""
+    ABC_CHOICES = [
+        ('A', 'A - High revenue'),
+        ('B', 'B - Medium revenue'),
+        ('C', 'C - Low revenue'),
+    ]
+    XYZ_CHOICES = [
+        ('X', 'X - Steady demand'),
+        ('Y', 'Y - Variable demand'),
+        ('Z', 'Z - Irregular demand'),
+    ]
+
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name='classification')
+    abc_class = models.CharField(max_length=1, choices=ABC_CHOICES)
+    xyz_class = models.CharField(max_length=1, choices=XYZ_CHOICES)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    revenue_share = models.FloatField(default=0, help_text="Share of total revenue in the window, in percent")
+    units_sold = models.IntegerField(default=0)
+    demand_cv = models.FloatField(null=True, blank=True, help_text="Coefficient of variation of periodic demand")
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['abc_class', 'xyz_class'], name='classification_abc_xyz_idx'),
+            models.Index(fields=['xyz_class'], name='classification_xyz_idx'),
+            models.Index(fields=['-revenue'], name='classification_revenue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product.name} - {self.abc_class}{self.xyz_class}"
+
+    @property
+    def label(self):
+        return f"{self.abc_class}{self.xyz_class}"
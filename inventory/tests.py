@@ -1,3 +1,426 @@
+import json
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from math import sqrt
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core.testing import QueryBudgetMixin, seed_store
+from inventory.classification import classify_products, get_demand_cv, get_xyz_class
+from inventory.forecasting import forecast_demand
+from inventory.importers import import_products
+from inventory.models import (
+    GoodsReceivedNote, Inventory, Product, ProductClassification, StockAdjustment, StockCount, Supplier
+)
+from sales.models import Order, OrderItem
+
+
+class InventoryQueryBudgetTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_store()
+        cls.product = cls.data['products'][0]
+
+    def setUp(self):
+        self.client.force_login(self.data['admin'])
+
+    def test_product_list(self):
+        self.assertQueryBudget(4, '/inventory/')
+        self.assertQueryBudget(4, '/inventory/?search=Product&page=2')
+
+    def test_product_pages(self):
+        self.assertQueryBudget(7, '/inventory/product/add/')
+        self.assertQueryBudget(10, f'/inventory/product/{self.product.pk}/')
+        self.assertQueryBudget(9, f'/inventory/product/{self.product.pk}/edit/')
+        self.assertQueryBudget(6, f'/inventory/product/{self.product.pk}/delete/')
+
+    def test_stock_reports(self):
+        self.assertQueryBudget(3, '/inventory/low-stock/')
+        self.assertQueryBudget(3, '/inventory/purchase-suggestions/')
+        self.assertQueryBudget(7, '/inventory/report/')
+
+    def test_api(self):
+        self.assertQueryBudget(3, '/inventory/api/product-search/?q=Product')
+        self.assertQueryBudget(3, '/inventory/api/recent-products/')
+        self.assertQueryBudget(3, f'/inventory/api/subcategories/?parent_id={self.product.category.parent_id}')
+        self.assertQueryBudget(5, f'/inventory/api/category-chain/{self.product.category_id}/')
+
+
+class ProductImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_store(customers=1, products=3, orders=0, assistants=1, salespersons=1, days=1)
+        cls.admin = cls.data['admin']
+        cls.existing = cls.data['products'][0]
+        cls.supplier = cls.existing.supplier
+
+    def test_upload_creates_and_updates_products(self):
+        self.client.force_login(self.admin)
+        rows = [
+            {'sku': 'NEW-1', 'name': 'Romper', 'category': 'Clothing > Baby > Rompers', 'brand': 'Tiny',
+             'supplier': self.supplier.name, 'color': 'Blue', 'size': '0-3M', 'price': '450', 'stock': 12},
+            {'sku': 'NEW-2', 'name': 'Bib', 'category': 'Clothing / Baby', 'brand': 'Tiny',
+             'supplier': self.supplier.name, 'price': '90.5'},
+            {'sku': self.existing.sku, 'name': 'Renamed', 'category': 'Clothing > Baby > Rompers', 'brand': 'Tiny',
+             'supplier': self.supplier.name, 'price': '99', 'stock': 40},
+            {'sku': 'NEW-1', 'name': 'Twice', 'category': 'Toys', 'brand': 'Tiny', 'supplier': self.supplier.name, 'price': '1'},
+            {'sku': 'BAD', 'name': 'Bad', 'category': 'Toys', 'brand': 'Tiny', 'supplier': 'Nobody', 'price': '1'},
+            {'sku': 'BAD-2', 'name': 'Bad', 'category': 'Toys', 'brand': 'Tiny', 'supplier': self.supplier.name, 'price': '-1'},
+        ]
+        upload = SimpleUploadedFile('products.jsonl', '\n'.join(json.dumps(row) for row in rows).encode())
+        response = self.client.post('/inventory/product/import/', {'file': upload})
+        report = response.context['report']
+        self.assertEqual((report.created, report.updated, report.skipped), (2, 1, 3))
+
+        romper = Product.objects.select_related('category__parent__parent', 'inventory', 'color').get(sku='NEW-1')
+        self.assertEqual(romper.category.get_hierarchy(), 'Clothing >> Baby >> Rompers')
+        self.assertEqual((romper.color.name, romper.inventory.quantity), ('Blue', 12))
+        bib = Product.objects.get(sku='NEW-2')
+        self.assertEqual(bib.category_id, romper.category.parent_id)
+        self.assertEqual(bib.inventory.quantity, 0)
+        self.existing.refresh_from_db()
+        self.assertEqual((self.existing.name, self.existing.price), ('Renamed', Decimal('99.00')))
+        self.assertEqual(self.existing.inventory.quantity, 40)
+        self.assertTrue(StockAdjustment.objects.filter(product=self.existing, reason='Product import').exists())
+
+    def test_rows_only_update_the_optional_columns_they_have(self):
+        Product.objects.filter(pk=self.existing.pk).update(description='Soft cotton', is_active=False)
+        other = self.data['products'][1]
+        base = {'category': 'Clothing', 'brand': 'Tiny', 'supplier': self.supplier.name, 'price': '10'}
+        report = import_products([
+            {**base, 'sku': self.existing.sku, 'name': 'Same'},
+            {**base, 'sku': other.sku, 'name': 'Described', 'description': 'New text', 'is_active': 'no'},
+        ], self.admin)
+        self.assertEqual(report.updated, 2)
+
+        self.existing.refresh_from_db()
+        self.assertEqual(
+            (self.existing.name, self.existing.description, self.existing.is_active, self.existing.color_id),
+            ('Same', 'Soft cotton', False, self.data['products'][0].color_id)
+        )
+        other.refresh_from_db()
+        self.assertEqual((other.description, other.is_active), ('New text', False))
+
+        report = import_products([{**base, 'sku': 'BAD', 'name': 'Bad', 'is_active': 'maybe'}], self.admin)
+        self.assertEqual(report.skipped, 1)
+
+    def test_zero_low_stock_threshold_is_kept(self):
+        base = {'category': 'Clothing', 'brand': 'Tiny', 'supplier': self.supplier.name, 'price': '10'}
+        import_products([{**base, 'sku': self.existing.sku, 'name': 'Same', 'low_stock_threshold': '0'}], self.admin)
+        self.assertEqual(Inventory.objects.get(product=self.existing).low_stock_threshold, 0)
+
+    def test_upload_requires_staff(self):
+        user = User.objects.create_user('clerk', password='x')
+        self.client.force_login(user)
+        self.assertEqual(self.client.get('/inventory/product/import/').status_code, 403)
+
+
+class GoodsReceivedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_store(customers=1, products=4, orders=0, assistants=1, salespersons=1, days=1)
+        cls.admin = cls.data['admin']
+        template = cls.data['products'][0]
+        cls.supplier = template.supplier
+        cls.products = Product.objects.bulk_create([
+            Product(
+                name=f'Delivered {i}', sku=f'GRN-{i:03}', price=100, category_id=template.category_id,
+                brand_id=template.brand_id, supplier=cls.supplier
+            )
+            for i in range(300)
+        ])
+        # Half of the products already have stock
+        Inventory.objects.bulk_create([Inventory(product=product, quantity=10, low_stock_threshold=5) for product in cls.products[::2]])
+
+    def test_large_delivery_is_received_in_one_request(self):
+        self.client.force_login(self.admin)
+        lines = '\n'.join(f'{product.sku}, {i + 1}, 55.50' for i, product in enumerate(self.products))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/inventory/goods-received/add/', {
+                'supplier': self.supplier.pk, 'reference': 'INV-77', 'lines': lines, 'receive': 'on',
+            })
+        note = GoodsReceivedNote.objects.get()
+        self.assertRedirects(response, f'/inventory/goods-received/{note.pk}/', fetch_redirect_response=False)
+        # One statement per step; SQLite only splits the bulk inserts by its variable limit
+        self.assertLess(len(queries), 25)
+        # Stock is updated with one set-based UPDATE, not an IN list of every product id
+        update, = [query['sql'] for query in queries if query['sql'].startswith('UPDATE "inventory_inventory"')]
+        self.assertIn('IN (SELECT', update)
+
+        self.assertEqual(note.status, 'received')
+        self.assertEqual(note.lines.count(), 300)
+        stock = dict(Inventory.objects.filter(product__in=self.products).values_list('product__sku', 'quantity'))
+        self.assertEqual(stock['GRN-000'], 11)
+        self.assertEqual(stock['GRN-001'], 2)
+        self.assertEqual(stock['GRN-299'], 300)
+        adjustments = StockAdjustment.objects.filter(reason='Goods received note #%d (INV-77)' % note.pk)
+        self.assertEqual(adjustments.count(), 300)
+
+        with self.assertRaises(ValueError):
+            note.receive(self.admin)
+        self.assertEqual(Inventory.objects.get(product=self.products[0]).quantity, 11)
+
+    def test_unknown_and_repeated_skus_are_rejected(self):
+        self.client.force_login(self.admin)
+        response = self.client.post('/inventory/goods-received/add/', {
+            'supplier': self.supplier.pk, 'lines': 'GRN-000, 1\nGRN-000, 2\nNOPE, 1\nGRN-001, -3',
+        })
+        self.assertEqual(response.status_code, 200)
+        errors = response.context['form'].errors['lines']
+        self.assertEqual(len(errors), 3)
+        self.assertFalse(GoodsReceivedNote.objects.exists())
+
+    def test_draft_is_received_later(self):
+        self.client.force_login(self.admin)
+        self.client.post('/inventory/goods-received/add/', {'supplier': self.supplier.pk, 'lines': 'GRN-001, 4, 10'})
+        note = GoodsReceivedNote.objects.get()
+        self.assertEqual(note.status, 'draft')
+        self.assertFalse(Inventory.objects.filter(product=self.products[1]).exists())
+        self.client.post(f'/inventory/goods-received/{note.pk}/receive/')
+        self.assertEqual(Inventory.objects.get(product=self.products[1]).quantity, 4)
+        self.assertEqual(self.client.get(f'/inventory/goods-received/{note.pk}/').status_code, 200)
+        self.assertEqual(self.client.get('/inventory/goods-received/').status_code, 200)
+
+
+class SalesHistoryMixin:
+    def sell(self, product, quantity, days_ago, price=None):
+        """Record a completed single-item order placed ``days_ago`` days ago"""
+        price = product.price if price is None else price
+        order = Order.objects.create(salesperson=self.data['admin'], status='completed', total=price * quantity)
+        Order.objects.filter(pk=order.pk).update(order_date=timezone.now() - timedelta(days=days_ago, seconds=1))
+        OrderItem.objects.create(order=order, product=product, quantity=quantity, price=price)
+
+
+class ClassificationTests(SalesHistoryMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_store(customers=1, products=5, orders=0, assistants=1, salespersons=1, days=1)
+        cls.products = cls.data['products']
+
+    def classify(self):
+        classify_products(window_days=28, period_days=7)
+        return {
+            row.product: row
+            for row in ProductClassification.objects.select_related('product')
+        }
+
+    def test_abc_cut_offs_by_cumulative_revenue_share(self):
+        steady, variable, single, small, unsold = self.products
+        for days_ago in (0, 7, 14, 21):
+            self.sell(steady, 7, days_ago, price=100)
+        self.sell(variable, 6, 1, price=50)
+        self.sell(variable, 6, 8, price=50)
+        self.sell(single, 4, 2, price=100)
+        self.sell(small, 2, 3, price=100)
+
+        rows = self.classify()
+        # 70%, 15%, 10% and 5% of the revenue: A until 80% is reached, B until 95%
+        self.assertEqual([rows[product].revenue_share for product in self.products], [70, 15, 10, 5, 0])
+        self.assertEqual([rows[product].abc_class for product in self.products], ['A', 'A', 'B', 'C', 'C'])
+        # Weekly units [7, 7, 7, 7], [6, 6, 0, 0], [4, 0, 0, 0], [2, 0, 0, 0] and none
+        self.assertEqual([rows[product].xyz_class for product in self.products], ['X', 'Y', 'Z', 'Z', 'Z'])
+        self.assertEqual(rows[steady].demand_cv, 0)
+        self.assertEqual(rows[variable].demand_cv, 1)
+        self.assertIsNone(rows[unsold].demand_cv)
+
+    def test_xyz_buckets(self):
+        self.assertIsNone(get_demand_cv([0, 0, 0, 0], 4))
+        self.assertAlmostEqual(get_demand_cv([20, 0, 0, 0], 4), sqrt(3))
+        for cv, xyz_class in ((0, 'X'), (0.5, 'X'), (0.51, 'Y'), (1.0, 'Y'), (1.01, 'Z'), (None, 'Z')):
+            self.assertEqual(get_xyz_class(cv), xyz_class, cv)
+
+    def test_deactivated_products_are_removed(self):
+        self.sell(self.products[0], 1, 0)
+        self.assertEqual(len(self.classify()), 5)
+        Product.objects.filter(pk=self.products[1].pk).update(is_active=False)
+        rows = self.classify()
+        self.assertEqual(len(rows), 4)
+        self.assertNotIn(self.products[1], rows)
+
+
+class ForecastTests(SalesHistoryMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_store(customers=1, products=3, orders=0, assistants=1, salespersons=1, days=1)
+        cls.steady, cls.unsold, cls.spike = cls.data['products']
+        Inventory.objects.filter(product__in=[cls.steady, cls.spike]).update(quantity=10)
+        cls.express = Supplier.objects.create(name='Express', contact_person='-', contact_info='-', lead_time_days=2)
+        Product.objects.filter(pk=cls.spike.pk).update(supplier=cls.express)
+
+    def forecast(self):
+        # alpha 0.5 over a 4-day window keeps every weight exact in binary
+        return forecast_demand(window_days=4, alpha=0.5, review_days=14)
+
+    def test_reorder_point_is_kept_apart_from_the_threshold(self):
+        for days_ago in range(4):
+            self.sell(self.steady, 2, days_ago)
+        self.forecast()
+
+        steady = Inventory.objects.get(product=self.steady)
+        # Steady demand of 2 a day has no variance: 7 days of lead time need 14 units
+        self.assertEqual((steady.reorder_point, steady.low_stock_threshold), (14, 5))
+        self.assertEqual(steady.reorder_level, 14)
+        unsold = Inventory.objects.get(product=self.unsold)
+        self.assertEqual((unsold.reorder_point, unsold.reorder_level), (None, 5))
+
+        # 10 units are above the manual threshold but below the reorder point
+        self.client.force_login(self.data['admin'])
+        response = self.client.get('/inventory/low-stock/')
+        self.assertIn(steady, response.context['low_stock_items'])
+        self.assertNotIn(unsold, response.context['low_stock_items'])
+
+    def test_recent_sales_weigh_more(self):
+        self.sell(self.spike, 8, days_ago=3)
+        self.forecast()
+        # Seed level 2/16 plus the sale weighted by 0.5 * 0.5 ** 3
+        self.assertEqual(Inventory.objects.get(product=self.spike).forecast_daily_demand, 0.625)
+
+        OrderItem.objects.all().delete()
+        self.sell(self.spike, 8, days_ago=0)
+        self.forecast()
+        self.assertEqual(Inventory.objects.get(product=self.spike).forecast_daily_demand, 4.125)
+
+    def test_reorder_point_and_order_quantity(self):
+        for days_ago in range(4):
+            self.sell(self.steady, 2, days_ago)
+        self.sell(self.spike, 8, days_ago=0)
+        result = self.forecast()
+        self.assertEqual(result, {'updated': 3, 'with_history': 2, 'to_reorder': 2})
+
+        # Enough for the lead time and the review period, less the stock on hand
+        steady = Inventory.objects.get(product=self.steady)
+        self.assertEqual(steady.suggested_order_quantity, 14 + 2 * 14 - 10)
+        # Demand 4.125 with variance 15.984375: 4.125 * 2 + 1.645 * 3.998 * sqrt(2) = 17.55 over the 2-day lead time
+        spike = Inventory.objects.get(product=self.spike)
+        self.assertEqual(spike.reorder_point, 18)
+        self.assertEqual(spike.suggested_order_quantity, 18 + 58 - 10)
+
+        # Stock above the reorder point needs no order
+        Inventory.objects.filter(product=self.spike).update(quantity=19)
+        self.forecast()
+        self.assertEqual(Inventory.objects.get(product=self.spike).suggested_order_quantity, 0)
+
+    def test_purchase_suggestions_are_grouped_by_supplier(self):
+        for days_ago in range(4):
+            self.sell(self.steady, 2, days_ago)
+        self.sell(self.spike, 8, days_ago=0)
+        self.forecast()
+        ProductClassification.objects.create(
+            product=self.steady, abc_class='A', xyz_class='X', computed_at=timezone.now()
+        )
+        self.client.force_login(self.data['admin'])
+
+        response = self.client.get('/inventory/purchase-suggestions/')
+        orders = response.context['purchase_orders']
+        self.assertEqual([order['supplier'] for order in orders], [self.express, self.steady.supplier])
+        self.assertEqual([order['total_units'] for order in orders], [66, 32])
+        self.assertEqual(orders[0]['total_value'], 66 * self.spike.price)
+
+        response = self.client.get('/inventory/purchase-suggestions/', {'abc': 'A'})
+        self.assertEqual(
+            [[item.product for item in order['items']] for order in response.context['purchase_orders']],
+            [[self.steady]]
+        )
+
+
+class StockCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_store(customers=1, products=4, orders=0, assistants=1, salespersons=1, days=1)
+        cls.admin = cls.data['admin']
+        cls.products = list(Product.objects.filter(is_active=True).select_related('inventory').order_by('pk'))
+
+    def start_count(self):
+        self.client.force_login(self.admin)
+        self.client.post('/inventory/stock-counts/add/', {'name': 'Year end'})
+        return StockCount.objects.get()
+
+    def test_variances_are_applied_on_top_of_sales_during_the_count(self):
+        count = self.start_count()
+        self.assertEqual(count.lines.count(), len(self.products))
+        first, second, third = self.products[:3]
+        url = f'/inventory/stock-counts/{count.pk}/'
+        # Four units of the second product are sold before its shelf is counted
+        Inventory.objects.filter(product=second).update(quantity=F('quantity') - 4)
+        # Scanning a SKU counts one unit; a quantity can follow it
+        self.client.post(url, {'entries': f'{first.sku}\n{first.sku}\n{second.sku}, {second.inventory.quantity - 4}'})
+        self.client.post(url, {'entries': f'{first.sku}, 3\n{third.sku}, 0'})
+        counted = dict(count.lines.values_list('product_id', 'counted_quantity'))
+        self.assertEqual(counted[first.pk], 5)
+
+        # Two units of the first product are sold after it was counted
+        Inventory.objects.filter(product=first).update(quantity=F('quantity') - 2)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(f'{url}apply/')
+        self.assertLess(len(queries), 15)
+        update, = [query['sql'] for query in queries if query['sql'].startswith('UPDATE "inventory_inventory"')]
+        self.assertIn('IN (SELECT', update)
+
+        count.refresh_from_db()
+        self.assertEqual(count.status, 'applied')
+        stock = dict(Inventory.objects.values_list('product_id', 'quantity'))
+        self.assertEqual(stock[first.pk], 3)
+        self.assertEqual(stock[second.pk], second.inventory.quantity - 4)
+        self.assertEqual(stock[third.pk], 0)
+        self.assertEqual(stock[self.products[3].pk], self.products[3].inventory.quantity)
+        corrections = StockAdjustment.objects.filter(reason=f'Stock count #{count.pk}', adjustment_type='correction')
+        self.assertEqual(
+            dict(corrections.values_list('product_id', 'quantity')),
+            {first.pk: 5 - first.inventory.quantity, third.pk: -third.inventory.quantity}
+        )
+        with self.assertRaises(ValueError):
+            count.apply(self.admin)
+
+    def test_unknown_skus_are_rejected(self):
+        count = self.start_count()
+        response = self.client.post(f'/inventory/stock-counts/{count.pk}/', {'entries': 'NOPE\nX, -1'})
+        self.assertEqual(len(response.context['form'].errors['entries']), 2)
+        self.assertFalse(count.lines.filter(counted_quantity__isnull=False).exists())
+        self.assertEqual(self.client.get('/inventory/stock-counts/').status_code, 200)
+
+
+class UpdateStockCommandTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_store(customers=1, products=4, orders=0, assistants=1, salespersons=1, days=1)
+        cls.low, cls.ok, cls.missing = cls.data['products'][:3]
+        Inventory.objects.update(quantity=40)
+        Inventory.objects.filter(product=cls.low).update(quantity=2)
+        Inventory.objects.filter(product=cls.missing).delete()
+
+    def run_command(self, *args):
+        out = StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            call_command('update_stock', *args, stdout=out)
+        return out.getvalue(), len(queries)
+
+    def test_dry_run_writes_nothing(self):
+        output, _ = self.run_command('--dry-run')
+        self.assertIn('would update 1 products and create 1 inventories', output)
+        self.assertEqual(Inventory.objects.get(product=self.low).quantity, 2)
+        self.assertFalse(Inventory.objects.filter(product=self.missing).exists())
+        self.assertFalse(StockAdjustment.objects.filter(reason__startswith='Stock top-up').exists())
+
+    def test_low_and_missing_stock_is_topped_up_in_constant_queries(self):
+        _, queries = self.run_command()
+        stock = dict(Inventory.objects.values_list('product_id', 'quantity'))
+        self.assertEqual((stock[self.low.pk], stock[self.ok.pk], stock[self.missing.pk]), (15, 40, 15))
+        audit = dict(StockAdjustment.objects.filter(reason__startswith='Stock top-up').values_list('product_id', 'quantity'))
+        self.assertEqual(audit, {self.low.pk: 13, self.missing.pk: 15})
 
-# Create your tests here.
+        Product.objects.bulk_create([
+            Product(name=f'Extra {i}', sku=f'EXTRA-{i}', price=10, category_id=self.low.category_id,
+                    brand_id=self.low.brand_id, supplier_id=self.low.supplier_id)
+            for i in range(50)
+        ])
+        Inventory.objects.update(quantity=1)
+        _, more_queries = self.run_command()
+        self.assertEqual(queries, more_queries)
@@ -6,11 +6,21 @@ app_name = 'inventory'
 urlpatterns = [
     path('', views.ProductListView.as_view(), name='product-list'),
     path('product/add/', views.ProductCreateView.as_view(), name='product-add'),
+    path('product/import/', views.ProductImportView.as_view(), name='product-import'),
     path('product/<int:pk>/', views.ProductDetailView.as_view(), name='product-detail'),
     path('product/<int:pk>/edit/', views.ProductUpdateView.as_view(), name='product-edit'),
     path('product/<int:pk>/delete/', views.ProductDeleteView.as_view(), name='product-delete'),
     path('product/<int:pk>/update-stock/', views.update_stock, name='update-stock'),
+    path('goods-received/', views.GoodsReceivedNoteListView.as_view(), name='goods-received-list'),
+    path('goods-received/add/', views.GoodsReceivedNoteCreateView.as_view(), name='goods-received-add'),
+    path('goods-received/<int:pk>/', views.GoodsReceivedNoteDetailView.as_view(), name='goods-received-detail'),
+    path('goods-received/<int:pk>/receive/', views.receive_goods, name='goods-received-receive'),
+    path('stock-counts/', views.StockCountListView.as_view(), name='stock-count-list'),
+    path('stock-counts/add/', views.StockCountCreateView.as_view(), name='stock-count-add'),
+    path('stock-counts/<int:pk>/', views.StockCountDetailView.as_view(), name='stock-count-detail'),
+    path('stock-counts/<int:pk>/apply/', views.apply_stock_count, name='stock-count-apply'),
     path('low-stock/', views.LowStockListView.as_view(), name='low-stock'),
+    path('purchase-suggestions/', views.PurchaseSuggestionView.as_view(), name='purchase-suggestions'),
     path('report/', views.InventoryReportView.as_view(), name='report'),  # Added inventory report URL
     path('api/product-search/', views.product_search, name='product-search'),
     path('api/recent-products/', views.recent_products, name='recent-products'),
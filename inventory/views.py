@@ -1,13 +1,21 @@
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
-from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView, TemplateView
+from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView, TemplateView, FormView
+from django.contrib import messages
 from django.urls import reverse_lazy, reverse
-from django.db.models import F
+from django.db.models import Count, F, Q, Sum
+from django.core.paginator import Paginator
 from django.http import JsonResponse, HttpResponseRedirect
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import get_object_or_404
 from django.db import transaction
-from .models import Product, Inventory, StockAdjustment, Category
-from .forms import ProductForm
+from .models import (
+    Product, Inventory, StockAdjustment, Category, ProductClassification, GoodsReceivedNote, StockCount,
+    reorder_level,
+)
+from .forms import GoodsReceivedNoteForm, ProductForm, ProductImportForm, StockCountEntryForm, StockCountForm
+from .importers import import_products
+from core.importing import ImportFileError, get_format, read_rows
+from .classification import filter_by_class
 
 @login_required
 def get_subcategories(request):
@@ -34,6 +42,19 @@ def get_category_chain(request, category_id):
     chain.reverse()
     return JsonResponse(chain, safe=False)
 
+def get_category_choices():
+    """Return all categories as {id, name, hierarchy} dicts, ordered by their hierarchy"""
+    categories = list(Category.objects.all().order_by('parent__id', 'name'))
+    # Resolve parents from the list we already have instead of one query per level
+    by_id = {cat.id: cat for cat in categories}
+    for cat in categories:
+        if cat.parent_id:
+            cat.parent = by_id[cat.parent_id]
+    return [
+        {'id': cat.id, 'name': cat.name, 'hierarchy': cat.get_hierarchy()}
+        for cat in categories
+    ]
+
 class ProductListView(LoginRequiredMixin, ListView):
     model = Product
     template_name = 'inventory/product_list.html'
@@ -42,7 +63,9 @@ class ProductListView(LoginRequiredMixin, ListView):
 
     def get_queryset(self):
         queryset = super().get_queryset()
-        queryset = queryset.select_related('category', 'brand', 'supplier', 'inventory')
+        queryset = queryset.select_related(
+            'category__parent__parent', 'brand', 'supplier', 'inventory', 'color', 'size'
+        )
         queryset = queryset.filter(is_active=True)
         search_query = self.request.GET.get('search')
         if search_query:
@@ -53,19 +76,22 @@ class ProductListView(LoginRequiredMixin, ListView):
                 Q(category__name__icontains=search_query) |
                 Q(brand__name__icontains=search_query)
             ).distinct()
-        return queryset
+        return queryset.order_by('id')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        # Ensure all products have inventory records
-        for product in context['products']:
-            Inventory.objects.get_or_create(
-                product=product,
-                defaults={
-                    'quantity': 0,
-                    'low_stock_threshold': 5
-                }
-            )
+        # Ensure all products on the page have inventory records
+        missing = [
+            product for product in context['products']
+            if not hasattr(product, 'inventory')
+        ]
+        if missing:
+            inventories = Inventory.objects.bulk_create([
+                Inventory(product=product, quantity=0, low_stock_threshold=5)
+                for product in missing
+            ], ignore_conflicts=True)
+            for product, inventory in zip(missing, inventories):
+                product.inventory = inventory
         return context
 
 @login_required
@@ -75,32 +101,35 @@ def product_search(request):
     per_page = 10
     
     products = Product.objects.select_related('inventory').filter(
-        name__icontains=query
-    )[(page - 1) * per_page:page * per_page]
+        name__icontains=query,
+        is_active=True
+    ).order_by('name')[(page - 1) * per_page:page * per_page]
     
     items = [{
         'id': product.id,
         'name': product.name,
-        'price': float(product.selling_price),
-        'stock': product.inventory.current_stock,
+        'price': float(product.price),
+        'stock': product.inventory.quantity,
         'image': product.image.url if product.image else None,
         'description': str(product.description)
     } for product in products]
     
     return JsonResponse({
         'items': items,
-        'has_more': products.count() >= per_page
+        'has_more': len(items) >= per_page
     })
 
 @login_required
 def recent_products(request):
-    products = Product.objects.select_related('inventory').order_by('-created_at')[:12]
+    products = Product.objects.select_related('inventory').filter(
+        is_active=True
+    ).order_by('-created_at')[:12]
     
     items = [{
         'id': product.id,
         'name': product.name,
-        'price': float(product.selling_price),
-        'stock': product.inventory.current_stock,
+        'price': float(product.price),
+        'stock': product.inventory.quantity,
         'image': product.image.url if product.image else None,
         'description': str(product.description)
     } for product in products]
@@ -136,13 +165,7 @@ class ProductCreateView(LoginRequiredMixin, PermissionRequiredMixin, CreateView)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        # Get all categories ordered by their hierarchy
-        categories = Category.objects.all().order_by('parent__id', 'name')
-        # Convert to list of {id, name, hierarchy} for the template
-        context['categories'] = [
-            {'id': cat.id, 'name': cat.name, 'hierarchy': cat.get_hierarchy()}
-            for cat in categories
-        ]
+        context['categories'] = get_category_choices()
         return context
 
     def form_valid(self, form):
@@ -155,6 +178,26 @@ class ProductCreateView(LoginRequiredMixin, PermissionRequiredMixin, CreateView)
         )
         return response
 
+class ProductImportView(LoginRequiredMixin, PermissionRequiredMixin, FormView):
+    """Staff upload of a product file; existing SKUs are updated, bad rows are listed"""
+    form_class = ProductImportForm
+    template_name = 'inventory/product_import.html'
+    permission_required = ('inventory.add_product', 'inventory.change_product')
+
+    def has_permission(self):
+        return self.request.user.is_staff and super().has_permission()
+
+    def form_valid(self, form):
+        upload = form.cleaned_data['file']
+        try:
+            fmt = get_format(upload.name)
+            report = import_products(read_rows(upload.file, fmt), self.request.user)
+        except ImportFileError as e:
+            form.add_error('file', str(e))
+            return self.form_invalid(form)
+        messages.success(self.request, f'Product import finished: {report}')
+        return self.render_to_response(self.get_context_data(form=form, report=report))
+
 class ProductUpdateView(LoginRequiredMixin, PermissionRequiredMixin, UpdateView):
     model = Product
     form_class = ProductForm
@@ -163,13 +206,7 @@ class ProductUpdateView(LoginRequiredMixin, PermissionRequiredMixin, UpdateView)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        # Get all categories ordered by their hierarchy
-        categories = Category.objects.all().order_by('parent__id', 'name')
-        # Convert to list of {id, name, hierarchy} for the template
-        context['categories'] = [
-            {'id': cat.id, 'name': cat.name, 'hierarchy': cat.get_hierarchy()}
-            for cat in categories
-        ]
+        context['categories'] = get_category_choices()
         return context
 
     def get_success_url(self):
@@ -201,9 +238,242 @@ class LowStockListView(LoginRequiredMixin, ListView):
     context_object_name = 'low_stock_items'
 
     def get_queryset(self):
-        return Inventory.objects.filter(
-            quantity__lte=F('low_stock_threshold')
-        ).select_related('product')
+        queryset = Inventory.objects.filter(
+            quantity__lte=reorder_level()
+        ).select_related('product', 'product__classification')
+        return filter_by_class(queryset, self.request.GET, lookup='product__classification')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['abc_choices'] = ProductClassification.ABC_CHOICES
+        context['xyz_choices'] = ProductClassification.XYZ_CHOICES
+        return context
+
+
+class PurchaseSuggestionView(LoginRequiredMixin, ListView):
+    """Suggested purchase orders from the demand forecast, grouped by supplier"""
+    model = Inventory
+    template_name = 'inventory/purchase_suggestions.html'
+    context_object_name = 'suggestions'
+
+    def get_queryset(self):
+        queryset = Inventory.objects.filter(
+            suggested_order_quantity__gt=0,
+            product__is_active=True
+        ).select_related(
+            'product', 'product__supplier', 'product__classification'
+        ).order_by('product__supplier__name', 'product__name')
+        # Class filters only; the ordering must stay grouped by supplier
+        filters = {key: self.request.GET.get(key, '') for key in ('abc', 'xyz')}
+        return filter_by_class(queryset, filters, lookup='product__classification')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        purchase_orders = []
+        for item in context['suggestions']:
+            supplier = item.product.supplier
+            if not purchase_orders or purchase_orders[-1]['supplier'] != supplier:
+                purchase_orders.append({
+                    'supplier': supplier,
+                    'items': [],
+                    'total_units': 0,
+                    'total_value': 0,
+                })
+            order = purchase_orders[-1]
+            order['items'].append(item)
+            order['total_units'] += item.suggested_order_quantity
+            order['total_value'] += item.suggested_order_quantity * item.product.price
+        context['purchase_orders'] = purchase_orders
+        context['abc_choices'] = ProductClassification.ABC_CHOICES
+        context['xyz_choices'] = ProductClassification.XYZ_CHOICES
+        return context
+
+
+class GoodsReceivedNoteListView(LoginRequiredMixin, PermissionRequiredMixin, ListView):
+    model = GoodsReceivedNote
+    template_name = 'inventory/goods_received_list.html'
+    context_object_name = 'notes'
+    permission_required = 'inventory.view_goodsreceivednote'
+    paginate_by = 25
+
+    def get_queryset(self):
+        queryset = GoodsReceivedNote.objects.select_related('supplier', 'received_by').annotate(
+            line_count=Count('lines'), total_units=Sum('lines__quantity')
+        ).order_by('-created_at')
+        status = self.request.GET.get('status')
+        if status:
+            queryset = queryset.filter(status=status)
+        return queryset
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['status_choices'] = GoodsReceivedNote.STATUS_CHOICES
+        return context
+
+
+class GoodsReceivedNoteCreateView(LoginRequiredMixin, PermissionRequiredMixin, CreateView):
+    """Enter a delivery and, by default, add it to stock in the same request"""
+    model = GoodsReceivedNote
+    form_class = GoodsReceivedNoteForm
+    template_name = 'inventory/goods_received_form.html'
+    permission_required = ('inventory.add_goodsreceivednote', 'inventory.change_inventory')
+
+    def form_valid(self, form):
+        form.instance.created_by = self.request.user
+        with transaction.atomic():
+            response = super().form_valid(form)
+            if form.cleaned_data['receive']:
+                lines = self.object.receive(self.request.user)
+                messages.success(self.request, f'{self.object} received: stock updated for {lines} products.')
+            else:
+                messages.success(self.request, f'{self.object} saved as a draft.')
+        return response
+
+    def get_success_url(self):
+        return reverse('inventory:goods-received-detail', kwargs={'pk': self.object.pk})
+
+
+class GoodsReceivedNoteDetailView(LoginRequiredMixin, PermissionRequiredMixin, DetailView):
+    model = GoodsReceivedNote
+    template_name = 'inventory/goods_received_detail.html'
+    context_object_name = 'note'
+    permission_required = 'inventory.view_goodsreceivednote'
+
+    def get_queryset(self):
+        return GoodsReceivedNote.objects.select_related('supplier', 'created_by', 'received_by')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        lines = self.object.lines.select_related('product', 'product__inventory').order_by('product__name')
+        context['lines'] = lines
+        context['total_units'] = sum(line.quantity for line in lines)
+        context['total_cost'] = sum(line.total_cost for line in lines)
+        return context
+
+
+@login_required
+def receive_goods(request, pk):
+    """Add a draft note to stock"""
+    note = get_object_or_404(GoodsReceivedNote, pk=pk)
+    if request.method == 'POST':
+        if not request.user.has_perms(('inventory.change_goodsreceivednote', 'inventory.change_inventory')):
+            messages.error(request, 'You do not have permission to receive goods.')
+        else:
+            try:
+                lines = note.receive(request.user)
+            except ValueError as e:
+                messages.error(request, str(e))
+            else:
+                messages.success(request, f'{note} received: stock updated for {lines} products.')
+    return HttpResponseRedirect(reverse('inventory:goods-received-detail', kwargs={'pk': pk}))
+
+
+class StockCountListView(LoginRequiredMixin, PermissionRequiredMixin, ListView):
+    model = StockCount
+    template_name = 'inventory/stock_count_list.html'
+    context_object_name = 'counts'
+    permission_required = 'inventory.view_stockcount'
+    paginate_by = 25
+
+    def get_queryset(self):
+        return StockCount.objects.select_related('category', 'started_by', 'applied_by').annotate(
+            line_count=Count('lines'), counted_lines=Count('lines', filter=Q(lines__counted_quantity__isnull=False))
+        ).order_by('-started_at')
+
+
+class StockCountCreateView(LoginRequiredMixin, PermissionRequiredMixin, CreateView):
+    """Start a count by snapshotting the stock of every product in scope"""
+    model = StockCount
+    form_class = StockCountForm
+    template_name = 'inventory/stock_count_form.html'
+    permission_required = 'inventory.add_stockcount'
+
+    def form_valid(self, form):
+        form.instance.started_by = self.request.user
+        with transaction.atomic():
+            response = super().form_valid(form)
+            products = self.object.take_snapshot()
+        messages.success(self.request, f'{self.object} started with {products} products.')
+        return response
+
+    def get_success_url(self):
+        return reverse('inventory:stock-count-detail', kwargs={'pk': self.object.pk})
+
+
+class StockCountDetailView(LoginRequiredMixin, PermissionRequiredMixin, FormView):
+    """Progress and variances of a count, with the form used to enter counted items"""
+    form_class = StockCountEntryForm
+    template_name = 'inventory/stock_count_detail.html'
+    permission_required = 'inventory.change_stockcount'
+    SHOW_CHOICES = [
+        ('variance', 'Variances'),
+        ('counted', 'Counted'),
+        ('uncounted', 'Not counted'),
+        ('all', 'All products'),
+    ]
+
+    def setup(self, request, *args, **kwargs):
+        super().setup(request, *args, **kwargs)
+        self.count = get_object_or_404(
+            StockCount.objects.select_related('category', 'started_by', 'applied_by'), pk=kwargs['pk']
+        )
+
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs['count'] = self.count
+        return kwargs
+
+    def form_valid(self, form):
+        if self.count.status != 'open':
+            messages.error(self.request, f'{self.count} has already been applied.')
+        else:
+            recorded = self.count.record(form.cleaned_data['entries'], replace=form.cleaned_data['replace'])
+            messages.success(self.request, f'Recorded counts for {recorded} products.')
+        return HttpResponseRedirect(self.request.get_full_path())
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        lines = self.count.lines.all()
+        counted = Q(counted_quantity__isnull=False)
+        variance = counted & ~Q(counted_quantity=F('expected_quantity'))
+        context['summary'] = lines.aggregate(
+            products=Count('pk'),
+            counted=Count('pk', filter=counted),
+            variances=Count('pk', filter=variance),
+            net_variance=Sum(F('counted_quantity') - F('expected_quantity'), filter=variance),
+        )
+        show = self.request.GET.get('show', 'variance')
+        if show == 'variance':
+            lines = lines.filter(variance)
+        elif show == 'counted':
+            lines = lines.filter(counted)
+        elif show == 'uncounted':
+            lines = lines.filter(counted_quantity__isnull=True)
+        lines = lines.select_related('product', 'product__inventory').order_by('product__name', 'pk')
+        context.update({
+            'count': self.count,
+            'show': show,
+            'show_choices': self.SHOW_CHOICES,
+            'page_obj': Paginator(lines, 100).get_page(self.request.GET.get('page')),
+        })
+        return context
+
+
+@login_required
+def apply_stock_count(request, pk):
+    """Write the variances of a count to stock"""
+    count = get_object_or_404(StockCount, pk=pk)
+    if request.method == 'POST':
+        if not request.user.has_perms(('inventory.change_stockcount', 'inventory.change_inventory')):
+            messages.error(request, 'You do not have permission to apply stock counts.')
+        else:
+            try:
+                corrections = count.apply(request.user)
+            except ValueError as e:
+                messages.error(request, str(e))
+            else:
+                messages.success(request, f'{count} applied: {corrections} stock corrections written.')
+    return HttpResponseRedirect(reverse('inventory:stock-count-detail', kwargs={'pk': pk}))
 
 
 @login_required
@@ -293,12 +563,13 @@ class InventoryReportView(LoginRequiredMixin, PermissionRequiredMixin, TemplateV
         
         # Get all products with their inventory
         products = Product.objects.select_related(
-            'inventory', 'category', 'brand', 'supplier'
+            'inventory', 'category', 'brand', 'supplier', 'classification'
         ).filter(is_active=True)
+        products = filter_by_class(products, self.request.GET)
 
         # Get low stock products
         low_stock = products.filter(
-            inventory__quantity__lte=F('inventory__low_stock_threshold'),
+            inventory__quantity__lte=reorder_level('inventory__'),
             inventory__quantity__gt=0
         )
 
@@ -319,6 +590,8 @@ class InventoryReportView(LoginRequiredMixin, PermissionRequiredMixin, TemplateV
             'low_stock': low_stock,
             'out_of_stock': out_of_stock,
             'category_totals': category_totals,
+            'abc_choices': ProductClassification.ABC_CHOICES,
+            'xyz_choices': ProductClassification.XYZ_CHOICES,
         })
 
         return context
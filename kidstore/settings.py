@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,7 +42,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-    'core',
+    'core.apps.CoreConfig',
     'inventory.apps.InventoryConfig',
     'sales.apps.SalesConfig',
     'accounts.apps.AccountsConfig',
@@ -57,16 +58,65 @@ CRISPY_TEMPLATE_PACK = "bootstrap5"
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
 ROOT_URLCONF = 'kidstore.urls'
 
+# On-demand profiling: staff add ?_profile=1 (or send X-Profile: 1) to a request.
+# Artifacts are kept in PROFILE_ARTIFACT_DIR and browsable under /performance/profiles/.
+PROFILING_ENABLED = True
+PROFILE_ARTIFACT_DIR = BASE_DIR / 'profiles'
+PROFILE_ARTIFACT_LIMIT = 100
+
+# Slow query log: statements slower than the threshold are logged with their
+# query plan to LOGS_DIR/slow_queries.log and listed under /performance/slow-queries/.
+# Plans scanning a whole table listed in SLOW_QUERY_SCAN_TABLES are flagged.
+SLOW_QUERY_LOG_ENABLED = True
+SLOW_QUERY_THRESHOLD_MS = 100
+SLOW_QUERY_REDACT_PARAMS = True
+SLOW_QUERY_SCAN_TABLES = ['sales_order', 'sales_orderitem', 'inventory_product']
+
+# Prometheus metrics served at /metrics to staff and to METRICS_ALLOWED_IPS.
+# A multi-process server sets KIDSTORE_METRICS_DIR to a directory private to
+# the service: each worker process then writes its counters there so the
+# endpoint can sum them. Unset, only the serving process is reported.
+METRICS_DIR = os.environ.get('KIDSTORE_METRICS_DIR') or None
+METRICS_ALLOWED_IPS = ['127.0.0.1']
+# Tills accepted in the X-Till-Id header of checkouts; sales from other
+# clients are labelled with the cashier's username.
+POS_TILL_IDS = []
+
+# Replaced whenever a customer changes, so every worker process knows to
+# rebuild its in-memory POS autocomplete index (accounts.autocomplete).
+CUSTOMER_INDEX_VERSION_FILE = BASE_DIR / 'run' / 'customer_index.version'
+# Build the index when a worker starts serving and rebuild it in the
+# background, answering from the previous index meanwhile.
+CUSTOMER_INDEX_BACKGROUND = True
+
+# Overrides the settings above for the test run (core.testing.TestRunner)
+TEST_RUNNER = 'core.testing.TestRunner'
+
+# Per-request query budgets, keyed by URL name ("app:name").
+# Requests over budget are logged as warnings on the kidstore.performance logger.
+QUERY_BUDGET_DEFAULT = {'queries': 50, 'wall_ms': 1000}
+QUERY_BUDGETS = {
+    'sales:complete-sale': {'queries': 20, 'wall_ms': 500},
+    'sales:search-customers': {'queries': 5, 'wall_ms': 100},
+    'inventory:product-search': {'queries': 5, 'wall_ms': 100},
+}
+
+# Sales amount counting as 100% performance for staff without a SalesTarget
+# covering the period.
+SALES_TARGET_DEFAULT = 10000
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -93,6 +143,12 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Concurrent tills: take the write lock when a transaction starts
+            # instead of failing on upgrade, and wait longer for it.
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
@@ -132,6 +188,48 @@ PHONENUMBER_DB_FORMAT = "E164"          # or "INTERNATIONAL" | "NATIONAL" | "RFC
 PHONENUMBER_DEFAULT_FORMAT = "NATIONAL" # how values render in forms/templates
 PHONENUMBER_DEFAULT_REGION = "BD"       # set your default region if you take local numbers
 
+# Logging
+
+# Created when the first line is logged (core.log_handlers)
+LOGS_DIR = BASE_DIR / 'logs'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json_lines': {
+            'format': '%(message)s',
+        },
+    },
+    'handlers': {
+        'performance': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'json_lines',
+        },
+        'slow_queries': {
+            'class': 'core.log_handlers.LazyRotatingFileHandler',
+            'filename': LOGS_DIR / 'slow_queries.log',
+            'maxBytes': 5 * 1024 * 1024,
+            'backupCount': 5,
+            'formatter': 'json_lines',
+        },
+    },
+    'loggers': {
+        # One JSON line per request; INFO logs every request, WARNING only those over budget
+        'kidstore.performance': {
+            'handlers': ['performance'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+        # One JSON line per slow query; full scans of watched tables are warnings
+        'kidstore.slow_queries': {
+            'handlers': ['slow_queries'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
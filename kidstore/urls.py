@@ -20,6 +20,7 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib.auth import views as auth_views
 from django.shortcuts import redirect
+from core import views as core_views
 from django.contrib.auth import views as auth_views
 
 urlpatterns = [
@@ -30,6 +31,7 @@ urlpatterns = [
     path('accounts/', include('accounts.urls')),
     path('login/', auth_views.LoginView.as_view(template_name='registration/login.html'), name='login'),
     path('logout/', auth_views.LogoutView.as_view(template_name='registration/logged_out.html', next_page='login'), name='logout'),
+    path('metrics', core_views.metrics, name='metrics'),
 ]
 
 if settings.DEBUG:
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from sales.models import SalespersonDailySales
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-salesperson daily sales rollup from the completed orders'
+
+    def handle(self, *args, **options):
+        rows = SalespersonDailySales.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rows} salesperson daily sales rows'))
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_daily_sales(apps, schema_editor):
+    Order = apps.get_model('sales', 'Order')
+    SalespersonDailySales = apps.get_model('sales', 'SalespersonDailySales')
+    rows = (
+        Order.objects.filter(status='completed')
+        .annotate(date=TruncDate('order_date'))
+        .values('salesperson_id', 'date')
+        .annotate(total_sales=Sum('total'), order_count=Count('id'))
+        .order_by()
+    )
+    SalespersonDailySales.objects.bulk_create([SalespersonDailySales(**row) for row in rows], batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0004_order_shop_assistant'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalespersonDailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('total_sales', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('salesperson', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Salesperson daily sales',
+                'ordering': ['-date'],
+                'constraints': [models.UniqueConstraint(fields=('salesperson', 'date'), name='salesperson_daily_sales_unique')],
+            },
+        ),
+        migrations.RunPython(backfill_daily_sales, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0005_salespersondailysales'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='status',
+            field=models.CharField(choices=[('sold', 'Sold'), ('returned', 'Returned')], default='sold', max_length=10),
+        ),
+    ]
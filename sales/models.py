@@ -1,6 +1,10 @@
-from django.db import models
+from django.db import connection, models, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator
+from django.utils import timezone
+from datetime import timedelta
 from decimal import Decimal
 from inventory.models import Product
 
@@ -53,10 +57,16 @@ class Order(models.Model):
         super().save(*args, **kwargs)
 
 class OrderItem(models.Model):
+    STATUS_CHOICES = [
+        ('sold', 'Sold'),
+        ('returned', 'Returned'),
+    ]
+
     order = models.ForeignKey(Order, on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.PROTECT)
     quantity = models.IntegerField(validators=[MinValueValidator(1)])
     price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='sold')
 
     def __str__(self):
         return f"{self.product.name} x {self.quantity}"
@@ -86,3 +96,105 @@ class Transaction(models.Model):
 
     def __str__(self):
         return f"Transaction for Order #{self.order.id}"
+
+
+class SalespersonDailySales(models.Model):
+    """
+    Completed sales, less returned items, per salesperson and day.
+
+    complete_sale keeps the current day up to date through record_order and
+    process_refund subtracts returned items from the order's day through
+    record_refund, as SalesTarget counts them.
+    Orders loaded in bulk (imports, seed commands) are not counted until the
+    rebuild_salesperson_sales command is run.
+    """
+    salesperson = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_sales')
+    date = models.DateField()
+    total_sales = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    order_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-date']
+        verbose_name_plural = 'Salesperson daily sales'
+        constraints = [
+            models.UniqueConstraint(fields=['salesperson', 'date'], name='salesperson_daily_sales_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.salesperson} on {self.date}"
+
+    @classmethod
+    def add(cls, order, amount, orders):
+        """Add ``amount`` and ``orders`` to the row of the order's salesperson and day in one upsert"""
+        # bulk_create(update_conflicts=True) can only overwrite the row, so
+        # the increment is written as INSERT ... ON CONFLICT DO UPDATE
+        table = connection.ops.quote_name(cls._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} (salesperson_id, date, total_sales, order_count) VALUES (%s, %s, %s, %s) "
+                f"ON CONFLICT (salesperson_id, date) DO UPDATE SET "
+                f"total_sales = {table}.total_sales + excluded.total_sales, "
+                f"order_count = {table}.order_count + excluded.order_count",
+                [order.salesperson_id, timezone.localdate(order.order_date), amount, orders]
+            )
+
+    @classmethod
+    def record_order(cls, order):
+        """Add a completed order to its salesperson's row for the day"""
+        cls.add(order, order.total, 1)
+
+    @classmethod
+    def record_refund(cls, order, amount):
+        """Subtract refunded items from the row of the day the order was placed"""
+        cls.add(order, -amount, 0)
+
+    @classmethod
+    def rebuild(cls):
+        """Recompute every row from the completed orders and return the number of rows"""
+        rows = (
+            Order.objects.filter(status='completed')
+            .annotate(date=TruncDate('order_date'))
+            .values('salesperson_id', 'date')
+            .annotate(total_sales=Sum('total'), order_count=Count('id'))
+            .order_by()
+        )
+        returned = (
+            OrderItem.objects.filter(status='returned', order__status='completed')
+            .annotate(date=TruncDate('order__order_date'))
+            .values('order__salesperson_id', 'date')
+            .annotate(value=Sum(F('price') * F('quantity'), output_field=models.DecimalField()))
+            .order_by()
+        )
+        returned = {(row['order__salesperson_id'], row['date']): row['value'] for row in returned}
+        daily_sales = []
+        for row in rows:
+            row['total_sales'] -= returned.get((row['salesperson_id'], row['date']), 0)
+            daily_sales.append(cls(**row))
+        with transaction.atomic():
+            cls.objects.all().delete()
+            created = cls.objects.bulk_create(daily_sales, batch_size=5000)
+        return len(created)
+
+    @classmethod
+    def summary(cls, salesperson, today=None):
+        """
+        Today, this week (from Monday), this month and all-time figures of a
+        salesperson in one aggregate over the daily rows. The windows match
+        ShopAssistant.get_performance_summary and the SalesTarget periods.
+        """
+        today = today or timezone.localdate()
+        windows = {
+            'today': Q(date=today),
+            'week': Q(date__gte=today - timedelta(days=today.weekday()), date__lte=today),
+            'month': Q(date__gte=today.replace(day=1), date__lte=today),
+            'overall': Q(),
+        }
+        aggregates = {}
+        for name, window in windows.items():
+            aggregates[f'{name}_sales'] = Sum('total_sales', filter=window, default=Decimal('0.00'))
+            aggregates[f'{name}_orders'] = Sum('order_count', filter=window, default=0)
+        totals = cls.objects.filter(salesperson=salesperson).aggregate(**aggregates)
+        return {
+            name: {'total_sales': totals[f'{name}_sales'], 'total_orders': totals[f'{name}_orders']}
+            for name in windows
+        }
@@ -1,3 +1,214 @@
-from django.test import TestCase
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
 
-# Create your tests here.
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core.metrics import FLUSH_INTERVAL, registry
+from core.testing import QueryBudgetMixin, seed_store
+from accounts.models import Customer
+from inventory.models import GoodsReceivedNote, Inventory, Product, StockAdjustment, Category
+from sales.models import Order, OrderItem, SalespersonDailySales, Transaction
+
+
+class SalesQueryBudgetTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_store()
+        cls.in_stock = [
+            inventory.product for inventory in
+            Inventory.objects.filter(quantity__gte=100).select_related('product').order_by('product_id')
+        ]
+
+    def setUp(self):
+        self.client.force_login(self.data['admin'])
+
+    def test_sale_list(self):
+        self.assertQueryBudget(5, '/sales/')
+        self.assertQueryBudget(5, '/sales/?page=2')
+
+    def test_pages(self):
+        self.assertQueryBudget(7, '/sales/pos/')
+        self.assertQueryBudget(4, f"/sales/order/{self.data['orders'][0].pk}/")
+
+    def test_api(self):
+        self.assertQueryBudget(3, f"/sales/api/product-info/{self.data['products'][0].pk}/")
+        self.assertQueryBudget(3, '/sales/api/search-customers/?q=Customer')
+
+    def complete_sale(self, basket_size):
+        products = self.in_stock[:basket_size]
+        payload = {
+            'customer': self.data['customers'][0].pk,
+            'shop_assistant': self.data['assistants'][0].pk,
+            'items': [{'id': product.pk, 'quantity': 2, 'price': str(product.price)} for product in products],
+            'payment_method': 'cash',
+            'amount_paid': str(sum(product.price * 2 for product in products)),
+        }
+        # The daily sales row is upserted, so the first sale of the day costs the same
+        response = self.assertQueryBudget(
+            18, '/sales/api/complete-sale/', method='post',
+            data=json.dumps(payload), content_type='application/json'
+        )
+        self.assertTrue(response.json()['success'], response.json())
+        order = Order.objects.get(pk=response.json()['order_id'])
+        self.assertEqual(order.orderitem_set.count(), basket_size)
+        for product in products:
+            self.assertEqual(Inventory.objects.get(product=product).quantity, 498)
+        daily = SalespersonDailySales.objects.get(salesperson=self.data['admin'], date=timezone.localdate())
+        self.assertEqual((daily.order_count, daily.total_sales), (1, order.total))
+
+    def test_complete_sale_single_item(self):
+        self.complete_sale(1)
+
+    def test_complete_sale_small_basket(self):
+        self.complete_sale(5)
+
+    def test_complete_sale_large_basket(self):
+        self.complete_sale(20)
+
+    def test_complete_sale_insufficient_stock(self):
+        product = self.in_stock[0]
+        payload = {
+            'items': [{'id': product.pk, 'quantity': 1000, 'price': str(product.price)}],
+            'payment_method': 'cash',
+            'amount_paid': str(product.price * 1000),
+        }
+        response = self.client.post('/sales/api/complete-sale/', data=json.dumps(payload), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Inventory.objects.get(product=product).quantity, 500)
+
+
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_store(customers=5, products=5, orders=5, assistants=2, salespersons=2)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        self.enterContext(override_settings(METRICS_DIR=self.directory, POS_TILL_IDS=['till-7']))
+
+    def fail_checkout(self, till):
+        self.client.force_login(self.data['admin'])
+        product = self.data['products'][0]
+        payload = {
+            'items': [{'id': product.pk, 'quantity': 1, 'price': str(product.price)}],
+            'payment_method': 'cash',
+            'amount_paid': '0',
+        }
+        response = self.client.post(
+            '/sales/api/complete-sale/', data=json.dumps(payload), content_type='application/json',
+            headers={'X-Till-Id': till}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_checkout_failures_are_counted_by_reason(self):
+        self.fail_checkout('till-7')
+
+        metrics = self.client.get('/metrics').content.decode()
+        self.assertIn('kidstore_checkout_failures_total{reason="insufficient_payment",till="till-7"}', metrics)
+        self.assertIn('kidstore_checkout_duration_seconds_count{till="till-7"}', metrics)
+        self.assertIn('kidstore_http_request_duration_seconds_bucket{view="sales:complete-sale",le="+Inf"}', metrics)
+        self.assertIn('kidstore_low_stock_skus ', metrics)
+
+    def test_unknown_tills_are_labelled_with_the_cashier(self):
+        self.fail_checkout('anything-goes')
+
+        metrics = self.client.get('/metrics').content.decode()
+        self.assertNotIn('anything-goes', metrics)
+        self.assertIn(f'till="{self.data["admin"].username}"', metrics)
+
+    def test_files_of_dead_processes_are_removed(self):
+        process = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'], capture_output=True, text=True)
+        dead = self.directory / f'metrics-{process.stdout.strip()}.json'
+        dead.write_text(json.dumps({'counters': [['kidstore_checkouts_total', {'till': 'till-9'}, 5]], 'histograms': []}))
+
+        metrics = self.client.get('/metrics').content.decode()
+        self.assertFalse(dead.exists())
+        self.assertNotIn('kidstore_checkouts_total{till="till-9"} 5', metrics)
+
+    def test_nothing_recorded_is_not_written(self):
+        registry.flush()
+        with override_settings(METRICS_DIR=self.directory / 'idle'):
+            registry.flush()
+        self.assertFalse((self.directory / 'idle').exists())
+
+    def test_throttled_events_are_flushed_by_a_timer(self):
+        registry.inc('kidstore_checkouts_total', {'till': 'till-9'})
+        # Within the interval of the first write: written by the timer, not on the next event
+        registry.inc('kidstore_checkouts_total', {'till': 'till-9'})
+        expected = registry.snapshot()
+        time.sleep(FLUSH_INTERVAL + 0.5)
+        self.assertEqual(json.loads((self.directory / f'metrics-{os.getpid()}.json').read_text()), expected)
+
+    def test_other_processes_are_summed(self):
+        registry.inc('kidstore_checkouts_total', {'till': 'till-9'})
+        own = registry.collect()[0][('kidstore_checkouts_total', (('till', 'till-9'),))]
+        (self.directory / 'metrics-1.json').write_text(json.dumps({
+            'counters': [['kidstore_checkouts_total', {'till': 'till-9'}, 2]],
+            'histograms': [],
+        }))
+
+        metrics = self.client.get('/metrics').content.decode()
+        self.assertIn(f'kidstore_checkouts_total{{till="till-9"}} {own + 2}', metrics)
+
+    def test_access_is_restricted(self):
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.0.0.5').status_code, 403)
+        self.client.force_login(self.data['admin'])
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.0.0.5').status_code, 200)
+
+
+class CleanupDataTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_store(customers=10, products=6, orders=40, assistants=2, salespersons=3, days=28)
+        cls.cutoff = timezone.localdate() - timedelta(days=14)
+        product = cls.data['products'][0]
+        admin = cls.data['admin']
+        old = timezone.now() - timedelta(days=20)
+        StockAdjustment.objects.bulk_create([
+            StockAdjustment(product=product, quantity=1, adjustment_type='addition', reason='old', adjusted_by=admin, created_at=old),
+            StockAdjustment(product=product, quantity=1, adjustment_type='addition', reason='new', adjusted_by=admin),
+        ])
+        for received_at in (old, None):
+            note = GoodsReceivedNote.objects.create(supplier=product.supplier, created_by=admin)
+            note.lines.create(product=product, quantity=3)
+            if received_at:
+                note.receive(admin)
+                GoodsReceivedNote.objects.filter(pk=note.pk).update(received_at=received_at)
+
+    def cleanup(self, *args):
+        out = StringIO()
+        call_command('cleanup_data', '--confirm', '--chunk-size', '7', *args, stdout=out)
+        return out.getvalue()
+
+    def test_retention_cleanup_deletes_old_records_in_chunks(self):
+        kept = set(Order.objects.filter(order_date__date__gte=self.cutoff).values_list('pk', flat=True))
+        self.assertTrue(kept and len(kept) < 40)
+        self.cleanup('--before', self.cutoff.isoformat())
+
+        self.assertEqual(set(Order.objects.values_list('pk', flat=True)), kept)
+        self.assertEqual(set(OrderItem.objects.values_list('order_id', flat=True)), kept)
+        self.assertEqual(set(Transaction.objects.values_list('order_id', flat=True)), kept)
+        for customer in Customer.objects.all():
+            self.assertEqual(customer.order_count, Order.objects.filter(customer=customer, status='completed').count())
+        self.assertEqual(list(StockAdjustment.objects.filter(reason__in=['old', 'new']).values_list('reason', flat=True)), ['new'])
+        self.assertEqual(list(GoodsReceivedNote.objects.values_list('status', flat=True)), ['draft'])
+        self.assertTrue(Product.objects.exists())
+
+    def test_full_cleanup_keeps_customers(self):
+        output = self.cleanup()
+        self.assertIn('- Orders: 40', output)
+        for model in (Order, OrderItem, Transaction, SalespersonDailySales, GoodsReceivedNote, Product, Inventory, Category):
+            self.assertFalse(model.objects.exists(), model.__name__)
+        self.assertEqual(Customer.objects.count(), 10)
+        self.assertFalse(Customer.objects.filter(order_count__gt=0).exists())
@@ -2,18 +2,38 @@ from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib.auth.decorators import login_required
 from django.views.generic import ListView, DetailView, CreateView, TemplateView
 from django.http import JsonResponse, HttpResponseRedirect
-from django.db import transaction
-from django.db.models import F, Q
+from django.db import OperationalError, transaction
+from django.db.models import Case, Count, F, IntegerField, Q, Value, When
 from django.shortcuts import get_object_or_404, redirect
 from django.core.mail import send_mail
 from django.template.loader import render_to_string
+from django.conf import settings
 from django.contrib import messages
 from django.urls import reverse
-from .models import Order, OrderItem, Transaction
+from .models import Order, OrderItem, SalespersonDailySales, Transaction
 from inventory.models import Product, Inventory, Category, Brand
-from accounts.models import Customer
+from accounts.autocomplete import customer_index
+from accounts.models import Customer, SalesTarget
+from core.metrics import record_cache, record_checkout
 import json
 import decimal
+import time
+
+
+class CheckoutError(ValueError):
+    """A sale rejected for a reason reported in the checkout failure metrics"""
+
+    def __init__(self, message, reason='invalid_basket'):
+        super().__init__(message)
+        self.reason = reason
+
+
+def get_till_id(request):
+    """The till sending the sale (X-Till-Id header, if it is in POS_TILL_IDS), else the cashier's username"""
+    till = request.headers.get('X-Till-Id')
+    if till and till in getattr(settings, 'POS_TILL_IDS', []):
+        return till
+    return request.user.get_username()
 
 @login_required
 def get_product_info(request, product_id):
@@ -34,7 +54,9 @@ class SaleListView(LoginRequiredMixin, ListView):
 
     def get_queryset(self):
         queryset = super().get_queryset()
-        queryset = queryset.select_related('customer', 'salesperson', 'shop_assistant')
+        queryset = queryset.select_related(
+            'customer', 'salesperson', 'shop_assistant'
+        ).annotate(item_count=Count('orderitem'))
 
         # Apply filters if provided
         search = self.request.GET.get('search')
@@ -69,7 +91,7 @@ class SaleListView(LoginRequiredMixin, ListView):
         return context
 
 class OrderDetailView(LoginRequiredMixin, DetailView):
-    model = Order
+    queryset = Order.objects.select_related('customer', 'salesperson', 'shop_assistant', 'transaction')
     template_name = 'sales/order_detail.html'
     context_object_name = 'order'
 
@@ -100,7 +122,9 @@ class POSView(LoginRequiredMixin, UserPassesTestMixin, TemplateView):
 def complete_sale(request):
     if request.method != 'POST':
         return JsonResponse({'success': False, 'error': 'Method not allowed'}, status=405)
-    
+
+    start = time.perf_counter()
+    till = get_till_id(request)
     try:
         data = json.loads(request.body)
         total_amount = decimal.Decimal('0.00')
@@ -137,39 +161,55 @@ def complete_sale(request):
             # Save order to get the ID
             order.save()
             
+            # Load every product in the basket with its inventory in one query
+            lines = [
+                (int(item['id']), int(item['quantity']), decimal.Decimal(str(item['price'])))
+                for item in data['items']
+            ]
+            products = Product.objects.select_related('inventory').in_bulk(
+                {product_id for product_id, _, _ in lines}
+            )
+
+            # Total quantity per product, so repeated lines are checked together
+            quantities = {}
+            for product_id, quantity, price in lines:
+                if product_id not in products:
+                    raise ValueError('One of the products in the basket no longer exists')
+                if quantity < 1:
+                    raise ValueError(f'Invalid quantity for {products[product_id].name}')
+                quantities[product_id] = quantities.get(product_id, 0) + quantity
+
+            # Check stock availability
+            for product_id, quantity in quantities.items():
+                if products[product_id].inventory.quantity < quantity:
+                    raise CheckoutError(f'Insufficient stock for {products[product_id].name}', 'insufficient_stock')
+
             # Create order items
-            for item in data['items']:
-                product = get_object_or_404(Product, pk=item['id'])
-                inventory = product.inventory
-                quantity = int(item['quantity'])
-                
-                # Check stock availability
-                if inventory.quantity < quantity:
-                    raise ValueError(f'Insufficient stock for {product.name}')
-                
-                # Calculate item total
-                price = decimal.Decimal(str(item['price']))
-                item_total = price * quantity
-                total_amount += item_total
-                
-                # Create order item
-                OrderItem.objects.create(
+            order_items = []
+            for product_id, quantity, price in lines:
+                total_amount += price * quantity
+                order_items.append(OrderItem(
                     order=order,
-                    product=product,
+                    product=products[product_id],
                     quantity=quantity,
                     price=price
-                )
-                
-                # Update inventory
-                inventory.quantity = F('quantity') - quantity
-                inventory.save()
-                
-                # Check if stock is below threshold after update
-                inventory.refresh_from_db()
-                if inventory.quantity <= inventory.low_stock_threshold:
-                    # TODO: Implement low stock notification system
-                    pass
-            
+                ))
+            OrderItem.objects.bulk_create(order_items)
+
+            # Update inventory for the whole basket in one statement. Rows whose
+            # stock was sold by another till in the meantime are not updated,
+            # which is detected by the row count and rolls the sale back.
+            sold = Case(
+                *[When(product_id=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()],
+                output_field=IntegerField()
+            )
+            updated = Inventory.objects.filter(
+                product_id__in=quantities,
+                quantity__gte=sold
+            ).update(quantity=F('quantity') - sold)
+            if updated != len(quantities):
+                raise CheckoutError('Insufficient stock for one or more products - please try again', 'insufficient_stock')
+
             # No tax calculation - total equals subtotal
             tax_amount = decimal.Decimal('0.00')
             final_total = total_amount
@@ -177,7 +217,7 @@ def complete_sale(request):
             # Validate payment amount
             amount_paid = decimal.Decimal(str(data['amount_paid']))
             if amount_paid < final_total:
-                raise ValueError('Insufficient payment amount')
+                raise CheckoutError('Insufficient payment amount', 'insufficient_payment')
             
             # Create transaction
             Transaction.objects.create(
@@ -201,22 +241,37 @@ def complete_sale(request):
             if abs(order.total - final_total) > decimal.Decimal('0.01'):
                 raise ValueError(f'Order total mismatch (Expected: {final_total}, Got: {order.total}) - please try again')
             
-            # Update customer's total purchase value
+            # Update customer's total purchase value and order activity
             if order.customer:
-                order.customer.update_total_purchase_value()
-            
-            return JsonResponse({
-                'success': True,
-                'order_id': order.id,
-                'redirect_url': f'/sales/order/{order.id}/'
-            })
-        
+                order.customer.update_order_stats()
+
+            SalespersonDailySales.record_order(order)
+            SalesTarget.record_sale(order)
+
+        record_checkout(till, time.perf_counter() - start)
+        return JsonResponse({
+            'success': True,
+            'order_id': order.id,
+            'redirect_url': f'/sales/order/{order.id}/'
+        })
+
     except (ValueError, decimal.InvalidOperation) as e:
+        record_checkout(till, time.perf_counter() - start, getattr(e, 'reason', 'invalid_basket'))
         return JsonResponse({
             'success': False,
             'error': str(e)
         }, status=400)
     except Exception as e:
+        if isinstance(e, OperationalError) and 'locked' in str(e):
+            # Another till held the database for longer than the lock timeout
+            record_checkout(till, time.perf_counter() - start, 'database_locked')
+            response = JsonResponse({
+                'success': False,
+                'error': 'The till is busy, please try again'
+            }, status=503)
+            response['Retry-After'] = '1'
+            return response
+        record_checkout(till, time.perf_counter() - start, 'error')
         return JsonResponse({
             'success': False,
             'error': 'An unexpected error occurred while processing the sale'
@@ -274,22 +329,34 @@ def process_refund(request, pk):
         
         try:
             with transaction.atomic():
-                # Process returns and update inventory
-                for item_id in items:
-                    order_item = get_object_or_404(OrderItem, id=item_id, order=order)
-                    
+                # Only items that are still sold can be returned; the guarded
+                # UPDATE also stops two concurrent refunds of the same item
+                order_items = list(
+                    OrderItem.objects.select_related('product__inventory')
+                    .filter(order=order, id__in=items, status='sold')
+                )
+                returned = OrderItem.objects.filter(
+                    pk__in=[order_item.pk for order_item in order_items], status='sold'
+                ).update(status='returned')
+                if not order_items or returned != len(set(items)):
+                    raise ValueError('Some of the selected items were already returned')
+
+                refunded = decimal.Decimal('0.00')
+                for order_item in order_items:
+                    refunded += order_item.total
+
                     # Update inventory
                     inventory = order_item.product.inventory
                     inventory.quantity = F('quantity') + order_item.quantity
                     inventory.save()
-                    
-                    # Mark item as returned
-                    order_item.status = 'returned'
-                    order_item.save()
-                
-                # Update customer's total purchase value after refund
+
+                # Update customer's total purchase value and order activity after refund
                 if order.customer:
-                    order.customer.update_total_purchase_value()
+                    order.customer.update_order_stats()
+
+                if order.status == 'completed':
+                    SalesTarget.record_refund(order, refunded)
+                    SalespersonDailySales.record_refund(order, refunded)
                 
                 # You might want to create a Refund model to track refunds
                 # Refund.objects.create(
@@ -300,6 +367,8 @@ def process_refund(request, pk):
                 # )
                 
                 messages.success(request, 'Return processed successfully.')
+        except ValueError as e:
+            messages.error(request, f'Failed to process return: {e}.')
         except Exception as e:
             messages.error(request, 'Failed to process return. Please try again.')
     
@@ -359,6 +428,8 @@ def create_order(request):
         # Update order total
         order.total_price = total_amount
         order.save()
+        SalespersonDailySales.record_order(order)
+        SalesTarget.record_sale(order)
 
         # Create transaction
         Transaction.objects.create(
@@ -367,9 +438,8 @@ def create_order(request):
             amount_paid=total_amount
         )
 
-        # Update customer's total purchase value
-        customer.total_purchase_value = F('total_purchase_value') + total_amount
-        customer.save()
+        # Update customer's total purchase value and order activity
+        customer.update_order_stats()
 
         return JsonResponse({
             'success': True,
@@ -393,11 +463,11 @@ def search_customers(request):
     if len(query) < 2:  # Require at least 2 characters
         return JsonResponse({'customers': []})
     
-    # Search by name or phone number
-    customers = Customer.objects.filter(
-        Q(name__icontains=query) | 
-        Q(phone_number__icontains=query)
-    ).order_by('name')[:10]  # Limit to 10 results
+    # Served from the in-memory index; the database is searched only on a miss
+    customers = customer_index.search(query)
+    record_cache('customer_autocomplete', hit=bool(customers))
+    if not customers:
+        customers = Customer.objects.search(query, 'name').order_by('name')[:10]  # Limit to 10 results
     
     results = []
     for customer in customers: